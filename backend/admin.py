@@ -1,12 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 
+from backend.catalog import refresh_catalog_items
 from backend.models import (
+    CatalogItem,
     Category,
     ConfirmEmailToken,
     Contact,
+    ImportJob,
     OrderItem,
     Order,
+    OrderStateEvent,
+    OutboxEmail,
     Parameter,
     Product,
     ProductInfo,
@@ -14,6 +20,54 @@ from backend.models import (
     Shop,
     User
 )
+from backend.response_cache import invalidate_catalog
+from backend.search import update_search_vectors
+
+
+class ProductInfoRefreshMixin:
+    """Обновляет информацию о продуктах после удаления из админки.
+
+    Сигналов удаления для каждой строки нет, поэтому удаление
+    выполняется без загрузки строк. Затронутая информация
+    о продуктах и магазины и категории её строк каталога
+    собираются до удаления. Поисковые векторы и строки каталога
+    обновляются, а кеш каталога сбрасывается одним пакетом после
+    него, в том числе для строк, удаленных каскадно."""
+
+    product_info_lookup = 'product_info_id'
+
+    def _get_affected(self, queryset):
+        product_info_ids = {
+            product_info_id
+            for product_info_id in queryset.values_list(
+                self.product_info_lookup, flat=True
+            )
+            if product_info_id is not None
+        }
+        return product_info_ids, list(CatalogItem.objects.filter(
+            pk__in=product_info_ids
+        ).values_list('shop_id', 'category_id'))
+
+    def _refresh_product_infos(self, product_info_ids, catalog_rows):
+        update_search_vectors(product_info_ids)
+        refresh_catalog_items(product_info_ids)
+        if catalog_rows:
+            invalidate_catalog(
+                shop_ids={shop_id for shop_id, _ in catalog_rows},
+                category_ids={
+                    category_id for _, category_id in catalog_rows
+                }
+            )
+
+    def delete_model(self, request, obj):
+        affected = self._get_affected(type(obj).objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        self._refresh_product_infos(*affected)
+
+    def delete_queryset(self, request, queryset):
+        affected = self._get_affected(queryset)
+        super().delete_queryset(request, queryset)
+        self._refresh_product_infos(*affected)
 
 
 @admin.register(User)
@@ -64,15 +118,19 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
+class ShopAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
+    product_info_lookup = 'product_infos__id'
     list_display = ('name', 'url', 'user', 'state')
     list_filter = ('state', 'user')
-    fields = ('name', 'url', 'user', 'state')
+    fields = ('name', 'url', 'user', 'state', 'etag', 'last_modified',
+              'content_hash')
     search_fields = ('name', 'url', 'user')
+    readonly_fields = ('etag', 'last_modified', 'content_hash')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
+    product_info_lookup = 'product_infos__id'
     list_display = ('name', 'category', 'created_at', 'updated_at')
     list_filter = ('name', 'category')
     fields = ('name', 'category', 'image', 'created_at', 'updated_at')
@@ -81,7 +139,8 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
+    product_info_lookup = 'products__product_infos__id'
     list_display = ('name',)
     list_filter = ('name',)
     fields = ('name', 'shops')
@@ -89,15 +148,17 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductInfo)
-class ProductInfoAdmin(admin.ModelAdmin):
-    list_display = ('product', 'model', 'quantity', 'price')
-    list_filter = ('product', 'model')
-    fields = ('product', 'model', 'quantity', 'price')
+class ProductInfoAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
+    product_info_lookup = 'id'
+    list_display = ('product', 'model', 'quantity', 'price', 'is_active')
+    list_filter = ('product', 'model', 'is_active')
+    fields = ('product', 'model', 'quantity', 'price', 'is_active')
     search_fields = ('product', 'model')
 
 
 @admin.register(Parameter)
-class ParameterAdmin(admin.ModelAdmin):
+class ParameterAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
+    product_info_lookup = 'product_parameters__product_info_id'
     list_display = ('name',)
     list_filter = ('name',)
     fields = ('name',)
@@ -105,7 +166,7 @@ class ParameterAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductParameter)
-class ProductParameterAdmin(admin.ModelAdmin):
+class ProductParameterAdmin(ProductInfoRefreshMixin, admin.ModelAdmin):
     list_display = ('product_info', 'parameter', 'value')
     list_filter = ('product_info', 'parameter')
     fields = ('product_info', 'parameter', 'value')
@@ -146,10 +207,56 @@ class OrderItemAdmin(admin.ModelAdmin):
     search_fields = ('order', 'product_info')
 
 
+@admin.register(OrderStateEvent)
+class OrderStateEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'from_state', 'to_state', 'created_at')
+    list_filter = ('to_state',)
+    fields = ('order', 'from_state', 'to_state', 'created_at')
+    search_fields = ('order__id',)
+    readonly_fields = ('order', 'from_state', 'to_state', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ConfirmEmailToken)
 class ConfirmEmailAdmin(admin.ModelAdmin):
     list_display = ('user', 'key', 'created_at')
     list_filter = ('user',)
     fields = ('user', 'key', 'created_at')
     search_fields = ('user',)
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'url', 'phase', 'processed', 'total',
+                    'created_at')
+    list_filter = ('phase', 'user')
+    fields = ('user', 'url', 'phase', 'processed', 'total', 'changes',
+              'errors', 'created_at', 'updated_at')
+    search_fields = ('url',)
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'state', 'attempts', 'next_attempt_at',
+                    'sent_at')
+    list_filter = ('state',)
+    fields = ('subject', 'body', 'to', 'state', 'attempts',
+              'next_attempt_at', 'sent_at', 'last_error', 'created_at')
+    search_fields = ('subject',)
+    readonly_fields = ('attempts', 'sent_at', 'last_error', 'created_at')
+    actions = ('retry_emails',)
+
+    @admin.action(description='Повторить отправку')
+    def retry_emails(self, request, queryset):
+        queryset.exclude(state='sent').update(
+            state='pending',
+            attempts=0,
+            next_attempt_at=timezone.now()
+        )
\ No newline at end of file
@@ -0,0 +1,557 @@
+import json
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.shortcuts import get_object_or_404
+from django.utils.module_loading import import_string
+
+from backend.models import (
+    CatalogItem,
+    Contact,
+    Order,
+    OrderItem,
+    ProductInfo
+)
+from backend.serializers import (
+    BasketItemSerializer,
+    BasketItemUpdateSerializer,
+    CatalogRowSerializer,
+    OrderRowSerializer
+)
+from backend.transitions import change_state, record_state_events
+
+
+def get_basket_storage():
+    """Возвращает хранилище корзин, заданное настройкой BASKET_STORAGE."""
+    return import_string(settings.BASKET_STORAGE)()
+
+
+def _get_quantities(serializer_class, items, key):
+    """Проверяет формат позиций без запросов к базе данных.
+
+    :return: Количество по ключу позиции и ошибка, если позиции
+        указаны неверно.
+    """
+    serializer = serializer_class(data=items, many=True)
+    if not serializer.is_valid():
+        return None, {'Status': False, 'Errors': serializer.errors}
+
+    quantities = {}
+    for item in serializer.validated_data:
+        if key == 'product_info' and item[key] in quantities:
+            return None, {
+                'Status': False,
+                'Errors': 'Позиция уже существует в корзине'
+            }
+        quantities[item[key]] = item['quantity']
+    return quantities, None
+
+
+def _get_missing_error(product_info_ids, prices):
+    for product_info_id in product_info_ids:
+        if product_info_id not in prices:
+            return {
+                'Status': False,
+                'Errors': ('Информация о продукте с id '
+                           f'{product_info_id} не найдена')
+            }
+    return None
+
+
+def _get_unknown_item_error(item_ids, known_ids):
+    for item_id in item_ids:
+        if item_id not in known_ids:
+            return {
+                'Status': False,
+                'Errors': f'Позиция корзины с id {item_id} не найдена'
+            }
+    return None
+
+
+class DatabaseBasketStorage:
+    """Хранит корзину в таблицах заказов.
+
+    Корзина - заказ пользователя в состоянии basket, позиции -
+    строки OrderItem с ценой на момент добавления."""
+
+    def list(self, user_id):
+        basket = list(Order.objects.filter(
+            user_id=user_id,
+            state='basket'
+        ).values(*OrderRowSerializer.fields))
+        items = OrderItem.objects.filter(
+            order_id__in=[order['id'] for order in basket]
+        ).order_by('id').values(*OrderRowSerializer.item_fields)
+        return OrderRowSerializer(basket, items).data
+
+    def _get_or_create_basket(self, user_id, contact_id):
+        basket, _ = Order.objects.get_or_create(
+            user_id=user_id,
+            state='basket',
+            contact_id=get_object_or_404(Contact, id=contact_id).id
+        )
+        return basket
+
+    @transaction.atomic
+    def add_items(self, user_id, contact_id, items):
+        """Добавляет позиции в корзину.
+
+        Весь список проверяется одним запросом к информации
+        о продуктах, позиции создаются одним INSERT.
+
+        :return: Количество добавленных позиций или ошибка.
+        """
+        quantities, error = _get_quantities(
+            BasketItemSerializer, items, 'product_info'
+        )
+        if error:
+            return error
+
+        basket = self._get_or_create_basket(user_id, contact_id)
+        prices = {}
+        for product_info_id, price, in_basket in ProductInfo.objects.filter(
+                id__in=quantities,
+                is_active=True
+        ).annotate(
+            in_basket=Exists(OrderItem.objects.filter(
+                order=basket,
+                product_info=OuterRef('pk')
+            ))
+        ).values_list('id', 'price', 'in_basket'):
+            if in_basket:
+                return {
+                    'Status': False,
+                    'Errors': 'Позиция уже существует в корзине'
+                }
+            prices[product_info_id] = price
+
+        error = _get_missing_error(quantities, prices)
+        if error:
+            return error
+
+        # Цена фиксируется в момент добавления в корзину.
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=basket,
+                product_info_id=product_info_id,
+                quantity=quantity,
+                price=prices[product_info_id]
+            )
+            for product_info_id, quantity in quantities.items()
+        ])
+        basket.change_totals(
+            sum(prices[product_info_id] * quantity
+                for product_info_id, quantity in quantities.items()),
+            len(quantities)
+        )
+        return len(quantities)
+
+    @transaction.atomic
+    def update_items(self, user_id, contact_id, items):
+        """Меняет количество в позициях корзины.
+
+        Позиции читаются одним запросом и обновляются одним UPDATE.
+
+        :return: Количество обновленных позиций или ошибка.
+        """
+        quantities, error = _get_quantities(
+            BasketItemUpdateSerializer, items, 'id'
+        )
+        if error:
+            return error
+
+        basket = self._get_or_create_basket(user_id, contact_id)
+        order_items = {
+            order_item.id: order_item
+            for order_item in OrderItem.objects.filter(
+                order=basket,
+                id__in=quantities
+            ).only('id', 'quantity', 'price')
+        }
+        error = _get_unknown_item_error(quantities, order_items)
+        if error:
+            return error
+
+        total_sum = 0
+        for order_id, quantity in quantities.items():
+            order_item = order_items[order_id]
+            total_sum += order_item.price * (quantity - order_item.quantity)
+            order_item.quantity = quantity
+
+        OrderItem.objects.bulk_update(order_items.values(), ('quantity',))
+        basket.change_totals(total_sum)
+        return len(order_items)
+
+    @transaction.atomic
+    def remove_items(self, user_id, item_ids):
+        """Удаляет позиции корзины, пустая корзина удаляется.
+
+        :return: Количество удаленных позиций.
+        """
+        basket = Order.objects.filter(
+            user_id=user_id,
+            state='basket'
+        ).first()
+        if basket is None:
+            return 0
+
+        order_items = OrderItem.objects.filter(order=basket, id__in=item_ids)
+        removed = order_items.aggregate(
+            total_sum=Sum(F('price') * F('quantity'), default=0),
+            items_count=Count('id')
+        )
+        removed_count, _ = order_items.delete()
+        if removed_count:
+            basket.change_totals(
+                -removed['total_sum'],
+                -removed['items_count']
+            )
+            basket.save(update_fields=('updated_at',))
+            if not basket.ordered_items.exists():
+                basket.delete()
+        return removed_count
+
+    def place_order(self, user_id, basket_id, contact_id):
+        """Переводит корзину в новый заказ.
+
+        :return: ИД размещенного заказа или None, если корзина
+            не найдена.
+        """
+        if change_state(
+                Order.objects.filter(user_id=user_id, id=basket_id),
+                'new',
+                contact_id=contact_id
+        ):
+            return int(basket_id)
+        return None
+
+    def restore_basket(self, user_id, basket_id):
+        """Ничего не делает: корзину восстанавливает откат транзакции."""
+
+
+@lru_cache
+def _get_redis(url):
+    return redis.Redis.from_url(url)
+
+
+class RedisBasketStorage:
+    """Хранит активные корзины в хешах Redis.
+
+    Корзина пользователя - хеш basket:{user_id} с ИД корзины
+    и контакта, позиции - хеш basket:{user_id}:items, где ключ -
+    ИД информации о продукте, он же ИД позиции, а значение -
+    количество и цена на момент добавления. В таблицы заказов
+    корзина записывается только при размещении заказа.
+
+    При размещении заказа корзина атомарно переименовывается
+    в ключи оформления basket:{user_id}:checkout:{basket_id},
+    поэтому повторное или параллельное оформление той же корзины
+    её не находит."""
+
+    id_key = 'basket:last_id'
+
+    def __init__(self, client=None):
+        self.client = client or _get_redis(settings.BASKET_REDIS)
+        self.claimed = set()
+
+    def _get_keys(self, user_id):
+        return f'basket:{user_id}', f'basket:{user_id}:items'
+
+    def _get_checkout_keys(self, user_id, basket_id):
+        return (
+            f'basket:{user_id}:checkout:{basket_id}',
+            f'basket:{user_id}:checkout:{basket_id}:items'
+        )
+
+    def _read(self, user_id, keys=None):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys or self._get_keys(user_id):
+            pipeline.hgetall(key)
+        basket, items = pipeline.execute()
+        return (
+            {key.decode(): int(value) for key, value in basket.items()},
+            {
+                int(product_info_id): json.loads(item)
+                for product_info_id, item in items.items()
+            }
+        )
+
+    def _queue_write(self, pipeline, user_id, contact_id, items):
+        basket_key, items_key = self._get_keys(user_id)
+        pipeline.hset(basket_key, 'contact_id', contact_id)
+        pipeline.hset(items_key, mapping={
+            product_info_id: json.dumps(item)
+            for product_info_id, item in items.items()
+        })
+        for key in (basket_key, items_key):
+            pipeline.expire(key, settings.BASKET_REDIS_TIMEOUT)
+
+    def list(self, user_id):
+        basket, items = self._read(user_id)
+        if not items:
+            return []
+
+        contact = Contact.objects.filter(
+            id=basket['contact_id']
+        ).values(*OrderRowSerializer.contact_fields).first() or dict.fromkeys(
+            OrderRowSerializer.contact_fields
+        )
+        row = {
+            'id': basket['id'],
+            'state': 'basket',
+            'total_sum': sum(
+                item['price'] * item['quantity'] for item in items.values()
+            ),
+            'items_count': len(items),
+            'contact_id': basket['contact_id'],
+        }
+        row.update(
+            (f'contact__{field}', value) for field, value in contact.items()
+        )
+
+        prefix = OrderRowSerializer.item_prefix
+        catalog_items = {
+            catalog_item['pk']: catalog_item
+            for catalog_item in CatalogItem.objects.filter(
+                pk__in=items
+            ).values(*CatalogRowSerializer.fields)
+        }
+        item_rows = []
+        for product_info_id, item in sorted(items.items()):
+            catalog_item = catalog_items.get(
+                product_info_id,
+                dict.fromkeys(CatalogRowSerializer.fields)
+            )
+            item_row = {
+                'id': product_info_id,
+                'order_id': basket['id'],
+                'product_info_id': product_info_id,
+                'quantity': item['quantity'],
+                'price': item['price'],
+            }
+            item_row.update(
+                (f'{prefix}{field}', value)
+                for field, value in catalog_item.items()
+            )
+            item_rows.append(item_row)
+        return OrderRowSerializer([row], item_rows).data
+
+    def add_items(self, user_id, contact_id, items):
+        """Добавляет позиции в корзину.
+
+        Наличие позиций проверяется и позиции записываются
+        в транзакции Redis под WATCH, поэтому параллельные запросы
+        не добавляют одну позицию дважды.
+
+        :return: Количество добавленных позиций или ошибка.
+        """
+        quantities, error = _get_quantities(
+            BasketItemSerializer, items, 'product_info'
+        )
+        if error:
+            return error
+
+        get_object_or_404(Contact, id=contact_id)
+        prices = dict(ProductInfo.objects.filter(
+            id__in=quantities,
+            is_active=True
+        ).values_list('id', 'price'))
+        error = _get_missing_error(quantities, prices)
+        if error:
+            return error
+
+        basket_key, items_key = self._get_keys(user_id)
+
+        def add(pipeline):
+            if any(pipeline.hmget(items_key, list(quantities))):
+                return {
+                    'Status': False,
+                    'Errors': 'Позиция уже существует в корзине'
+                }
+            basket_id = (pipeline.hget(basket_key, 'id')
+                         or self.client.incr(self.id_key))
+
+            pipeline.multi()
+            pipeline.hsetnx(basket_key, 'id', basket_id)
+            # Цена фиксируется в момент добавления в корзину.
+            self._queue_write(pipeline, user_id, contact_id, {
+                product_info_id: {
+                    'quantity': quantity,
+                    'price': prices[product_info_id]
+                }
+                for product_info_id, quantity in quantities.items()
+            })
+            return len(quantities)
+
+        return self.client.transaction(
+            add, items_key, value_from_callable=True
+        )
+
+    def update_items(self, user_id, contact_id, items):
+        """Меняет количество в позициях корзины.
+
+        Позиции читаются и перезаписываются в транзакции Redis
+        под WATCH, поэтому позиция, удаленная параллельным запросом,
+        не возвращается в корзину.
+
+        :return: Количество обновленных позиций или ошибка.
+        """
+        quantities, error = _get_quantities(
+            BasketItemUpdateSerializer, items, 'id'
+        )
+        if error:
+            return error
+
+        get_object_or_404(Contact, id=contact_id)
+        _, items_key = self._get_keys(user_id)
+
+        def update(pipeline):
+            basket_items = {
+                product_info_id: json.loads(item)
+                for product_info_id, item in zip(
+                    quantities, pipeline.hmget(items_key, list(quantities))
+                )
+                if item is not None
+            }
+            error = _get_unknown_item_error(quantities, basket_items)
+            if error:
+                return error
+
+            pipeline.multi()
+            self._queue_write(pipeline, user_id, contact_id, {
+                product_info_id: {
+                    'quantity': quantity,
+                    'price': basket_items[product_info_id]['price']
+                }
+                for product_info_id, quantity in quantities.items()
+            })
+            return len(quantities)
+
+        return self.client.transaction(
+            update, items_key, value_from_callable=True
+        )
+
+    def remove_items(self, user_id, item_ids):
+        """Удаляет позиции корзины, пустая корзина удаляется.
+
+        :return: Количество удаленных позиций.
+        """
+        basket_key, items_key = self._get_keys(user_id)
+        pipeline = self.client.pipeline()
+        pipeline.hdel(items_key, *item_ids)
+        pipeline.hlen(items_key)
+        removed_count, items_count = pipeline.execute()
+        if not items_count:
+            self.client.delete(basket_key)
+        return removed_count
+
+    def place_order(self, user_id, basket_id, contact_id):
+        """Записывает корзину из Redis новым заказом.
+
+        Корзина сначала забирается в ключи оформления, заказ
+        и позиции создаются в транзакции запроса, ключи оформления
+        удаляются после её фиксации. При откате транзакции корзину
+        возвращает restore_basket. Позиции, информация о продуктах
+        которых удалена, пропускаются, как и в таблицах заказов.
+        Позиции, снятые с продажи, остаются в заказе, и резервирование
+        отклоняет его со списком недоступных товаров.
+
+        :return: ИД размещенного заказа или None, если корзина
+            не найдена.
+        """
+        if not self._claim(user_id, basket_id):
+            return None
+
+        checkout_keys = self._get_checkout_keys(user_id, int(basket_id))
+        _, items = self._read(user_id, checkout_keys)
+        items = {
+            product_info_id: items[product_info_id]
+            for product_info_id in ProductInfo.objects.filter(
+                id__in=items
+            ).values_list('id', flat=True)
+        }
+        if not items:
+            self.restore_basket(user_id, basket_id)
+            return None
+
+        order = Order.objects.create(
+            user_id=user_id,
+            state='new',
+            contact_id=contact_id,
+            total_sum=sum(
+                item['price'] * item['quantity'] for item in items.values()
+            ),
+            items_count=len(items)
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_info_id=product_info_id,
+                quantity=item['quantity'],
+                price=item['price']
+            )
+            for product_info_id, item in items.items()
+        ])
+        record_state_events([(order.id, 'basket')], 'new')
+        transaction.on_commit(
+            lambda: self.client.delete(*checkout_keys),
+            robust=True
+        )
+        return order.id
+
+    def _claim(self, user_id, basket_id):
+        """Забирает корзину в ключи оформления.
+
+        ИД корзины проверяется и ключи переименовываются в одной
+        транзакции Redis под WATCH, поэтому корзину забирает только
+        один запрос.
+
+        :return: True, если корзина забрана.
+        """
+        keys = self._get_keys(user_id)
+        checkout_keys = self._get_checkout_keys(user_id, int(basket_id))
+        with self.client.pipeline() as pipeline:
+            try:
+                pipeline.watch(*keys)
+                if (int(pipeline.hget(keys[0], 'id') or 0) != int(basket_id)
+                        or not pipeline.exists(keys[1])):
+                    return False
+                pipeline.multi()
+                for key, checkout_key in zip(keys, checkout_keys):
+                    pipeline.rename(key, checkout_key)
+                pipeline.execute()
+            except redis.WatchError:
+                return False
+        self.claimed.add((user_id, int(basket_id)))
+        return True
+
+    def restore_basket(self, user_id, basket_id):
+        """Возвращает забранную корзину после отката размещения.
+
+        Возвращаются только корзины, забранные этим хранилищем.
+        Позиции переносятся без перезаписи, поэтому корзина,
+        начатая пользователем за время оформления, сохраняется.
+        """
+        if (user_id, int(basket_id)) not in self.claimed:
+            return
+        self.claimed.discard((user_id, int(basket_id)))
+
+        keys = self._get_keys(user_id)
+        checkout_keys = self._get_checkout_keys(user_id, int(basket_id))
+        pipeline = self.client.pipeline(transaction=False)
+        for key in checkout_keys:
+            pipeline.hgetall(key)
+        basket, items = pipeline.execute()
+        if not items:
+            return
+
+        pipeline = self.client.pipeline()
+        for key, values in zip(keys, (basket, items)):
+            for field, value in values.items():
+                pipeline.hsetnx(key, field, value)
+            pipeline.expire(key, settings.BASKET_REDIS_TIMEOUT)
+        pipeline.delete(*checkout_keys)
+        pipeline.execute()
\ No newline at end of file
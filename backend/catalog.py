@@ -0,0 +1,91 @@
+from backend.models import (
+    CatalogItem,
+    ProductInfo,
+    ProductParameter
+)
+from backend.response_cache import invalidate_catalog
+from backend.stock import get_available_quantity
+
+# Поля строки каталога, перезаписываемые при обновлении.
+CATALOG_FIELDS = (
+    'shop', 'shop_state', 'category', 'category_name', 'product',
+    'product_name', 'image', 'model', 'quantity', 'price', 'price_rrc',
+    'parameters',
+)
+
+
+def refresh_catalog_items(product_info_ids):
+    """Пересобирает строки каталога для информации о продуктах.
+
+    Строки создаются или перезаписываются одним запросом
+    INSERT ... ON CONFLICT, строки позиций, снятых с продажи,
+    удаляются, строки удаленных позиций удаляются каскадно вместе
+    с информацией о продукте. Кеш ответов каталога
+    сбрасывается для прежних и новых магазинов и категорий строк.
+
+    :param product_info_ids: Идентификаторы информации о продуктах.
+    """
+    product_info_ids = set(product_info_ids)
+    if not product_info_ids:
+        return
+
+    parameters = {}
+    for product_info_id, name, value in ProductParameter.objects.filter(
+            product_info_id__in=product_info_ids
+    ).order_by('product_info_id', 'id').values_list(
+        'product_info_id', 'parameter__name', 'value'
+    ):
+        parameters.setdefault(product_info_id, []).append(
+            {'parameter': name, 'value': value}
+        )
+
+    shop_ids, category_ids = set(), set()
+    for shop_id, category_id in CatalogItem.objects.filter(
+            pk__in=product_info_ids
+    ).values_list('shop_id', 'category_id'):
+        shop_ids.add(shop_id)
+        category_ids.add(category_id)
+
+    rows = list(ProductInfo.objects.filter(
+        id__in=product_info_ids,
+        is_active=True
+    ).values(
+        'id', 'shop_id', 'shop__state', 'product_id',
+        'product__name', 'product__image', 'product__category_id',
+        'product__category__name', 'model', 'price', 'price_rrc',
+        available=get_available_quantity()
+    ))
+    CatalogItem.objects.bulk_create(
+        [
+            CatalogItem(
+                product_info_id=row['id'],
+                shop_id=row['shop_id'],
+                shop_state=row['shop__state'],
+                category_id=row['product__category_id'],
+                category_name=row['product__category__name'] or '',
+                product_id=row['product_id'],
+                product_name=row['product__name'] or '',
+                image=row['product__image'] or '',
+                model=row['model'],
+                quantity=row['available'],
+                price=row['price'],
+                price_rrc=row['price_rrc'],
+                parameters=parameters.get(row['id'], [])
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['product_info'],
+        update_fields=CATALOG_FIELDS
+    )
+    CatalogItem.objects.filter(
+        pk__in=product_info_ids
+    ).exclude(
+        pk__in=[row['id'] for row in rows]
+    ).delete()
+    invalidate_catalog(
+        shop_ids=shop_ids | {row['shop_id'] for row in rows},
+        category_ids=category_ids | {
+            row['product__category_id'] for row in rows
+        }
+    )
\ No newline at end of file
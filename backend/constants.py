@@ -9,20 +9,40 @@ USER_TYPE_CHOICES = {
 }
 
 CACHE_TIMEOUT = 60
+# Заголовок Cache-Control: клиенты перепроверяют ответ по ETag,
+# CDN хранит его не дольше HTTP_CACHE_S_MAXAGE секунд.
+HTTP_CACHE_MAX_AGE = 0
+HTTP_CACHE_S_MAXAGE = 60
 
 # Константы Shop
 SHOPNAME_FIELD_LEN = 50
+ETAG_FIELD_LEN = 255
+LAST_MODIFIED_FIELD_LEN = 40
+CONTENT_HASH_FIELD_LEN = 64
 
 # Константы Category
 CATNAME_FIELD_LEN = 40
 
 # Константы Product
 PRNAME_FIELD_LEN = 80
+IMAGE_PATH_FIELD_LEN = 100
 
 # Константы ProductInfo
 MODEL_FIELD_LEN = 80
 MIN_QUANTITY_VALUE = 1
 MIN_PRICE_VALUE = 0.1
+PRODUCT_PAGE_SIZE = 20
+PRODUCT_MAX_PAGE_SIZE = 100
+PRODUCT_ORDERINGS = {
+    'id': ('pk',),
+    '-id': ('-pk',),
+    'price': ('price', 'pk'),
+    '-price': ('-price', '-pk'),
+}
+PRODUCT_SEARCH_ORDERING = ('-rank', 'pk')
+SEARCH_CONFIG = 'russian'
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = 60 * 5
 
 # Константы Parameter
 PARAMNAME_FIELD_LEN = 40
@@ -42,6 +62,9 @@ PHONE_FIELD_LEN = 20
 # Константы Order
 STATE_FIELD_LEN = 15
 MIN_ORDER_QUANTITY_VALUE = 1
+MAX_ORDER_QUANTITY_VALUE = 32767
+ORDER_BATCH_MAX_SIZE = 1000
+ORDER_CHANGES_PAGE_SIZE = 100
 
 # Константы ConfirmEmailToken
 KEY_FIELD_LEN = 64
@@ -55,4 +78,39 @@ ORDER_STATUS = {
     'sent': 'Отправлен',
     'delivered': 'Доставлен',
     'canceled': 'Отменен',
+}
+
+# Разрешенные переходы между статусами заказа
+ORDER_TRANSITIONS = {
+    'basket': ('new',),
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled',),
+    'assembled': ('sent',),
+    'sent': ('delivered',),
+}
+
+# Константы импорта прайс-листов
+IMPORT_BATCH_SIZE = 1000
+IMPORT_REQUEST_TIMEOUT = 60
+IMPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_SPOOL_SIZE = 16 * 1024 * 1024
+IMPORT_PHASE_FIELD_LEN = 15
+IMPORT_ACTIVE_PHASES = ('queued', 'downloading', 'importing')
+IMPORT_JOB_PHASES = {
+    'queued': 'В очереди',
+    'downloading': 'Загрузка',
+    'importing': 'Импорт',
+    'not_modified': 'Не изменен',
+    'done': 'Завершен',
+    'partial': 'Импортирован частично',
+    'failed': 'Ошибка',
+}
+
+# Константы очереди исходящих писем
+OUTBOX_SUBJECT_FIELD_LEN = 255
+OUTBOX_STATE_FIELD_LEN = 10
+OUTBOX_STATES = {
+    'pending': 'Ожидает отправки',
+    'sent': 'Отправлено',
+    'dead': 'Не доставлено',
 }
\ No newline at end of file
@@ -0,0 +1,94 @@
+import re
+
+from django.db.models import Count, Exists, OuterRef
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from backend.models import ProductParameter
+
+PARAMETER_FILTER = re.compile(r'^param(?P<bound>_min|_max)?\[(?P<name>.+)\]$')
+
+
+def _parse_number(key, value):
+    number = ProductParameter.parse_numeric(value)
+    if number is None:
+        raise ValidationError(
+            detail=f'Укажите корректное значение {key}',
+            code=status.HTTP_400_BAD_REQUEST
+        )
+    return number
+
+
+def _has_parameter(name, **lookups):
+    return Exists(
+        ProductParameter.objects.filter(
+            product_info_id=OuterRef('pk'),
+            parameter__name=name,
+            **lookups
+        )
+    )
+
+
+def filter_product_infos(queryset, query_params):
+    """Отбирает информацию о продуктах по цене и значениям параметров.
+
+    Подходит для queryset информации о продуктах и строк каталога,
+    первичный ключ которых совпадает с ИД информации о продукте.
+
+    Поддерживаемые параметры запроса:
+    price_min, price_max - диапазон цены;
+    param[Название]=значение - точное значение параметра, при повторе
+    параметра подходит любое из значений;
+    param_min[Название], param_max[Название] - диапазон числового
+    значения параметра.
+    """
+    for key, lookup in (('price_min', 'gte'), ('price_max', 'lte')):
+        value = query_params.get(key)
+        if value:
+            queryset = queryset.filter(
+                **{f'price__{lookup}': _parse_number(key, value)}
+            )
+
+    for key in query_params:
+        match = PARAMETER_FILTER.match(key)
+        if match is None:
+            continue
+        name, bound = match.group('name'), match.group('bound')
+        if bound is None:
+            queryset = queryset.filter(_has_parameter(
+                name,
+                value__in=query_params.getlist(key)
+            ))
+        else:
+            lookup = 'gte' if bound == '_min' else 'lte'
+            queryset = queryset.filter(_has_parameter(
+                name,
+                **{f'numeric_value__{lookup}': _parse_number(
+                    key, query_params.get(key)
+                )}
+            ))
+    return queryset
+
+
+def get_parameter_facets(queryset):
+    """Возвращает количество товаров по значениям параметров.
+
+    Подсчет выполняется одним агрегирующим запросом по всем
+    отобранным товарам, а не по текущей странице.
+
+    :return: Словарь {название параметра: [{'value', 'count'}, ...]}.
+    """
+    rows = ProductParameter.objects.filter(
+        product_info_id__in=queryset.order_by().values('pk')
+    ).values(
+        'parameter__name', 'value'
+    ).annotate(
+        count=Count('id')
+    ).order_by('parameter__name', 'value')
+
+    facets = {}
+    for row in rows:
+        facets.setdefault(row['parameter__name'], []).append(
+            {'value': row['value'], 'count': row['count']}
+        )
+    return facets
\ No newline at end of file
@@ -0,0 +1,587 @@
+import hashlib
+import math
+import random
+from http import HTTPStatus
+from tempfile import SpooledTemporaryFile
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from yaml.events import (
+    AliasEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent
+)
+from yaml.nodes import (
+    MappingNode,
+    ScalarNode,
+    SequenceNode
+)
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from backend.catalog import refresh_catalog_items
+from backend.constants import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_CHUNK_SIZE,
+    IMPORT_REQUEST_TIMEOUT,
+    IMPORT_SPOOL_SIZE
+)
+from backend.models import (
+    Category,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop
+)
+from backend.response_cache import invalidate_resource
+from backend.search import update_search_vectors
+
+# Поля позиции, изменение которых требует обновления строки.
+SYNC_FIELDS = (
+    'product_id', 'model', 'price', 'price_rrc', 'quantity', 'is_active'
+)
+
+
+class PartialImportError(Exception):
+    """Импорт прерван после записи части позиций.
+
+    Записанные пачки остаются в каталоге, позиции, которых нет
+    в прочитанной части прайс-листа, не снимаются с продажи."""
+
+    def __init__(self, error, changes):
+        super().__init__(str(error))
+        self.changes = changes
+
+
+def _compose_node(loader, anchors):
+    """Собирает узел YAML из событий парсера.
+
+    Нужен для разбора документа по частям: C-парсер не умеет
+    собирать отдельные узлы, только документ целиком."""
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark,
+                          event.end_mark, style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None,
+                            flow_style=event.flow_style)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose_node(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None,
+                           flow_style=event.flow_style)
+        while not loader.check_event(MappingEndEvent):
+            key = _compose_node(loader, anchors)
+            node.value.append((key, _compose_node(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise ValueError('Некорректный формат прайс-листа')
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def read_price_list(stream, batch_size=IMPORT_BATCH_SIZE):
+    """Потоково разбирает прайс-лист.
+
+    Документ читается по событиям, поэтому в памяти находится
+    только текущая пачка товаров. Если установлен libyaml,
+    используется C-парсер.
+
+    :param stream: Файлоподобный объект с YAML-документом.
+    :param batch_size: Количество товаров в пачке.
+    :return: Генератор пар (ключ, значение) верхнего уровня документа,
+        товары отдаются несколькими парами ('goods', [...]).
+    """
+    loader = SafeLoader(stream)
+    anchors = {}
+    try:
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise ValueError('Некорректный формат прайс-листа')
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            key = loader.construct_document(_compose_node(loader, anchors))
+            if key != 'goods' or not loader.check_event(SequenceStartEvent):
+                yield key, loader.construct_document(
+                    _compose_node(loader, anchors)
+                )
+                continue
+
+            loader.get_event()
+            batch = []
+            while not loader.check_event(SequenceEndEvent):
+                batch.append(
+                    loader.construct_document(_compose_node(loader, anchors))
+                )
+                if len(batch) == batch_size:
+                    yield key, batch
+                    batch = []
+            loader.get_event()
+            if batch:
+                yield key, batch
+    finally:
+        loader.dispose()
+
+
+def count_price_list_goods(stream):
+    """Считает позиции прайс-листа по событиям парсера.
+
+    Объекты позиций не строятся, поэтому подсчет заметно быстрее
+    импорта, а в памяти не хранится ничего, кроме счетчиков.
+
+    :param stream: Файлоподобный объект с YAML-документом.
+    :return: Количество позиций в списках goods.
+    """
+    loader = SafeLoader(stream)
+    count, depth, goods_depth, key, is_key = 0, 0, None, None, True
+    try:
+        while loader.check_event():
+            event = loader.get_event()
+            if isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                depth -= 1
+                if depth == 1:
+                    goods_depth = None
+                continue
+            if not isinstance(event, (AliasEvent, MappingStartEvent,
+                                      ScalarEvent, SequenceStartEvent)):
+                continue
+
+            if depth == goods_depth:
+                count += 1
+            elif depth == 1:
+                # Ключи и значения верхнего уровня чередуются.
+                if is_key:
+                    key = getattr(event, 'value', None)
+                elif key == 'goods' and isinstance(event, SequenceStartEvent):
+                    goods_depth = 2
+                is_key = not is_key
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                depth += 1
+    finally:
+        loader.dispose()
+    return count
+
+
+def download_price_list(url, shop=None):
+    """Загружает прайс-лист во временный файл.
+
+    Если магазин уже импортировал документ по этой ссылке, запрос
+    отправляется с заголовками If-None-Match и If-Modified-Since,
+    а загруженный документ сравнивается с сохраненным хэшем.
+
+    :param url: Ссылка на прайс-лист.
+    :param shop: Магазин, для которого загружается прайс-лист.
+    :return: Временный файл с документом или None, если документ
+        не изменился, и значения полей etag, last_modified
+        и content_hash для магазина.
+    """
+    headers = {}
+    is_known = shop is not None and shop.url == url
+    if is_known and shop.etag:
+        headers['If-None-Match'] = shop.etag
+    if is_known and shop.last_modified:
+        headers['If-Modified-Since'] = shop.last_modified
+
+    with requests.get(
+            url,
+            headers=headers,
+            stream=True,
+            timeout=IMPORT_REQUEST_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            return None, {
+                'etag': shop.etag,
+                'last_modified': shop.last_modified,
+                'content_hash': shop.content_hash,
+            }
+
+        file = SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+        digest = hashlib.sha256()
+        for chunk in response.iter_content(chunk_size=IMPORT_CHUNK_SIZE):
+            digest.update(chunk)
+            file.write(chunk)
+        fields = {
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+            'content_hash': digest.hexdigest(),
+        }
+
+    if is_known and shop.content_hash == fields['content_hash']:
+        file.close()
+        return None, fields
+    file.seek(0)
+    return file, fields
+
+
+def get_refresh_countdowns(urls):
+    """Распределяет плановые импорты прайс-листов во времени.
+
+    Импорты разбиваются на волны по PRICE_LIST_REFRESH_CONCURRENCY,
+    волны равномерно распределяются по окну PRICE_LIST_REFRESH_WINDOW.
+    Запросы к одному хосту разносятся минимум на
+    PRICE_LIST_HOST_INTERVAL секунд, к каждому запуску добавляется
+    случайная задержка до PRICE_LIST_REFRESH_JITTER секунд.
+
+    :param urls: Ссылки на прайс-листы в порядке запуска.
+    :return: Задержки запуска импортов в секундах.
+    """
+    concurrency = max(settings.PRICE_LIST_REFRESH_CONCURRENCY, 1)
+    wave_interval = settings.PRICE_LIST_REFRESH_WINDOW / max(
+        math.ceil(len(urls) / concurrency), 1
+    )
+    next_slots, countdowns = {}, []
+    for index, url in enumerate(urls):
+        host = urlsplit(url).hostname
+        countdown = max(
+            index // concurrency * wave_interval,
+            next_slots.get(host, 0)
+        ) + random.uniform(0, settings.PRICE_LIST_REFRESH_JITTER)
+        next_slots[host] = countdown + settings.PRICE_LIST_HOST_INTERVAL
+        countdowns.append(countdown)
+    return countdowns
+
+
+class PriceListImporter:
+    """Импортирует прайс-лист поставщика.
+
+    Категории, продукты, параметры и информация о продуктах
+    разрешаются пакетными запросами, поэтому количество запросов
+    на пачку позиций не зависит от её размера."""
+
+    def __init__(self, user=None, batch_size=IMPORT_BATCH_SIZE,
+                 on_progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+
+    def run(self, price_list):
+        """Импортирует прайс-лист.
+
+        Каждая пачка позиций записывается в отдельной транзакции,
+        после неё вызывается on_progress(processed). Позиции, которых
+        нет в прайс-листе, не удаляются, а снимаются с продажи:
+        на них ссылаются позиции заказов.
+
+        Если импорт прерывается после записи хотя бы одной пачки,
+        снятие с продажи пропускается и выбрасывается
+        PartialImportError со счетчиками записанных изменений.
+
+        :param price_list: Пары (ключ, значение) верхнего уровня
+            прайс-листа: результат read_price_list или dict.items().
+        :return: Количество добавленных, обновленных, неизмененных
+            и снятых с продажи позиций.
+        """
+        stats = dict.fromkeys(
+            ('inserted', 'updated', 'unchanged', 'deactivated'), 0
+        )
+        seen = set()
+        try:
+            shop = self._import_goods_batches(price_list, stats, seen)
+        except Exception as err:
+            if seen:
+                raise PartialImportError(err, stats) from err
+            raise
+
+        with transaction.atomic():
+            deactivated = list(ProductInfo.objects.filter(
+                shop=shop,
+                is_active=True
+            ).exclude(
+                external_id__in=seen
+            ).values_list('id', flat=True))
+            ProductInfo.objects.filter(id__in=deactivated).update(
+                is_active=False,
+                quantity=0
+            )
+            refresh_catalog_items(deactivated)
+        stats['deactivated'] = len(deactivated)
+        return stats
+
+    def _import_goods_batches(self, price_list, stats, seen):
+        """Записывает магазин, категории и пачки позиций прайс-листа.
+
+        Внешние ИД записанных позиций добавляются в seen, счетчики
+        изменений пачки добавляются в stats после её фиксации.
+
+        :return: Магазин прайс-листа.
+        """
+        shop, categories, pending, processed = None, [], [], 0
+        for key, value in price_list:
+            if key == 'shop':
+                with transaction.atomic():
+                    shop = self._get_shop(value)
+                    self._import_categories(shop, categories)
+            elif key == 'categories':
+                categories = value or []
+                if shop is not None:
+                    with transaction.atomic():
+                        self._import_categories(shop, categories)
+            elif key == 'goods':
+                # Товары, указанные раньше магазина, откладываются
+                # до его появления в документе.
+                pending.append(value or [])
+            if shop is None:
+                continue
+
+            for goods in pending:
+                for start in range(0, len(goods), self.batch_size):
+                    batch = goods[start:start + self.batch_size]
+                    batch_stats = dict.fromkeys(stats, 0)
+                    with transaction.atomic():
+                        self._import_goods(shop, batch, batch_stats)
+                    for name, count in batch_stats.items():
+                        stats[name] += count
+                    seen.update(item.get('id') for item in batch)
+                    processed += len(batch)
+                    if self.on_progress:
+                        self.on_progress(processed)
+            pending.clear()
+
+        if shop is None:
+            raise ValueError('В прайс-листе не указан магазин')
+        return shop
+
+    def _get_shop(self, name):
+        """Возвращает магазин пользователя.
+
+        Без пользователя (команда upload) магазин ищется по названию."""
+        if self.user is None:
+            shop = Shop.objects.filter(name=name).first()
+            return shop or Shop.objects.create(name=name)
+        shop, _ = Shop.objects.get_or_create(name=name, user=self.user)
+        return shop
+
+    def _import_categories(self, shop, categories):
+        names = {
+            category.get('id'): category.get('name')
+            for category in categories
+        }
+        existing = set(
+            Category.objects.filter(
+                id__in=names
+            ).values_list('id', flat=True)
+        )
+        if len(existing) < len(names):
+            Category.objects.bulk_create(
+                [
+                    Category(id=category_id, name=name)
+                    for category_id, name in names.items()
+                    if category_id not in existing
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            invalidate_resource('categories')
+        Category.shops.through.objects.bulk_create(
+            [
+                Category.shops.through(category_id=category_id, shop=shop)
+                for category_id in names
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def _get_products(self, goods):
+        """Возвращает отображение (название, категория) → ИД продукта.
+
+        Недостающие продукты создаются с ignore_conflicts, поэтому
+        параллельные импорты не создают дубликатов, а ИД созданных
+        другим импортом продуктов выбираются повторно."""
+        keys = {(item.get('name'), item.get('category')) for item in goods}
+        products = self._select_products(keys)
+        missing = keys - set(products)
+        if missing:
+            Product.objects.bulk_create(
+                [
+                    Product(name=name, category_id=category_id)
+                    for name, category_id in missing
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            products.update(self._select_products(missing))
+        return products
+
+    def _select_products(self, keys):
+        return {
+            (name, category_id): product_id
+            for product_id, name, category_id in Product.objects.filter(
+                name__in={name for name, _ in keys},
+                category_id__in={category_id for _, category_id in keys}
+            ).values_list('id', 'name', 'category_id')
+            if (name, category_id) in keys
+        }
+
+    def _get_parameters(self, goods):
+        """Возвращает отображение название параметра → ИД параметра."""
+        names = {
+            name
+            for item in goods
+            for name in (item.get('parameters') or {})
+        }
+        parameters = dict(
+            Parameter.objects.filter(
+                name__in=names
+            ).values_list('name', 'id')
+        )
+        missing = names - set(parameters)
+        if missing:
+            Parameter.objects.bulk_create(
+                [Parameter(name=name) for name in missing],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            parameters.update(
+                Parameter.objects.filter(
+                    name__in=missing
+                ).values_list('name', 'id')
+            )
+        return parameters
+
+    def _get_existing(self, shop, goods):
+        """Возвращает сохраненные позиции пачки по внешнему ИД.
+
+        Каждой позиции сопоставляются значения её параметров."""
+        existing = {
+            row['external_id']: row
+            for row in ProductInfo.objects.filter(
+                shop=shop,
+                external_id__in=[item.get('id') for item in goods]
+            ).values('id', 'external_id', *SYNC_FIELDS)
+        }
+        parameters = {}
+        for product_info_id, parameter_id, value in (
+                ProductParameter.objects.filter(
+                    product_info_id__in=[
+                        row['id'] for row in existing.values()
+                    ]
+                ).values_list('product_info_id', 'parameter_id', 'value')
+        ):
+            parameters.setdefault(product_info_id, {})[parameter_id] = value
+        for row in existing.values():
+            row['parameters'] = parameters.get(row['id'], {})
+        return existing
+
+    def _import_goods(self, shop, goods, stats):
+        """Синхронизирует пачку позиций магазина с прайс-листом.
+
+        Позиции сопоставляются по внешнему ИД: новые создаются,
+        изменившиеся обновляются, остальные не затрагиваются.
+        Счетчики изменений накапливаются в stats."""
+        products = self._get_products(goods)
+        parameters = self._get_parameters(goods)
+        existing = self._get_existing(shop, goods)
+        created, changed, new_parameters = [], [], []
+        stale_parameters = set()
+
+        for item in goods:
+            values = {
+                'product_id': products[
+                    (item.get('name'), item.get('category'))
+                ],
+                'model': item.get('model'),
+                'price': item.get('price'),
+                'price_rrc': item.get('price_rrc'),
+                'quantity': item.get('quantity'),
+                'is_active': True,
+            }
+            item_parameters = {
+                parameters[name]: str(value)
+                for name, value in (item.get('parameters') or {}).items()
+            }
+            row = existing.pop(item.get('id'), None)
+            if row is None:
+                created.append((
+                    ProductInfo(
+                        external_id=item.get('id'),
+                        shop=shop,
+                        **values
+                    ),
+                    item_parameters
+                ))
+                stats['inserted'] += 1
+                continue
+
+            is_changed = False
+            if any(row[field] != values[field] for field in SYNC_FIELDS):
+                changed.append(ProductInfo(id=row['id'], **values))
+                is_changed = True
+            if row['parameters'] != item_parameters:
+                stale_parameters.add(row['id'])
+                new_parameters.extend(
+                    ProductParameter(
+                        product_info_id=row['id'],
+                        parameter_id=parameter_id,
+                        value=value,
+                        numeric_value=ProductParameter.parse_numeric(value)
+                    )
+                    for parameter_id, value in item_parameters.items()
+                )
+                is_changed = True
+            stats['updated' if is_changed else 'unchanged'] += 1
+
+        if changed:
+            ProductInfo.objects.bulk_update(
+                changed,
+                SYNC_FIELDS,
+                batch_size=self.batch_size
+            )
+        if stale_parameters:
+            ProductParameter.objects.filter(
+                product_info_id__in=stale_parameters
+            ).delete()
+
+        product_infos = ProductInfo.objects.bulk_create(
+            [product_info for product_info, _ in created],
+            batch_size=self.batch_size
+        )
+        new_parameters.extend(
+            ProductParameter(
+                product_info_id=product_info.id,
+                parameter_id=parameter_id,
+                value=value,
+                numeric_value=ProductParameter.parse_numeric(value)
+            )
+            for product_info, (_, item_parameters) in zip(
+                product_infos, created
+            )
+            for parameter_id, value in item_parameters.items()
+        )
+        ProductParameter.objects.bulk_create(
+            new_parameters,
+            batch_size=self.batch_size
+        )
+        touched = (
+            {product_info.id for product_info in changed}
+            | stale_parameters
+            | {product_info.id for product_info in product_infos}
+        )
+        update_search_vectors(touched)
+        refresh_catalog_items(touched)
\ No newline at end of file
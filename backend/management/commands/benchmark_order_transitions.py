@@ -0,0 +1,147 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate
+)
+
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OutboxEmail,
+    Product,
+    ProductInfo,
+    Shop,
+    User
+)
+from backend.views import OrderViewSet
+
+TRANSITIONS = (
+    ('assemble_order', 'confirmed'),
+    ('send_order', 'assembled'),
+    ('deliver_order', 'sent'),
+    ('cancel_order', 'new'),
+)
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+
+
+class Command(BaseCommand):
+    help = ('Измерить задержку запросов смены состояния заказа '
+            '(p50, p99), данные удаляются после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Количество запросов на каждый переход'
+        )
+
+    def handle(self, *args, **options):
+        data = self._create_data()
+        try:
+            self._run(data, options['requests'])
+        finally:
+            self._delete_data(data)
+
+    def _create_data(self):
+        """Создает заказ с одной позицией для замера.
+
+        Каждый запрос фиксирует свою транзакцию, поэтому данные
+        создаются вне транзакции и удаляются после замера."""
+        user = User.objects.create_user(
+            username='benchmark_user',
+            email=BENCHMARK_EMAIL,
+            password='benchmark_password'
+        )
+        shop = Shop.objects.create(name='benchmark_shop')
+        category = Category.objects.create(name='benchmark_category')
+        product = Product.objects.create(
+            name='benchmark_product',
+            category=category
+        )
+        product_info = ProductInfo.objects.create(
+            product=product,
+            shop=shop,
+            external_id=1,
+            model='benchmark_model',
+            quantity=1000,
+            price=100,
+            price_rrc=100
+        )
+        order = Order.objects.create(
+            user=user,
+            state='new',
+            contact=Contact.objects.create(
+                user=user,
+                city='Москва',
+                street='Тверская',
+                house='1',
+                phone='+79134567890'
+            )
+        )
+        OrderItem.objects.create(
+            order=order,
+            product_info=product_info,
+            quantity=1,
+            price=100
+        )
+        return {
+            'user': user,
+            'shop': shop,
+            'category': category,
+            'product': product,
+            'product_info': product_info,
+            'order': order
+        }
+
+    def _delete_data(self, data):
+        data['order'].delete()
+        data['shop'].delete()
+        data['product'].delete()
+        data['category'].delete()
+        data['user'].delete()
+        OutboxEmail.objects.filter(to=[BENCHMARK_EMAIL]).delete()
+
+    def _run(self, data, count):
+        factory = APIRequestFactory()
+        user, order = data['user'], data['order']
+        product_info = data['product_info']
+
+        for action, state in TRANSITIONS:
+            view = OrderViewSet.as_view(
+                {'post': action},
+                throttle_classes=()
+            )
+            timings = []
+            for _ in range(count):
+                Order.objects.filter(id=order.id).update(state=state)
+                ProductInfo.objects.filter(id=product_info.id).update(
+                    quantity=1000,
+                    reserved=1
+                )
+                request = factory.post(
+                    f'/api/v1/order/{action}/',
+                    {'order_id': order.id}
+                )
+                force_authenticate(request, user=user)
+                started = time.perf_counter()
+                with transaction.atomic():
+                    response = view(request)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{action}: запрос вернул {response.status_code}'
+                    )
+
+            percentiles = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f'{action}: p50 {percentiles[49] * 1000:.2f} мс, '
+                f'p99 {percentiles[98] * 1000:.2f} мс'
+            )
\ No newline at end of file
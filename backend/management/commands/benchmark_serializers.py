@@ -0,0 +1,160 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import (
+    CatalogItem,
+    Category,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter
+)
+from backend.renderers import UJSONRenderer
+from backend.serializers import (
+    CatalogRowSerializer,
+    ProductInfoSerializer
+)
+
+PARAMETERS = (
+    ('Диагональ (дюйм)', '6.1'),
+    ('Разрешение (пикс)', '1792x828'),
+    ('Встроенная память (Гб)', '256'),
+    ('Цвет', 'черный'),
+)
+
+
+class CatalogItemSerializer(serializers.ModelSerializer):
+    """Строка каталога через ModelSerializer.
+
+    Используется только для сравнения с CatalogRowSerializer."""
+
+    id = serializers.IntegerField(source='pk')
+    product = serializers.SerializerMethodField()
+    shop = serializers.IntegerField(source='shop_id')
+    product_parameters = serializers.JSONField(source='parameters')
+
+    class Meta:
+        model = CatalogItem
+        fields = ('id', 'model', 'product', 'shop', 'quantity',
+                  'price', 'price_rrc', 'product_parameters',)
+        read_only_fields = fields
+
+    def get_product(self, obj):
+        return {
+            'name': obj.product_name,
+            'category': obj.category_name,
+            'image': default_storage.url(obj.image) if obj.image else None,
+        }
+
+
+def make_product_infos(count):
+    """Создает в памяти информацию о продуктах с параметрами."""
+    category = Category(id=1, name='Смартфоны')
+    parameters = [
+        Parameter(id=number, name=name)
+        for number, (name, _) in enumerate(PARAMETERS, start=1)
+    ]
+    product_infos = []
+    for number in range(1, count + 1):
+        product_info = ProductInfo(
+            id=number,
+            product=Product(
+                id=number,
+                name=f'Смартфон {number}',
+                category=category
+            ),
+            shop_id=1,
+            model=f'model/{number}',
+            quantity=5,
+            price=100.0 + number,
+            price_rrc=150.0 + number
+        )
+        product_info._prefetched_objects_cache = {
+            'product_parameters': [
+                ProductParameter(parameter=parameter, value=value)
+                for parameter, (_, value) in zip(parameters, PARAMETERS)
+            ]
+        }
+        product_infos.append(product_info)
+    return product_infos
+
+
+def make_catalog_rows(product_infos):
+    """Строит строки каталога, как их возвращает values()."""
+    return [
+        {
+            'pk': product_info.id,
+            'model': product_info.model,
+            'product_name': product_info.product.name,
+            'category_name': product_info.product.category.name,
+            'image': '',
+            'shop_id': product_info.shop_id,
+            'quantity': product_info.quantity,
+            'price': product_info.price,
+            'price_rrc': product_info.price_rrc,
+            'parameters': [
+                {'parameter': name, 'value': value}
+                for name, value in PARAMETERS
+            ],
+        }
+        for product_info in product_infos
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнить скорость сериализации списка товаров '
+            'сериализаторами DRF и по строкам values()')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Количество товаров в списке'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов, учитывается лучший результат'
+        )
+
+    def handle(self, *args, **options):
+        product_infos = make_product_infos(options['rows'])
+        rows = make_catalog_rows(product_infos)
+        catalog_items = [
+            CatalogItem(
+                product_info_id=row['pk'],
+                **{field: value for field, value in row.items()
+                   if field != 'pk'}
+            )
+            for row in rows
+        ]
+        cases = (
+            ('ProductInfoSerializer + JSONRenderer', lambda: JSONRenderer(
+            ).render(ProductInfoSerializer(product_infos, many=True).data)),
+            ('CatalogItemSerializer + JSONRenderer', lambda: JSONRenderer(
+            ).render(CatalogItemSerializer(catalog_items, many=True).data)),
+            ('CatalogRowSerializer + UJSONRenderer', lambda: UJSONRenderer(
+            ).render(CatalogRowSerializer(rows).data)),
+        )
+
+        results = []
+        for name, render in cases:
+            best = min(
+                self._measure(render) for _ in range(options['repeat'])
+            )
+            results.append(best)
+            self.stdout.write(
+                f'{name}: {best * 1000:.1f} мс '
+                f'(x{results[0] / best:.1f})'
+            )
+
+    def _measure(self, render):
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from backend.outbox import OutboxDispatcher
+
+
+class Command(BaseCommand):
+    help = ('Отправить письма из очереди исходящих писем '
+            'и вывести скорость отправки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Количество писем в пачке'
+        )
+
+    def handle(self, *args, **options):
+        metrics = OutboxDispatcher(batch_size=options['batch_size']).run()
+        self.stdout.write(
+            f'Отправлено писем: {metrics["sent"]}, '
+            f'отложено: {metrics["retried"]}, '
+            f'не доставлено: {metrics["dead"]}\n'
+            f'Сообщений: {metrics["messages"]}, '
+            f'соединений: {metrics["connections"]}\n'
+            f'Сообщений в секунду: {metrics["messages_per_second"]:.1f}\n'
+            'Повторное использование соединения: '
+            f'{metrics["connection_reuse_ratio"]:.0%}'
+        )
\ No newline at end of file
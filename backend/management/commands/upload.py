@@ -1,67 +1,129 @@
-import yaml
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-from backend.models import (
-    Category,
-    Product,
-    ProductInfo,
-    Shop
-)
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from backend.constants import IMPORT_BATCH_SIZE
+from backend.importers import PriceListImporter, read_price_list
+
+
+def import_file(path, batch_size):
+    """Импортирует один файл и возвращает статистику и время импорта."""
+    started = time.monotonic()
+    with open(file=path, mode='rb') as file:
+        stats = PriceListImporter(batch_size=batch_size).run(
+            read_price_list(file, batch_size)
+        )
+    return stats, time.monotonic() - started
 
 
 class Command(BaseCommand):
-    help = 'Импортировать данные из файла YAML'
+    help = 'Импортировать данные из файлов YAML'
 
     def add_arguments(self, parser):
-        parser.add_argument('--path', type=str)
-
-    def handle(self, *args, **options):
-        file_path = options.get('path')
-        with open(file=file_path, mode='r') as file:
-            data = yaml.safe_load(file)
-            shop = self._create_or_get_shop(data.get('shop'))
-            self._create_categories(shop, data.get('categories'))
-            self._create_products(data.get('goods'))
-        self.stdout.write(
-            self.style.SUCCESS('Данные успешно импортированы!')
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            type=Path,
+            help='Файлы прайс-листов или каталоги с ними'
+        )
+        parser.add_argument(
+            '--path',
+            type=Path,
+            action='append',
+            default=[],
+            help='Файл прайс-листа или каталог с ними'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=('Количество процессов, импортирующих файлы параллельно. '
+                  'Каждый файл должен относиться к отдельному магазину.')
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Количество позиций, записываемых в одной транзакции'
         )
 
-    def _create_or_get_shop(self, shop_name):
-        shop, _ = Shop.objects.get_or_create(name=shop_name)
-        return shop
+    def handle(self, *args, **options):
+        files = self._collect_files(options['paths'] + options['path'])
+        if not files:
+            raise CommandError('Не указаны файлы для импорта')
 
-    def _create_categories(self, shop, categories_data):
-        for category_data in categories_data:
-            category, _ = Category.objects.get_or_create(
-                id=category_data.get('id'),
-                name=category_data.get('name')
+        workers = max(options['workers'], 1)
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total, failed = 0, []
+        if workers == 1:
+            results = (
+                (path, self._safe_call(import_file, path, batch_size))
+                for path in files
             )
-            category.shops.add(shop)
-
-    def _create_products(self, products_data):
-        for item in products_data:
-            category_id = item.get('category')
-            category = Category.objects.get(id=category_id)
-            product, _ = Product.objects.get_or_create(
-                name=item.get('name'),
-                category=category
+        else:
+            # Дочерние процессы должны открыть собственные соединения.
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers)
+            futures = [
+                (path, executor.submit(import_file, path, batch_size))
+                for path in files
+            ]
+            results = (
+                (path, self._safe_call(future.result))
+                for path, future in futures
             )
-            product_info, _ = ProductInfo.objects.get_or_create(
-                external_id=item.get('id'),
-                product=product,
-                shop=category.shops.first(),
-                defaults={
-                    'model': item.get('model'),
-                    'price': item.get('price'),
-                    'price_rrc': item.get('price_rrc'),
-                    'quantity': item.get('quantity')
-                }
+
+        for path, result in results:
+            if isinstance(result, Exception):
+                failed.append(path)
+                self.stderr.write(f'{path}: {result}')
+                continue
+            stats, elapsed = result
+            rows = stats['inserted'] + stats['updated'] + stats['unchanged']
+            total += rows
+            self.stdout.write(
+                f'{path}: {rows} позиций за {elapsed:.2f} с '
+                f'({rows / max(elapsed, 1e-6):.0f} строк/с), '
+                f'добавлено {stats["inserted"]}, '
+                f'обновлено {stats["updated"]}, '
+                f'снято с продажи {stats["deactivated"]}'
             )
-            self._update_product_parameters(
-                product_info, item.get('parameters')
+        if workers > 1:
+            executor.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Итого: {total} позиций за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        )
+        if failed:
+            raise CommandError(
+                f'Не удалось импортировать файлов: {len(failed)}'
             )
+        self.stdout.write(
+            self.style.SUCCESS('Данные успешно импортированы!')
+        )
+
+    def _collect_files(self, paths):
+        files = []
+        for path in paths:
+            if path.is_dir():
+                files.extend(sorted(
+                    file for file in path.iterdir()
+                    if file.suffix in ('.yaml', '.yml')
+                ))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f'Файл {path} не найден')
+        return files
 
-    def _update_product_parameters(self, product, parameters_data):
-        for name, value in parameters_data.items():
-            setattr(product, name, value)
-        product.save()
\ No newline at end of file
+    def _safe_call(self, func, *args):
+        try:
+            return func(*args)
+        except Exception as err:
+            return err
\ No newline at end of file
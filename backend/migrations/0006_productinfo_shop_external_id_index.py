@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0005_product_image_user_avatar"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productinfo",
+            index=models.Index(
+                fields=["shop", "external_id"], name="product_info_shop_ext_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0006_productinfo_shop_external_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("url", models.URLField(verbose_name="Ссылка")),
+                (
+                    "phase",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("downloading", "Загрузка"),
+                            ("importing", "Импорт"),
+                            ("done", "Завершен"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="queued",
+                        max_length=15,
+                        verbose_name="Этап",
+                    ),
+                ),
+                (
+                    "processed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Обработано позиций"
+                    ),
+                ),
+                (
+                    "total",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Всего позиций"
+                    ),
+                ),
+                (
+                    "changes",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Изменения"
+                    ),
+                ),
+                (
+                    "errors",
+                    models.JSONField(blank=True, default=list, verbose_name="Ошибки"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задача импорта",
+                "verbose_name_plural": "Список задач импорта",
+                "ordering": ("-created_at",),
+            },
+        ),
+    ]
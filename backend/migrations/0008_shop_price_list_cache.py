@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0007_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shop",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, max_length=64, verbose_name="Хэш прайс-листа"
+            ),
+        ),
+        migrations.AddField(
+            model_name="shop",
+            name="etag",
+            field=models.CharField(
+                blank=True, max_length=255, verbose_name="ETag прайс-листа"
+            ),
+        ),
+        migrations.AddField(
+            model_name="shop",
+            name="last_modified",
+            field=models.CharField(
+                blank=True, max_length=40, verbose_name="Last-Modified прайс-листа"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="importjob",
+            name="phase",
+            field=models.CharField(
+                choices=[
+                    ("queued", "В очереди"),
+                    ("downloading", "Загрузка"),
+                    ("importing", "Импорт"),
+                    ("not_modified", "Не изменен"),
+                    ("done", "Завершен"),
+                    ("failed", "Ошибка"),
+                ],
+                default="queued",
+                max_length=15,
+                verbose_name="Этап",
+            ),
+        ),
+    ]
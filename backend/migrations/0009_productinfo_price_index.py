@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0008_shop_price_list_cache"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productinfo",
+            index=models.Index(fields=["price", "id"], name="product_info_price_idx"),
+        ),
+    ]
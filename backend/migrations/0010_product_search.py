@@ -0,0 +1,67 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    Product = apps.get_model("backend", "Product")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    ProductParameter = apps.get_model("backend", "ProductParameter")
+    product_name = Subquery(
+        Product.objects.filter(id=OuterRef("product_id")).values("name")[:1]
+    )
+    parameter_values = Subquery(
+        ProductParameter.objects.filter(product_info_id=OuterRef("id"))
+        .values("product_info_id")
+        .annotate(values=StringAgg("value", delimiter=" "))
+        .values("values")[:1]
+    )
+    ProductInfo.objects.update(
+        search_vector=(
+            SearchVector(product_name, weight="A", config="russian")
+            + SearchVector("model", weight="B", config="russian")
+            + SearchVector(parameter_values, weight="C", config="russian")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0009_productinfo_price_index"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="productinfo",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Поисковый вектор"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productinfo",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_info_search_idx"
+            ),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:41
+
+import math
+
+from django.db import migrations, models
+
+
+def parse_numeric(value):
+    try:
+        number = float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def fill_numeric_values(apps, schema_editor):
+    ProductParameter = apps.get_model("backend", "ProductParameter")
+    batch = []
+    for product_parameter in ProductParameter.objects.only("id", "value").iterator(
+        chunk_size=1000
+    ):
+        product_parameter.numeric_value = parse_numeric(product_parameter.value)
+        if product_parameter.numeric_value is not None:
+            batch.append(product_parameter)
+        if len(batch) >= 1000:
+            ProductParameter.objects.bulk_update(batch, ["numeric_value"])
+            batch = []
+    ProductParameter.objects.bulk_update(batch, ["numeric_value"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0010_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productparameter",
+            name="numeric_value",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Числовое значение"
+            ),
+        ),
+        migrations.RunPython(fill_numeric_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="productparameter",
+            index=models.Index(
+                fields=["parameter", "value"], name="product_param_value_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productparameter",
+            index=models.Index(
+                fields=["parameter", "numeric_value"], name="product_param_numeric_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:46
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_catalog_items(apps, schema_editor):
+    CatalogItem = apps.get_model("backend", "CatalogItem")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    ProductParameter = apps.get_model("backend", "ProductParameter")
+    ids = list(ProductInfo.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start : start + BATCH_SIZE]
+        parameters = {}
+        for product_info_id, name, value in (
+            ProductParameter.objects.filter(product_info_id__in=batch)
+            .order_by("product_info_id", "id")
+            .values_list("product_info_id", "parameter__name", "value")
+        ):
+            parameters.setdefault(product_info_id, []).append(
+                {"parameter": name, "value": value}
+            )
+        CatalogItem.objects.bulk_create(
+            CatalogItem(
+                product_info_id=row["id"],
+                shop_id=row["shop_id"],
+                shop_state=row["shop__state"],
+                category_id=row["product__category_id"],
+                category_name=row["product__category__name"] or "",
+                product_id=row["product_id"],
+                product_name=row["product__name"] or "",
+                image=row["product__image"] or "",
+                model=row["model"],
+                quantity=row["quantity"],
+                price=row["price"],
+                price_rrc=row["price_rrc"],
+                parameters=parameters.get(row["id"], []),
+            )
+            for row in ProductInfo.objects.filter(id__in=batch).values(
+                "id",
+                "shop_id",
+                "shop__state",
+                "product_id",
+                "product__name",
+                "product__image",
+                "product__category_id",
+                "product__category__name",
+                "model",
+                "quantity",
+                "price",
+                "price_rrc",
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0011_productparameter_numeric_value"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogItem",
+            fields=[
+                (
+                    "product_info",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="catalog_item",
+                        serialize=False,
+                        to="backend.productinfo",
+                        verbose_name="Информация о продукте",
+                    ),
+                ),
+                ("shop_state", models.BooleanField(verbose_name="Статус магазина")),
+                (
+                    "category_name",
+                    models.CharField(
+                        blank=True, max_length=40, verbose_name="Название категории"
+                    ),
+                ),
+                (
+                    "product_name",
+                    models.CharField(
+                        blank=True, max_length=80, verbose_name="Название продукта"
+                    ),
+                ),
+                (
+                    "image",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Изображение"
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(blank=True, max_length=80, verbose_name="Модель"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveSmallIntegerField(verbose_name="Количество"),
+                ),
+                ("price", models.FloatField(verbose_name="Цена")),
+                (
+                    "price_rrc",
+                    models.FloatField(verbose_name="Рекомендуемая розничная цена"),
+                ),
+                (
+                    "parameters",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Параметры"
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="catalog_items",
+                        to="backend.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="catalog_items",
+                        to="backend.product",
+                        verbose_name="Продукт",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="catalog_items",
+                        to="backend.shop",
+                        verbose_name="Магазин",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Строка каталога",
+                "verbose_name_plural": "Каталог товаров",
+                "indexes": [
+                    models.Index(
+                        fields=["shop", "product_info"], name="catalog_shop_idx"
+                    ),
+                    models.Index(
+                        condition=models.Q(("shop_state", True)),
+                        fields=["category", "product_info"],
+                        name="catalog_category_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("shop_state", True)),
+                        fields=["price", "product_info"],
+                        name="catalog_price_idx",
+                    ),
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["product_name"],
+                        name="catalog_name_trgm_idx",
+                        opclasses=["gin_trgm_ops"],
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_catalog_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:59
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model("backend", "Order")
+    OrderItem = apps.get_model("backend", "OrderItem")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    OrderItem.objects.update(
+        price=Subquery(
+            ProductInfo.objects.filter(id=OuterRef("product_info_id")).values("price")[
+                :1
+            ]
+        )
+    )
+    items = (
+        OrderItem.objects.filter(order_id=OuterRef("pk")).order_by().values("order_id")
+    )
+    Order.objects.update(
+        total_sum=Coalesce(
+            Subquery(
+                items.annotate(total=Sum(F("price") * F("quantity"))).values("total")[
+                    :1
+                ]
+            ),
+            0.0,
+        ),
+        items_count=Coalesce(
+            Subquery(items.annotate(count=Count("id")).values("count")[:1]), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0013_order_user_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="items_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Количество позиций"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_sum",
+            field=models.FloatField(default=0, verbose_name="Сумма заказа"),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="price",
+            field=models.FloatField(
+                default=0, verbose_name="Цена на момент добавления"
+            ),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_order_changes(apps, schema_editor):
+    OrderChange = apps.get_model("backend", "OrderChange")
+    OrderChangeSequence = apps.get_model("backend", "OrderChangeSequence")
+    OrderItem = apps.get_model("backend", "OrderItem")
+    sequences = {}
+    changes = []
+    for shop_id, order_id, changed_at in (
+        OrderItem.objects.exclude(order__state="basket")
+        .values_list("product_info__shop_id", "order_id", "order__updated_at")
+        .distinct()
+        .order_by("order__updated_at", "order_id")
+    ):
+        sequences[shop_id] = sequences.get(shop_id, 0) + 1
+        changes.append(
+            OrderChange(
+                shop_id=shop_id,
+                order_id=order_id,
+                sequence=sequences[shop_id],
+                changed_at=changed_at,
+            )
+        )
+    OrderChange.objects.bulk_create(changes, batch_size=1000)
+    OrderChangeSequence.objects.bulk_create(
+        OrderChangeSequence(shop_id=shop_id, value=value)
+        for shop_id, value in sequences.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0016_order_state_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderChangeSequence",
+            fields=[
+                (
+                    "shop",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="order_change_sequence",
+                        serialize=False,
+                        to="backend.shop",
+                        verbose_name="Магазин",
+                    ),
+                ),
+                (
+                    "value",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Последний номер изменения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Счетчик изменений заказов",
+                "verbose_name_plural": "Счетчики изменений заказов",
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sequence",
+                    models.PositiveBigIntegerField(verbose_name="Номер изменения"),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Дата изменения"
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="changes",
+                        to="backend.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_changes",
+                        to="backend.shop",
+                        verbose_name="Магазин",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение заказа",
+                "verbose_name_plural": "Лента изменений заказов",
+                "ordering": ("shop", "sequence"),
+                "indexes": [
+                    models.Index(
+                        fields=["shop", "sequence"], name="order_change_shop_seq_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="orderchange",
+            constraint=models.UniqueConstraint(
+                fields=("shop", "order"), name="unique_shop_order_change"
+            ),
+        ),
+        migrations.RunPython(fill_order_changes, migrations.RunPython.noop),
+    ]
\ No newline at end of file
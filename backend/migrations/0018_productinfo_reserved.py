@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def move_reservations(apps, schema_editor):
+    # Товары активных заказов учитываются в резерве,
+    # остаток поставщика не меняется.
+    OrderItem = apps.get_model("backend", "OrderItem")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    reserved = Coalesce(
+        Subquery(
+            OrderItem.objects.filter(
+                product_info_id=OuterRef("pk"),
+                order__state__in=("new", "confirmed", "assembled"),
+            )
+            .order_by()
+            .values("product_info_id")
+            .annotate(total=Sum("quantity"))
+            .values("total")[:1]
+        ),
+        0,
+    )
+    ProductInfo.objects.update(reserved=reserved)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0017_order_change_feed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productinfo",
+            name="reserved",
+            field=models.PositiveSmallIntegerField(
+                default=0, verbose_name="Зарезервировано"
+            ),
+        ),
+        migrations.RunPython(move_reservations, migrations.RunPython.noop),
+    ]
\ No newline at end of file
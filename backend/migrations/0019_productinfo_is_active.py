@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0018_productinfo_reserved"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productinfo",
+            name="is_active",
+            field=models.BooleanField(
+                default=True,
+                help_text="Снимается, если позиции нет в новом прайс-листе",
+                verbose_name="Активна",
+            ),
+        ),
+    ]
\ No newline at end of file
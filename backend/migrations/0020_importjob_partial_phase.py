@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0019_productinfo_is_active"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="importjob",
+            name="phase",
+            field=models.CharField(
+                choices=[
+                    ("queued", "В очереди"),
+                    ("downloading", "Загрузка"),
+                    ("importing", "Импорт"),
+                    ("not_modified", "Не изменен"),
+                    ("done", "Завершен"),
+                    ("partial", "Импортирован частично"),
+                    ("failed", "Ошибка"),
+                ],
+                default="queued",
+                max_length=15,
+                verbose_name="Этап",
+            ),
+        ),
+    ]
\ No newline at end of file
@@ -0,0 +1,105 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:41
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+def merge_product_infos(apps, duplicate, kept):
+    # Одна позиция магазина под двумя дубликатами продукта:
+    # заказы и резерв переносятся на сохраняемую позицию.
+    OrderItem = apps.get_model("backend", "OrderItem")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    OrderItem.objects.filter(product_info_id=duplicate.id).exclude(
+        order_id__in=OrderItem.objects.filter(product_info_id=kept.id).values(
+            "order_id"
+        )
+    ).update(product_info_id=kept.id)
+    ProductInfo.objects.filter(id=kept.id).update(
+        reserved=F("reserved") + duplicate.reserved
+    )
+    duplicate.delete()
+
+
+def deduplicate_products(apps, schema_editor):
+    CatalogItem = apps.get_model("backend", "CatalogItem")
+    Product = apps.get_model("backend", "Product")
+    ProductInfo = apps.get_model("backend", "ProductInfo")
+    for group in (
+        Product.objects.values("name", "category_id")
+        .annotate(kept_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    ):
+        kept_id = group["kept_id"]
+        duplicate_ids = list(
+            Product.objects.filter(name=group["name"], category_id=group["category_id"])
+            .exclude(id=kept_id)
+            .values_list("id", flat=True)
+        )
+        kept = {
+            (product_info.shop_id, product_info.external_id): product_info
+            for product_info in ProductInfo.objects.filter(product_id=kept_id)
+        }
+        for product_info in ProductInfo.objects.filter(
+            product_id__in=duplicate_ids
+        ).order_by("id"):
+            key = (product_info.shop_id, product_info.external_id)
+            if key in kept:
+                merge_product_infos(apps, product_info, kept[key])
+                continue
+            kept[key] = product_info
+            ProductInfo.objects.filter(id=product_info.id).update(product_id=kept_id)
+        CatalogItem.objects.filter(product_id__in=duplicate_ids).update(
+            product_id=kept_id
+        )
+        Product.objects.filter(id__in=duplicate_ids).delete()
+
+
+def deduplicate_parameters(apps, schema_editor):
+    Parameter = apps.get_model("backend", "Parameter")
+    ProductParameter = apps.get_model("backend", "ProductParameter")
+    for group in (
+        Parameter.objects.values("name")
+        .annotate(kept_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    ):
+        kept_id = group["kept_id"]
+        duplicate_ids = list(
+            Parameter.objects.filter(name=group["name"])
+            .exclude(id=kept_id)
+            .values_list("id", flat=True)
+        )
+        # У позиции уже есть значение сохраняемого параметра.
+        ProductParameter.objects.filter(
+            parameter_id__in=duplicate_ids,
+            product_info_id__in=ProductParameter.objects.filter(
+                parameter_id=kept_id
+            ).values("product_info_id"),
+        ).delete()
+        seen = set()
+        for product_parameter_id, product_info_id in (
+            ProductParameter.objects.filter(parameter_id__in=duplicate_ids)
+            .order_by("id")
+            .values_list("id", "product_info_id")
+        ):
+            if product_info_id in seen:
+                ProductParameter.objects.filter(id=product_parameter_id).delete()
+                continue
+            seen.add(product_info_id)
+            ProductParameter.objects.filter(id=product_parameter_id).update(
+                parameter_id=kept_id
+            )
+        Parameter.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0020_importjob_partial_phase"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_products, migrations.RunPython.noop),
+        migrations.RunPython(deduplicate_parameters, migrations.RunPython.noop),
+    ]
\ No newline at end of file
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0021_deduplicate_products_parameters"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="parameter",
+            name="name",
+            field=models.CharField(max_length=40, unique=True, verbose_name="Название"),
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("name", "category"), name="unique_product"
+            ),
+        ),
+    ]
\ No newline at end of file
@@ -1,8 +1,13 @@
+import math
+
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django_rest_passwordreset.tokens import get_token_generator
 
 from backend.constants import (
@@ -11,13 +16,22 @@ from backend.constants import (
     CATNAME_FIELD_LEN,
     CITY_FIELD_LEN,
     COMPANY_FIELD_LEN,
+    CONTENT_HASH_FIELD_LEN,
+    ETAG_FIELD_LEN,
     HOUSE_FIELD_LEN,
+    IMAGE_PATH_FIELD_LEN,
+    IMPORT_JOB_PHASES,
+    IMPORT_PHASE_FIELD_LEN,
     KEY_FIELD_LEN,
+    LAST_MODIFIED_FIELD_LEN,
     MIN_ORDER_QUANTITY_VALUE,
     MIN_QUANTITY_VALUE,
     MIN_PRICE_VALUE,
     MODEL_FIELD_LEN,
     ORDER_STATUS,
+    OUTBOX_STATE_FIELD_LEN,
+    OUTBOX_STATES,
+    OUTBOX_SUBJECT_FIELD_LEN,
     PARAMNAME_FIELD_LEN,
     POSITION_FIELD_LEN,
     PHONE_FIELD_LEN,
@@ -141,6 +155,21 @@ class Shop(models.Model):
         max_length=SHOPNAME_FIELD_LEN
     )
     url = models.URLField('Ссылка', null=True, blank=True)
+    etag = models.CharField(
+        'ETag прайс-листа',
+        max_length=ETAG_FIELD_LEN,
+        blank=True
+    )
+    last_modified = models.CharField(
+        'Last-Modified прайс-листа',
+        max_length=LAST_MODIFIED_FIELD_LEN,
+        blank=True
+    )
+    content_hash = models.CharField(
+        'Хэш прайс-листа',
+        max_length=CONTENT_HASH_FIELD_LEN,
+        blank=True
+    )
     user = models.OneToOneField(
         User,
         on_delete=models.CASCADE,
@@ -207,6 +236,19 @@ class Product(TimeStampMixin):
         verbose_name = 'Продукт'
         verbose_name_plural = 'Список продуктов'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'category'],
+                name='unique_product'
+            ),
+        ]
+        indexes = [
+            GinIndex(
+                fields=['name'],
+                name='product_name_trgm_idx',
+                opclasses=['gin_trgm_ops']
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -245,6 +287,15 @@ class ProductInfo(models.Model):
             )
         ]
     )
+    reserved = models.PositiveSmallIntegerField(
+        'Зарезервировано',
+        default=0
+    )
+    is_active = models.BooleanField(
+        'Активна',
+        default=True,
+        help_text='Снимается, если позиции нет в новом прайс-листе'
+    )
     price = models.FloatField(
         'Цена',
         validators=[
@@ -264,6 +315,11 @@ class ProductInfo(models.Model):
             )
         ]
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Информация о продукте'
@@ -274,13 +330,28 @@ class ProductInfo(models.Model):
                 name='unique_product_info'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['shop', 'external_id'],
+                name='product_info_shop_ext_idx'
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                name='product_info_price_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='product_info_search_idx'
+            ),
+        ]
 
 
 class Parameter(models.Model):
     objects = models.manager.Manager()
     name = models.CharField(
         'Название',
-        max_length=PARAMNAME_FIELD_LEN
+        max_length=PARAMNAME_FIELD_LEN,
+        unique=True
     )
 
     class Meta:
@@ -310,6 +381,12 @@ class ProductParameter(models.Model):
         'Значение',
         max_length=VALUE_FIELD_LEN
     )
+    numeric_value = models.FloatField(
+        'Числовое значение',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Параметр'
@@ -320,6 +397,29 @@ class ProductParameter(models.Model):
                 name='unique_product_parameter'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['parameter', 'value'],
+                name='product_param_value_idx'
+            ),
+            models.Index(
+                fields=['parameter', 'numeric_value'],
+                name='product_param_numeric_idx'
+            ),
+        ]
+
+    @staticmethod
+    def parse_numeric(value):
+        """Возвращает значение параметра как число или None."""
+        try:
+            number = float(str(value).replace(',', '.'))
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+
+    def save(self, *args, **kwargs):
+        self.numeric_value = self.parse_numeric(self.value)
+        return super().save(*args, **kwargs)
 
 
 class Contact(models.Model):
@@ -391,15 +491,46 @@ class Order(TimeStampMixin):
         on_delete=models.CASCADE,
         verbose_name='Контакт',
     )
+    total_sum = models.FloatField(
+        'Сумма заказа',
+        default=0
+    )
+    items_count = models.PositiveIntegerField(
+        'Количество позиций',
+        default=0
+    )
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Список заказ'
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at'],
+                name='order_user_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Заказ №{self.pk} - {ORDER_STATUS.get(self.state)}'
 
+    def change_totals(self, total_sum=0, items_count=0):
+        """Изменяет сумму и количество позиций заказа на разницу.
+
+        Обновление выполняется одним UPDATE относительно значений
+        в БД, поэтому параллельные изменения корзины не теряются.
+
+        :param total_sum: Изменение суммы заказа.
+        :param items_count: Изменение количества позиций.
+        """
+        if not total_sum and not items_count:
+            return
+        Order.objects.filter(id=self.id).update(
+            total_sum=models.F('total_sum') + total_sum,
+            items_count=models.F('items_count') + items_count
+        )
+        self.refresh_from_db(fields=('total_sum', 'items_count'))
+
 
 class OrderItem(models.Model):
     objects = models.manager.Manager()
@@ -426,6 +557,10 @@ class OrderItem(models.Model):
             )
         ]
     )
+    price = models.FloatField(
+        'Цена на момент добавления',
+        default=0
+    )
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -438,6 +573,321 @@ class OrderItem(models.Model):
         ]
 
 
+class OrderStateEvent(models.Model):
+    """Переход заказа из одного статуса в другой.
+
+    Журнал только дополняется. Внешний ключ на заказ не создает
+    ограничения в БД, поэтому таблицу можно секционировать
+    по дате перехода и удалять старые секции целиком."""
+
+    objects = models.manager.Manager()
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='state_events',
+        verbose_name='Заказ'
+    )
+    from_state = models.CharField(
+        'Предыдущий статус',
+        choices=tuple(ORDER_STATUS.items()),
+        max_length=STATE_FIELD_LEN
+    )
+    to_state = models.CharField(
+        'Новый статус',
+        choices=tuple(ORDER_STATUS.items()),
+        max_length=STATE_FIELD_LEN
+    )
+    created_at = models.DateTimeField(
+        'Дата перехода',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Переход статуса заказа'
+        verbose_name_plural = 'Журнал статусов заказов'
+        ordering = ('created_at', 'id')
+        indexes = (
+            models.Index(
+                fields=('created_at', 'id'),
+                name='order_event_created_idx'
+            ),
+        )
+
+    def __str__(self):
+        return (f'Заказ №{self.order_id}: {ORDER_STATUS.get(self.from_state)}'
+                f' -> {ORDER_STATUS.get(self.to_state)}')
+
+
+class OrderChangeSequence(models.Model):
+    """Последний выданный номер изменения заказов магазина.
+
+    Строка блокируется до конца транзакции, изменившей заказы,
+    поэтому номера изменений магазина фиксируются по возрастанию."""
+
+    objects = models.manager.Manager()
+    shop = models.OneToOneField(
+        Shop,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_change_sequence',
+        verbose_name='Магазин'
+    )
+    value = models.PositiveBigIntegerField(
+        'Последний номер изменения',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счетчик изменений заказов'
+        verbose_name_plural = 'Счетчики изменений заказов'
+
+
+class OrderChange(models.Model):
+    """Последнее изменение заказа с товарами магазина.
+
+    На каждую пару магазин - заказ хранится одна строка с номером
+    последнего изменения, поэтому лента изменений читается
+    по индексу (shop, sequence) за постоянное время."""
+
+    objects = models.manager.Manager()
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='order_changes',
+        verbose_name='Магазин'
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='changes',
+        verbose_name='Заказ'
+    )
+    sequence = models.PositiveBigIntegerField('Номер изменения')
+    changed_at = models.DateTimeField(
+        'Дата изменения',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Изменение заказа'
+        verbose_name_plural = 'Лента изменений заказов'
+        ordering = ('shop', 'sequence')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('shop', 'order'),
+                name='unique_shop_order_change'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('shop', 'sequence'),
+                name='order_change_shop_seq_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.shop} - заказ №{self.order_id} ({self.sequence})'
+
+
+class CatalogItem(models.Model):
+    """Денормализованная строка каталога товаров.
+
+    Одна строка на каждую информацию о продукте: состояние магазина,
+    категория, продукт и параметры хранятся вместе, поэтому список
+    товаров читается одним запросом без соединений и prefetch.
+    Строки поддерживаются импортом прайс-листов и сигналами моделей."""
+
+    objects = models.manager.Manager()
+    product_info = models.OneToOneField(
+        ProductInfo,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='catalog_item',
+        verbose_name='Информация о продукте'
+    )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='catalog_items',
+        db_index=False,
+        verbose_name='Магазин'
+    )
+    shop_state = models.BooleanField('Статус магазина')
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='catalog_items',
+        null=True,
+        blank=True,
+        verbose_name='Категория'
+    )
+    category_name = models.CharField(
+        'Название категории',
+        max_length=CATNAME_FIELD_LEN,
+        blank=True
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='catalog_items',
+        null=True,
+        blank=True,
+        verbose_name='Продукт'
+    )
+    product_name = models.CharField(
+        'Название продукта',
+        max_length=PRNAME_FIELD_LEN,
+        blank=True
+    )
+    image = models.CharField(
+        'Изображение',
+        max_length=IMAGE_PATH_FIELD_LEN,
+        blank=True
+    )
+    model = models.CharField(
+        'Модель',
+        max_length=MODEL_FIELD_LEN,
+        blank=True
+    )
+    quantity = models.PositiveSmallIntegerField('Количество')
+    price = models.FloatField('Цена')
+    price_rrc = models.FloatField('Рекомендуемая розничная цена')
+    parameters = models.JSONField(
+        'Параметры',
+        default=list,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Строка каталога'
+        verbose_name_plural = 'Каталог товаров'
+        indexes = [
+            models.Index(
+                fields=['shop', 'product_info'],
+                name='catalog_shop_idx'
+            ),
+            models.Index(
+                fields=['category', 'product_info'],
+                name='catalog_category_idx',
+                condition=models.Q(shop_state=True)
+            ),
+            models.Index(
+                fields=['price', 'product_info'],
+                name='catalog_price_idx',
+                condition=models.Q(shop_state=True)
+            ),
+            GinIndex(
+                fields=['product_name'],
+                name='catalog_name_trgm_idx',
+                opclasses=['gin_trgm_ops']
+            ),
+        ]
+
+    def __str__(self):
+        return self.product_name
+
+
+class ImportJob(TimeStampMixin):
+    objects = models.manager.Manager()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='import_jobs',
+        verbose_name='Пользователь'
+    )
+    url = models.URLField('Ссылка')
+    phase = models.CharField(
+        'Этап',
+        choices=tuple(IMPORT_JOB_PHASES.items()),
+        max_length=IMPORT_PHASE_FIELD_LEN,
+        default='queued'
+    )
+    processed = models.PositiveIntegerField(
+        'Обработано позиций',
+        default=0
+    )
+    total = models.PositiveIntegerField(
+        'Всего позиций',
+        default=0
+    )
+    changes = models.JSONField(
+        'Изменения',
+        default=dict,
+        blank=True
+    )
+    errors = models.JSONField(
+        'Ошибки',
+        default=list,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = 'Список задач импорта'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'Импорт №{self.pk} - {IMPORT_JOB_PHASES.get(self.phase)}'
+
+
+class OutboxEmail(TimeStampMixin):
+    """Исходящее письмо.
+
+    Записывается в одной транзакции с изменением, о котором
+    уведомляет, и отправляется обработчиком очереди."""
+
+    objects = models.manager.Manager()
+    subject = models.CharField(
+        'Тема',
+        max_length=OUTBOX_SUBJECT_FIELD_LEN
+    )
+    body = models.TextField('Текст')
+    to = models.JSONField(
+        'Получатели',
+        default=list
+    )
+    state = models.CharField(
+        'Состояние',
+        choices=tuple(OUTBOX_STATES.items()),
+        max_length=OUTBOX_STATE_FIELD_LEN,
+        default='pending'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток отправки',
+        default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now
+    )
+    sent_at = models.DateTimeField(
+        'Дата отправки',
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Очередь исходящих писем'
+        ordering = ('-created_at',)
+        indexes = (
+            models.Index(
+                fields=('next_attempt_at',),
+                condition=models.Q(state='pending'),
+                name='outbox_pending_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.subject} - {OUTBOX_STATES.get(self.state)}'
+
+
 class ConfirmEmailToken(models.Model):
     objects = models.manager.Manager()
     user = models.ForeignKey(
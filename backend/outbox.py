@@ -0,0 +1,220 @@
+import threading
+import time
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from backend.models import OutboxEmail
+
+_pending = threading.local()
+
+
+def enqueue_email(subject, body, to):
+    """Записывает письмо в очередь исходящих писем.
+
+    Письмо сохраняется в текущей транзакции, поэтому уходит только
+    вместе с изменением, о котором уведомляет. Обработчик очереди
+    запускается один раз после фиксации транзакции с задержкой
+    OUTBOX_COALESCE_WINDOW секунд, чтобы письма одному получателю
+    успели собраться в одно сообщение.
+
+    :param subject: Тема письма.
+    :param body: Текст письма.
+    :param to: Адреса получателей.
+    :return: Запись очереди исходящих писем.
+    """
+    email = OutboxEmail.objects.create(subject=subject, body=body, to=to)
+    _schedule_dispatch()
+    return email
+
+
+def enqueue_emails(emails):
+    """Записывает пачку писем в очередь одним INSERT.
+
+    :param emails: Словари с ключами subject, body и to.
+    :return: Записи очереди исходящих писем.
+    """
+    if not emails:
+        return []
+    emails = OutboxEmail.objects.bulk_create(
+        OutboxEmail(**email) for email in emails
+    )
+    _schedule_dispatch()
+    return emails
+
+
+def _schedule_dispatch():
+    _pending.scheduled = True
+    transaction.on_commit(_start_dispatch, robust=True)
+
+
+def _start_dispatch():
+    if getattr(_pending, 'scheduled', False):
+        _pending.scheduled = False
+        from backend.tasks import dispatch_outbox_async
+
+        dispatch_outbox_async.apply_async(
+            countdown=settings.OUTBOX_COALESCE_WINDOW
+        )
+
+
+def _get_retry_delay(attempts):
+    return timedelta(
+        seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+class OutboxDispatcher:
+    """Отправляет письма из очереди исходящих писем.
+
+    Одно SMTP-соединение используется для всех пачек за время работы
+    и открывается заново только после ошибки. Письма одному
+    получателю, попавшие в пачку, объединяются в одно сообщение."""
+
+    def __init__(self, batch_size=None, connection=None):
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.connection = connection or get_connection()
+        self.is_open = False
+        self.elapsed = 0
+        self.stats = dict.fromkeys(
+            ('sent', 'retried', 'dead', 'messages', 'connections'), 0
+        )
+
+    def run(self):
+        """Разбирает очередь, пока в ней есть письма к отправке.
+
+        :return: Метрики отправки, см. get_metrics.
+        """
+        started = time.perf_counter()
+        try:
+            while sum(self.dispatch().values()) == self.batch_size:
+                pass
+        finally:
+            self.close()
+            self.elapsed += time.perf_counter() - started
+        return self.get_metrics()
+
+    def dispatch(self):
+        """Отправляет очередную пачку писем.
+
+        Письма пачки блокируются с SKIP LOCKED, так что несколько
+        обработчиков не отправят одно письмо дважды. Неотправленное
+        письмо откладывается с удвоением паузы, после
+        OUTBOX_MAX_ATTEMPTS попыток помечается как недоставленное.
+
+        :return: Количество отправленных, отложенных
+            и недоставленных писем пачки.
+        """
+        result = {'sent': 0, 'retried': 0, 'dead': 0}
+        with transaction.atomic():
+            emails = list(
+                OutboxEmail.objects.select_for_update(
+                    skip_locked=True
+                ).filter(
+                    state='pending',
+                    next_attempt_at__lte=timezone.now()
+                ).order_by(
+                    'next_attempt_at', 'id'
+                )[:self.batch_size]
+            )
+            if not emails:
+                return result
+
+            errors = self._send(emails)
+            now = timezone.now()
+            for email in emails:
+                email.attempts += 1
+                email.updated_at = now
+                error = errors.get(email.id)
+                if error is None:
+                    email.state, email.sent_at = 'sent', now
+                    email.last_error = ''
+                    result['sent'] += 1
+                elif email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    email.state, email.last_error = 'dead', str(error)
+                    result['dead'] += 1
+                else:
+                    email.next_attempt_at = now + _get_retry_delay(
+                        email.attempts
+                    )
+                    email.last_error = str(error)
+                    result['retried'] += 1
+            OutboxEmail.objects.bulk_update(
+                emails,
+                ('state', 'attempts', 'next_attempt_at', 'sent_at',
+                 'last_error', 'updated_at')
+            )
+
+        for key, count in result.items():
+            self.stats[key] += count
+        return result
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            with suppress(Exception):
+                self.connection.close()
+
+    def get_metrics(self):
+        """Возвращает метрики отправки.
+
+        messages_per_second - отправлено сообщений в секунду работы,
+        connection_reuse_ratio - доля сообщений, отправленных через
+        уже открытое соединение.
+        """
+        messages = self.stats['messages']
+        return {
+            **self.stats,
+            'messages_per_second': (
+                messages / self.elapsed if self.elapsed else 0
+            ),
+            'connection_reuse_ratio': (
+                1 - self.stats['connections'] / messages if messages else 0
+            ),
+        }
+
+    def _open(self):
+        if not self.is_open:
+            self.connection.open()
+            self.is_open = True
+            self.stats['connections'] += 1
+
+    def _send(self, emails):
+        """Отправляет письма пачки, объединяя их по получателям.
+
+        :return: Ошибки отправки по ИД писем.
+        """
+        groups = {}
+        for email in emails:
+            groups.setdefault(tuple(email.to), []).append(email)
+        groups = list(groups.items())
+
+        errors = {}
+        for number, (to, group) in enumerate(groups):
+            try:
+                self._open()
+            except Exception as err:
+                errors.update(
+                    (email.id, err)
+                    for _, rest in groups[number:] for email in rest
+                )
+                break
+            try:
+                self.connection.send_messages([EmailMultiAlternatives(
+                    subject=', '.join(
+                        dict.fromkeys(email.subject for email in group)
+                    ),
+                    body='\n\n'.join(email.body for email in group),
+                    from_email=settings.EMAIL_HOST_USER,
+                    to=list(to),
+                    connection=self.connection
+                )])
+                self.stats['messages'] += 1
+            except Exception as err:
+                errors.update((email.id, err) for email in group)
+                self.close()
+        return errors
\ No newline at end of file
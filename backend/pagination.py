@@ -0,0 +1,130 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+from backend.constants import (
+    PRODUCT_MAX_PAGE_SIZE,
+    PRODUCT_ORDERINGS,
+    PRODUCT_PAGE_SIZE,
+    PRODUCT_SEARCH_ORDERING
+)
+
+
+class ProductInfoCursorPagination(CursorPagination):
+    """Курсорная пагинация каталога товаров.
+
+    Страница выбирается условием по полям сортировки, а не OFFSET,
+    поэтому время ответа не зависит от глубины просмотра.
+    Сортировка задается параметром ordering: id, -id, price или -price,
+    при сортировке по цене ИД используется для устойчивого порядка.
+    При поиске (параметр q) по умолчанию сортирует по релевантности.
+
+    В отличие от CursorPagination, курсор хранит значения всех полей
+    сортировки, например (цена, ИД), и страница выбирается условием
+    price > p OR (price = p AND id > i). Поэтому товары с одинаковой
+    ценой не пропускаются и не повторяются на соседних страницах."""
+
+    page_size = PRODUCT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = PRODUCT_MAX_PAGE_SIZE
+    ordering = PRODUCT_ORDERINGS['id']
+    ordering_param = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering in PRODUCT_ORDERINGS:
+            return PRODUCT_ORDERINGS[ordering]
+        if request.query_params.get('q'):
+            return PRODUCT_SEARCH_ORDERING
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._get_keyset_query(current_position, reverse)
+            )
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            instance[field.lstrip('-')] if isinstance(instance, dict)
+            else getattr(instance, field.lstrip('-'))
+            for field in ordering
+        ])
+
+    def _get_keyset_query(self, position, reverse):
+        """Строит условие выбора строк после позиции курсора.
+
+        Для сортировки (f1, f2) условие имеет вид
+        f1 > v1 OR (f1 = v1 AND f2 > v2), для убывающих полей
+        и обратного курсора сравнение меняется на «меньше».
+
+        :param position: Позиция курсора: JSON-список значений полей.
+        :param reverse: Курсор ведет на предыдущую страницу.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        query, equal = Q(), Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            query |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return query
\ No newline at end of file
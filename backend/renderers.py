@@ -0,0 +1,18 @@
+import ujson
+from rest_framework.renderers import JSONRenderer
+
+
+class UJSONRenderer(JSONRenderer):
+    """JSON-рендерер на ujson для больших списков.
+
+    Данные должны состоять из встроенных типов: словарей, списков,
+    строк и чисел, как их строят сериализаторы строк values()."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ujson.dumps(
+            data,
+            ensure_ascii=self.ensure_ascii,
+            escape_forward_slashes=False
+        ).encode()
\ No newline at end of file
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+from backend.constants import CATALOG_CACHE_ALIAS, CATALOG_CACHE_TIMEOUT
+
+CATALOG_TAG = 'catalog:tag:all'
+
+_pending = threading.local()
+
+
+def _get_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def _shop_tag(shop_id):
+    return f'catalog:tag:shop:{shop_id}'
+
+
+def _category_tag(category_id):
+    return f'catalog:tag:category:{category_id}'
+
+
+def _resource_tag(resource):
+    return f'catalog:tag:resource:{resource}'
+
+
+def _get_versions(tags):
+    """Возвращает текущие версии тегов, создавая недостающие.
+
+    Новая версия случайна, поэтому после вытеснения тега из кеша
+    старые ответы с ним не становятся снова доступными."""
+    cache = _get_cache()
+    versions = cache.get_many(tags)
+    missing = [tag for tag in tags if tag not in versions]
+    if missing:
+        for tag in missing:
+            cache.add(tag, uuid.uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions[tag] for tag in tags]
+
+
+def _get_catalog_digest(request):
+    # Ссылки next и previous в ответе абсолютные, поэтому ответ
+    # зависит от схемы и хоста запроса.
+    query_params = request.GET
+    shop_id = query_params.get('shop_id') or None
+    category_id = query_params.get('category_id') or None
+    tags = []
+    if shop_id is not None:
+        tags.append(_shop_tag(shop_id))
+    if category_id is not None:
+        tags.append(_category_tag(category_id))
+    if not tags:
+        tags.append(CATALOG_TAG)
+    return hashlib.sha1(repr((
+        _get_versions(tags),
+        request.scheme,
+        request.get_host(),
+        sorted(query_params.lists())
+    )).encode()).hexdigest()
+
+
+def get_catalog_cache_key(request):
+    """Строит ключ ответа каталога по запросу.
+
+    Ключ включает магазин, категорию, фильтры, страницу, схему
+    и хост запроса и версии тегов, от которых зависит ответ:
+    общего тега каталога и тегов выбранных магазина и категории.
+    Ответ без фильтра по магазину или категории зависит только
+    от общего тега."""
+    return 'catalog:response:{}:{}:{}'.format(
+        request.GET.get('shop_id') or None,
+        request.GET.get('category_id') or None,
+        _get_catalog_digest(request)
+    )
+
+
+def _get_etag(version, request):
+    return hashlib.sha1(repr((
+        version,
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT'),
+    )).encode()).hexdigest()
+
+
+def get_catalog_etag(request, *args, **kwargs):
+    """Возвращает ETag списка товаров для декоратора condition.
+
+    ETag меняется вместе с версиями тегов кеша каталога, поэтому
+    проверка If-None-Match не обращается к БД."""
+    return _get_etag(_get_catalog_digest(request), request)
+
+
+def get_resource_etag(resource):
+    """Возвращает функцию ETag ресурса для декоратора condition.
+
+    ETag строится по версии ресурса, адресу запроса и заголовку
+    Accept, версия меняется функцией invalidate_resource."""
+    def etag_func(request, *args, **kwargs):
+        return _get_etag(
+            _get_versions([_resource_tag(resource)])[0],
+            request
+        )
+    return etag_func
+
+
+def get_catalog_response(key):
+    """Возвращает готовый ответ каталога из кеша или None."""
+    return _get_cache().get(key)
+
+
+def set_catalog_response(key, content):
+    """Сохраняет готовый ответ каталога в кеш."""
+    _get_cache().set(key, content, timeout=CATALOG_CACHE_TIMEOUT)
+
+
+def invalidate_catalog(shop_ids=(), category_ids=()):
+    """Сбрасывает кеш ответов каталога по магазинам и категориям.
+
+    :param shop_ids: Идентификаторы измененных магазинов.
+    :param category_ids: Идентификаторы измененных категорий.
+    """
+    tags = {CATALOG_TAG}
+    tags.update(
+        _shop_tag(shop_id) for shop_id in shop_ids if shop_id is not None
+    )
+    tags.update(
+        _category_tag(category_id) for category_id in category_ids
+        if category_id is not None
+    )
+    _invalidate_tags(tags)
+
+
+def invalidate_resource(resource):
+    """Меняет версию ресурса, по которой строится его ETag."""
+    _invalidate_tags({_resource_tag(resource)})
+
+
+def _invalidate_tags(tags):
+    """Меняет версии тегов после фиксации транзакции.
+
+    Так ответ, собранный по старым данным, не попадет в кеш
+    с новой версией. Теги из нескольких вызовов в одной транзакции
+    сбрасываются одной записью в кеш."""
+    pending = getattr(_pending, 'tags', None)
+    if pending is None:
+        pending = _pending.tags = set()
+    pending.update(tags)
+    transaction.on_commit(_flush_invalidations)
+
+
+def _flush_invalidations():
+    tags, _pending.tags = getattr(_pending, 'tags', None), None
+    if tags:
+        _get_cache().set_many(
+            {tag: uuid.uuid4().hex for tag in tags},
+            timeout=None
+        )
\ No newline at end of file
@@ -0,0 +1,74 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from backend.constants import SEARCH_CONFIG
+from backend.models import (
+    Product,
+    ProductInfo,
+    ProductParameter
+)
+
+
+def update_search_vectors(product_info_ids):
+    """Пересчитывает поисковые векторы информации о продуктах.
+
+    Вектор строится по названию продукта, модели и значениям
+    параметров. Полнотекстовый поиск доступен только в PostgreSQL,
+    для остальных СУБД функция ничего не делает.
+
+    :param product_info_ids: Идентификаторы информации о продуктах.
+    """
+    if connection.vendor != 'postgresql' or not product_info_ids:
+        return
+
+    product_name = Subquery(
+        Product.objects.filter(
+            id=OuterRef('product_id')
+        ).order_by().values('name')[:1]
+    )
+    parameter_values = Subquery(
+        ProductParameter.objects.filter(
+            product_info_id=OuterRef('id')
+        ).values(
+            'product_info_id'
+        ).annotate(
+            values=StringAgg('value', delimiter=' ')
+        ).values('values')[:1]
+    )
+    ProductInfo.objects.filter(id__in=product_info_ids).update(
+        search_vector=(
+            SearchVector(product_name, weight='A', config=SEARCH_CONFIG)
+            + SearchVector('model', weight='B', config=SEARCH_CONFIG)
+            + SearchVector(parameter_values, weight='C',
+                           config=SEARCH_CONFIG)
+        )
+    )
+
+
+def search_product_infos(queryset, text,
+                         vector_field='search_vector',
+                         name_field='product__name'):
+    """Отбирает и ранжирует информацию о продуктах по поисковой строке.
+
+    Совпадения ищутся по поисковому вектору и, для опечаток
+    и незаконченных слов, по триграммам названия продукта.
+    Релевантность сохраняется в аннотации rank.
+
+    :param vector_field: Путь к поисковому вектору в queryset.
+    :param name_field: Путь к названию продукта в queryset.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        Q(**{vector_field: query})
+        | Q(**{f'{name_field}__trigram_word_similar': text})
+    ).annotate(
+        rank=SearchRank(F(vector_field), query)
+        + TrigramWordSimilarity(text, name_field)
+    )
\ No newline at end of file
@@ -1,6 +1,6 @@
-import requests
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.core.files.storage import default_storage
 from django.core.validators import (
     URLValidator,
     ValidationError
@@ -11,18 +11,18 @@ from rest_framework import (
     status
 )
 from rest_framework.authtoken.models import Token
-from yaml import (
-    load as load_yaml,
-    Loader
-)
 
+from backend.constants import (
+    MAX_ORDER_QUANTITY_VALUE,
+    ORDER_BATCH_MAX_SIZE
+)
 from backend.mixins import CustomValidationMixin
 from backend.models import (
     Category,
     Contact,
+    ImportJob,
     Order,
     OrderItem,
-    Parameter,
     Product,
     ProductInfo,
     ProductParameter,
@@ -30,6 +30,7 @@ from backend.models import (
     User
 )
 from backend.signals import new_user_registered
+from backend.tasks import import_price_list_async
 from backend.utils import validate_all_fields
 
 
@@ -203,8 +204,8 @@ class ProductInfoSerializer(CustomValidationMixin,
     class Meta:
         model = ProductInfo
         fields = ('id', 'model', 'product', 'shop', 'quantity',
-                  'price', 'price_rrc', 'product_parameters',)
-        read_only_fields = ('id',)
+                  'price', 'price_rrc', 'product_parameters', 'is_active',)
+        read_only_fields = ('id', 'is_active',)
 
     def validate(self, attrs):
         self.is_valid_quantity(
@@ -221,8 +222,8 @@ class OrderItemSerializer(CustomValidationMixin,
                           serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ('id', 'product_info', 'quantity', 'order',)
-        read_only_fields = ('id',)
+        fields = ('id', 'product_info', 'quantity', 'price', 'order',)
+        read_only_fields = ('id', 'price',)
         validators = [
             serializers.UniqueTogetherValidator(
                 queryset=OrderItem.objects.all(),
@@ -242,6 +243,40 @@ class OrderItemSerializer(CustomValidationMixin,
         return value
 
 
+class BasketItemSerializer(CustomValidationMixin, serializers.Serializer):
+    """Позиция, добавляемая в корзину.
+
+    Проверяет только формат позиции, информация о продуктах
+    и позиции корзины проверяются одним запросом на весь список."""
+
+    product_info = serializers.IntegerField()
+    quantity = serializers.IntegerField(max_value=MAX_ORDER_QUANTITY_VALUE)
+
+    def validate_quantity(self, value):
+        self.is_valid_quantity(
+            value,
+            err_msg='Укажите корректное количество'
+        )
+        return value
+
+
+class BasketItemUpdateSerializer(BasketItemSerializer):
+    """Изменение количества в позиции корзины."""
+
+    id = serializers.IntegerField()
+    product_info = None
+
+
+class OrderBatchSerializer(serializers.Serializer):
+    """Список заказов для пакетной смены состояния."""
+
+    orders = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=ORDER_BATCH_MAX_SIZE
+    )
+
+
 class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
@@ -257,7 +292,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ('id', 'ordered_items', 'state',
-                  'total_sum', 'contact')
+                  'total_sum', 'items_count', 'contact')
 
         read_only_fields = ('id',)
 
@@ -302,46 +337,151 @@ class PartnerUpdateSerializer(serializers.Serializer):
         return value
 
     def create(self, validated_data):
-        user = self.context.get('request').user
-        data = load_yaml(
-            requests.get(validated_data.get('url')).content,
-            Loader=Loader
+        job = ImportJob.objects.create(
+            user=self.context.get('request').user,
+            url=validated_data.get('url')
         )
-        shop, _ = Shop.objects.get_or_create(
-            name=data.get('shop'),
-            user=user
+        transaction.on_commit(
+            lambda: import_price_list_async.delay(job_id=job.id)
         )
-        for category in data.get('categories', []):
-            category_obj, _ = Category.objects.get_or_create(
-                id=category.get('id'),
-                name=category.get('name')
-            )
-            category_obj.shops.add(shop)
-            category_obj.save()
-
-        ProductInfo.objects.filter(shop=shop).delete()
-        for item in data.get('goods'):
-            product, _ = Product.objects.get_or_create(
-                name=item.get('name'),
-                category_id=item.get('category')
-            )
-            product_info = ProductInfo.objects.create(
-                product=product,
-                external_id=item.get('id'),
-                model=item.get('model'),
-                price=item.get('price'),
-                price_rrc=item.get('price_rrc'),
-                quantity=item.get('quantity'),
-                shop=shop
-            )
-            for name, value in item.get('parameters').items():
-                parameter_object, _ = Parameter.objects.get_or_create(
-                    name=name
-                )
-                ProductParameter.objects.create(
-                    product_info=product_info,
-                    parameter=parameter_object,
-                    value=value
-                )
+        return job
+
 
-        return {'Status': True}
\ No newline at end of file
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'phase', 'processed', 'total',
+                  'changes', 'errors', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+
+class RowSerializer:
+    """Быстрый сериализатор только для чтения.
+
+    Строит словари из строк queryset.values() без создания моделей
+    и полей DRF. Поля для values() перечислены в атрибуте fields."""
+
+    fields = ()
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.rows]
+
+
+class CatalogRowSerializer(RowSerializer):
+    """Строка каталога в формате ProductInfoSerializer."""
+
+    fields = ('pk', 'model', 'product_name', 'category_name', 'image',
+              'shop_id', 'quantity', 'price', 'price_rrc', 'parameters')
+
+    def __init__(self, rows, prefix=''):
+        super().__init__(rows)
+        self.prefix = prefix
+
+    @classmethod
+    def get_fields(cls, prefix=''):
+        return tuple(f'{prefix}{field}' for field in cls.fields)
+
+    def to_representation(self, row):
+        prefix = self.prefix
+        image = row[f'{prefix}image']
+        return {
+            'id': row[f'{prefix}pk'],
+            'model': row[f'{prefix}model'],
+            'product': {
+                'name': row[f'{prefix}product_name'],
+                'category': row[f'{prefix}category_name'],
+                'image': default_storage.url(image) if image else None,
+            },
+            'shop': row[f'{prefix}shop_id'],
+            'quantity': row[f'{prefix}quantity'],
+            'price': row[f'{prefix}price'],
+            'price_rrc': row[f'{prefix}price_rrc'],
+            'product_parameters': row[f'{prefix}parameters'],
+            # В каталоге только позиции, которые есть в продаже.
+            'is_active': True,
+        }
+
+
+class OrderRowSerializer(RowSerializer):
+    """Заказы с позициями в формате OrderSerializer.
+
+    Позиции передаются отдельными строками, связанными с заказом
+    по order_id, данные товара берутся из каталога. Позиции, снятые
+    с продажи, в каталоге отсутствуют, поэтому они сериализуются
+    из информации о продуктах отдельным запросом с is_active=False."""
+
+    fields = ('id', 'state', 'total_sum', 'items_count', 'contact_id',
+              'contact__city', 'contact__street', 'contact__house',
+              'contact__structure', 'contact__building',
+              'contact__apartment', 'contact__phone')
+    item_prefix = 'product_info__catalog_item__'
+    item_fields = (
+        ('id', 'order_id', 'product_info_id', 'quantity', 'price')
+        + CatalogRowSerializer.get_fields(item_prefix)
+    )
+    contact_fields = ('city', 'street', 'house', 'structure', 'building',
+                      'apartment', 'phone')
+
+    def __init__(self, rows, items):
+        super().__init__(rows)
+        self.items = {}
+        items = list(items)
+        catalog_rows = CatalogRowSerializer((), prefix=self.item_prefix)
+        product_infos = self._get_unlisted_product_infos(items)
+        for item in items:
+            if item[f'{self.item_prefix}pk'] is None:
+                # Информация о продукте позиции корзины Redis удалена.
+                product_info = product_infos.get(item['product_info_id'])
+                if product_info is None:
+                    continue
+            else:
+                product_info = catalog_rows.to_representation(item)
+            self.items.setdefault(item['order_id'], []).append({
+                'id': item['id'],
+                'product_info': product_info,
+                'quantity': item['quantity'],
+                'price': item['price'],
+            })
+
+    def _get_unlisted_product_infos(self, items):
+        product_info_ids = [
+            item['product_info_id'] for item in items
+            if item[f'{self.item_prefix}pk'] is None
+        ]
+        if not product_info_ids:
+            return {}
+        return {
+            product_info['id']: product_info
+            for product_info in ProductInfoSerializer(
+                ProductInfo.objects.filter(
+                    id__in=product_info_ids
+                ).select_related('product__category').prefetch_related(
+                    'product_parameters__parameter'
+                ),
+                many=True
+            ).data
+        }
+
+    def to_representation(self, row):
+        contact = None
+        if row['contact_id'] is not None:
+            contact = {'id': row['contact_id']}
+            contact.update(
+                (field, row[f'contact__{field}'])
+                for field in self.contact_fields
+            )
+        return {
+            'id': row['id'],
+            'ordered_items': self.items.get(row['id'], []),
+            'state': row['state'],
+            'total_sum': int(row['total_sum']),
+            'items_count': row['items_count'],
+            'contact': contact,
+        }
\ No newline at end of file
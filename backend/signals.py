@@ -1,15 +1,33 @@
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.contrib.auth.tokens import default_token_generator
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import Signal, receiver
 from django_rest_passwordreset.signals import reset_password_token_created
 
+from backend.catalog import refresh_catalog_items
 from backend.constants import ORDER_STATUS
-from backend.models import ConfirmEmailToken, Contact, User
+from backend.models import (
+    CatalogItem,
+    Category,
+    ConfirmEmailToken,
+    Contact,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    User
+)
+from backend.outbox import enqueue_email, enqueue_emails
+from backend.response_cache import (
+    invalidate_catalog,
+    invalidate_resource
+)
+from backend.search import update_search_vectors
 
 new_user_registered = Signal()
 new_order = Signal()
 edit_order_state = Signal()
+orders_state_changed = Signal()
 order_confirmed = Signal()
 
 
@@ -27,14 +45,12 @@ def send_order_confirmation_email(sender, user_id, **kwargs):
     """
     user = User.objects.get(id=user_id)
     token = default_token_generator.make_token(user)
-    email = EmailMultiAlternatives(
+    enqueue_email(
         subject='Подтверждение заказа',
         body=('Ваш заказ ожидает подтверждения.\n'
               f'Ваш токен: {token}'),
-        from_email=settings.EMAIL_HOST_USER,
         to=[user.email]
     )
-    email.send()
 
 
 @receiver(order_confirmed)
@@ -61,13 +77,11 @@ def send_order_confirmed(sender, user_id, order_id, contact_id, **kwargs):
         f'{contact.house} Номер телефона: {contact.phone}'
     )
 
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         subject='Ваш заказ подтвержден',
         body=body_content,
-        from_email=settings.EMAIL_HOST_USER,
         to=[user.email]
     )
-    msg.send()
 
 
 @receiver(reset_password_token_created)
@@ -86,14 +100,12 @@ def custome_reset_password_token_created(sender,
    :param kwargs: Дополнительные аргументы.
    :return: Возвращает None.
     """
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         subject='Сброс пароля',
         body=(f'Токен сброса пароля для {reset_password_token.user}'
               f'\n{reset_password_token.key}'),
-        from_email=settings.EMAIL_HOST_USER,
         to=[reset_password_token.user.email]
     )
-    msg.send()
 
 
 @receiver(new_user_registered)
@@ -108,14 +120,12 @@ def custom_new_user_registered(user_id, **kwargs):
     :return: Возвращает None.
     """
     token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user_id)
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         subject='Подтверждение регистрации',
         body=(f'Токен подтверждения регистрации: {token.user.email}'
               f'\n{token.key}'),
-        from_email=settings.EMAIL_HOST_USER,
         to=[token.user.email]
     )
-    msg.send()
 
 
 @receiver(new_order)
@@ -131,13 +141,11 @@ def custom_new_order(user_id, **kwargs):
     :return: Возвращает None.
     """
     user = User.objects.get(id=user_id)
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         subject='Оформление заказа',
         body=f'{user.first_name}, Ваш заказ ожидает подтверждения!',
-        from_email=settings.EMAIL_HOST_USER,
         to=[user.email]
     )
-    msg.send()
 
 
 @receiver(edit_order_state)
@@ -153,10 +161,196 @@ def custom_edit_order_state(sender, user_id, order_id, state, **kwargs):
    :return: Возвращает None.
     """
     user = User.objects.get(id=user_id)
-    msg = EmailMultiAlternatives(
+    enqueue_email(
         subject='Обновление статуса заказа',
         body=f'Статус заказа обновлен на "{ORDER_STATUS.get(state)}"!',
-        from_email=settings.EMAIL_HOST_USER,
         to=[user.email]
     )
-    msg.send()
\ No newline at end of file
+
+
+@receiver(orders_state_changed)
+def send_orders_state_changed(sender, orders, state, **kwargs):
+    """Отправляет письма о пакетной смене статуса заказов.
+
+    Каждый покупатель получает одно письмо со всеми своими заказами,
+    письма записываются в очередь одним запросом.
+
+    :param orders: Пары (ИД заказа, ИД пользователя).
+    :param state: Новый статус заказов.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    order_ids = {}
+    for order_id, user_id in orders:
+        order_ids.setdefault(user_id, []).append(order_id)
+
+    enqueue_emails([
+        {
+            'subject': 'Обновление статуса заказа',
+            'body': (
+                'Статус заказов '
+                + ', '.join(
+                    f'№{order_id}' for order_id in sorted(order_ids[user_id])
+                )
+                + f' обновлен на "{ORDER_STATUS.get(state)}"!'
+            ),
+            'to': [email],
+        }
+        for user_id, email in User.objects.filter(
+            id__in=order_ids
+        ).values_list('id', 'email')
+    ])
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vectors(sender, instance, **kwargs):
+    """Обновляет поисковые векторы при изменении продукта.
+
+    :param instance: Сохраненный продукт.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    update_search_vectors(
+        list(instance.product_infos.values_list('id', flat=True))
+    )
+
+
+@receiver(post_save, sender=ProductInfo)
+def update_product_info_search_vector(sender, instance, **kwargs):
+    """Обновляет поисковый вектор сохраненной информации о продукте.
+
+    :param instance: Сохраненная информация о продукте.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    update_search_vectors([instance.id])
+
+
+@receiver(post_save, sender=ProductParameter)
+def update_parameter_search_vector(sender, instance, **kwargs):
+    """Обновляет поисковый вектор при изменении параметра продукта.
+
+    Сигнала удаления нет: он отключил бы быстрое удаление
+    параметров пачкой. Векторы после удаления обновляют импорт
+    и админка, один раз на пачку.
+
+    :param instance: Сохраненный параметр продукта.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    update_search_vectors([instance.product_info_id])
+
+
+@receiver(post_save, sender=ProductInfo)
+def update_product_info_catalog_item(sender, instance, **kwargs):
+    """Пересобирает строку каталога сохраненной информации о продукте.
+
+    :param instance: Сохраненная информация о продукте.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    refresh_catalog_items([instance.id])
+
+
+@receiver(post_save, sender=ProductParameter)
+def update_parameter_catalog_item(sender, instance, **kwargs):
+    """Пересобирает строку каталога при изменении параметра продукта.
+
+    Как и для поисковых векторов, каталог после удаления
+    параметров обновляют импорт и админка.
+
+    :param instance: Сохраненный параметр продукта.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    refresh_catalog_items([instance.product_info_id])
+
+
+@receiver(post_save, sender=Product)
+def update_product_catalog_items(sender, instance, **kwargs):
+    """Пересобирает строки каталога при изменении продукта.
+
+    :param instance: Сохраненный продукт.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    refresh_catalog_items(
+        instance.product_infos.values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Parameter)
+def update_parameter_name_catalog_items(sender, instance, **kwargs):
+    """Пересобирает строки каталога при переименовании параметра.
+
+    :param instance: Сохраненный параметр.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    refresh_catalog_items(
+        instance.product_parameters.values_list('product_info_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Category)
+def update_category_catalog_items(sender, instance, **kwargs):
+    """Обновляет название категории в строках каталога.
+
+    Кеш каталога сбрасывается, только если название изменилось.
+
+    :param instance: Сохраненная категория.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    items = CatalogItem.objects.filter(category_id=instance.id)
+    if items.exclude(category_name=instance.name).update(
+            category_name=instance.name
+    ):
+        invalidate_catalog(
+            shop_ids=items.values_list('shop_id', flat=True).distinct(),
+            category_ids=[instance.id]
+        )
+
+
+@receiver(post_save, sender=Shop)
+def update_shop_catalog_items(sender, instance, **kwargs):
+    """Обновляет статус магазина в строках каталога.
+
+    Кеш каталога сбрасывается, только если статус изменился.
+
+    :param instance: Сохраненный магазин.
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    items = CatalogItem.objects.filter(shop_id=instance.id)
+    if items.exclude(shop_state=instance.state).update(
+            shop_state=instance.state
+    ):
+        invalidate_catalog(
+            shop_ids=[instance.id],
+            category_ids=items.values_list(
+                'category_id', flat=True
+            ).distinct()
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def update_categories_version(sender, **kwargs):
+    """Меняет версию списка категорий для ETag.
+
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    invalidate_resource('categories')
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def update_shops_version(sender, **kwargs):
+    """Меняет версию списка магазинов для ETag.
+
+    :param kwargs: Дополнительные аргументы.
+    :return: Возвращает None.
+    """
+    invalidate_resource('shops')
\ No newline at end of file
@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When
+)
+from django.db.models.functions import Greatest
+
+from backend.models import CatalogItem, OrderItem, ProductInfo
+from backend.response_cache import invalidate_catalog
+
+
+def get_available_quantity():
+    """Возвращает выражение доступного к заказу остатка.
+
+    Резерв хранится отдельно от остатка поставщика, поэтому импорт
+    прайс-листа перезаписывает quantity, не теряя резервы заказов.
+    """
+    return Greatest(F('quantity') - F('reserved'), 0)
+
+
+def _get_order_quantities(order_ids):
+    """Суммирует количество товаров заказов по информации о продуктах.
+
+    :return: Количество по ИД информации о продукте, ИД магазинов
+        и категорий этих товаров.
+    """
+    quantities, shop_ids, category_ids = {}, set(), set()
+    for product_info_id, quantity, shop_id, category_id in (
+            OrderItem.objects.filter(
+                order_id__in=order_ids
+            ).values_list(
+                'product_info_id', 'quantity', 'product_info__shop_id',
+                'product_info__product__category_id'
+            )
+    ):
+        quantities[product_info_id] = (
+            quantities.get(product_info_id, 0) + quantity
+        )
+        shop_ids.add(shop_id)
+        category_ids.add(category_id)
+    return quantities, shop_ids, category_ids
+
+
+def _by_product_info(quantities):
+    return Case(
+        *(When(pk=product_info_id, then=Value(quantity))
+          for product_info_id, quantity in quantities.items()),
+        output_field=IntegerField()
+    )
+
+
+def _update_catalog_stock(quantities, shop_ids, category_ids):
+    CatalogItem.objects.filter(pk__in=quantities).update(
+        quantity=Subquery(
+            ProductInfo.objects.filter(
+                id=OuterRef('pk')
+            ).values(available=get_available_quantity())[:1]
+        )
+    )
+    invalidate_catalog(shop_ids=shop_ids, category_ids=category_ids)
+
+
+def reserve_stock(order_id):
+    """Резервирует товары заказа.
+
+    Резервы всех позиций увеличиваются одним условным
+    UPDATE ... WHERE quantity >= reserved + количество. Если хотя бы
+    одного товара не хватает или он снят с продажи, изменения
+    откатываются и резервы не меняются. Условие проверяется
+    по последней версии строки, поэтому параллельные заказы
+    не резервируют больше остатка.
+
+    :param order_id: Идентификатор размещаемого заказа.
+    :return: ИД информации о продуктах, которых не хватает на складе
+        или которые сняты с продажи.
+    """
+    quantities, shop_ids, category_ids = _get_order_quantities([order_id])
+    if not quantities:
+        return []
+
+    required = _by_product_info(quantities)
+    product_infos = ProductInfo.objects.filter(id__in=quantities)
+    with transaction.atomic():
+        if product_infos.filter(
+                quantity__gte=F('reserved') + required,
+                is_active=True
+        ).update(
+            reserved=F('reserved') + required
+        ) == len(quantities):
+            _update_catalog_stock(quantities, shop_ids, category_ids)
+            return []
+        transaction.set_rollback(True)
+
+    return list(product_infos.filter(
+        Q(quantity__lt=F('reserved') + required) | Q(is_active=False)
+    ).order_by('id').values_list('id', flat=True))
+
+
+def release_stock(order_ids):
+    """Снимает резерв с товаров отмененных заказов.
+
+    Остаток поставщика не меняется.
+
+    :param order_ids: Идентификаторы отмененных заказов.
+    """
+    quantities, shop_ids, category_ids = _get_order_quantities(order_ids)
+    if quantities:
+        ProductInfo.objects.filter(id__in=quantities).update(
+            reserved=F('reserved') - _by_product_info(quantities)
+        )
+        _update_catalog_stock(quantities, shop_ids, category_ids)
+
+
+def ship_stock(order_ids):
+    """Списывает со склада товары отправленных заказов.
+
+    Резерв переходит в списание остатка. Следующий импорт
+    прайс-листа перезапишет остаток значением поставщика, которое
+    уже учитывает отгрузку.
+
+    :param order_ids: Идентификаторы отправленных заказов.
+    """
+    quantities, shop_ids, category_ids = _get_order_quantities(order_ids)
+    if quantities:
+        shipped = _by_product_info(quantities)
+        ProductInfo.objects.filter(id__in=quantities).update(
+            quantity=Greatest(F('quantity') - shipped, 0),
+            reserved=F('reserved') - shipped
+        )
+        _update_catalog_stock(quantities, shop_ids, category_ids)
\ No newline at end of file
@@ -1,72 +1,160 @@
+from datetime import timedelta
 from io import BytesIO
 
 from PIL import Image
 from celery import shared_task
+from django.conf import settings
 from django.core.files.uploadedfile import (
     SimpleUploadedFile
 )
-from django.db import transaction, IntegrityError
+from django.utils import timezone
 
-from backend.models import Order
-from backend.signals import (
-    edit_order_state,
-    new_order,
-    order_confirmed
+from backend.constants import IMPORT_ACTIVE_PHASES
+from backend.importers import (
+    count_price_list_goods,
+    download_price_list,
+    get_refresh_countdowns,
+    PartialImportError,
+    PriceListImporter,
+    read_price_list
 )
+from backend.models import ImportJob, Shop
+from backend.outbox import OutboxDispatcher
+from backend.transitions import release_expired_orders
 
 
 @shared_task
-def create_order_async(sender, user_id):
-    try:
-        new_order.send(sender=sender, user_id=user_id)
-    except IntegrityError as err:
-        return False, f'Неправильно указаны аргументы: {err}'
-    return True, 'Заказ успешно создан!'
+def dispatch_outbox_async():
+    metrics = OutboxDispatcher().run()
+    return True, (
+        f'Отправлено писем: {metrics["sent"]}, '
+        f'отложено: {metrics["retried"]}, '
+        f'не доставлено: {metrics["dead"]}, '
+        f'сообщений в секунду: {metrics["messages_per_second"]:.1f}, '
+        'повторное использование соединения: '
+        f'{metrics["connection_reuse_ratio"]:.0%}'
+    )
 
 
 @shared_task
-def confirm_order_async(sender, user_id, order_id, contact_id):
+def release_expired_orders_async():
+    orders = release_expired_orders()
+    return True, f'Отменено просроченных заказов: {len(orders)}'
+
+
+def _update_import_job(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[*fields, 'updated_at'])
+
+
+@shared_task(soft_time_limit=settings.PRICE_LIST_IMPORT_TIMEOUT)
+def import_price_list_async(job_id):
+    """Загружает и импортирует прайс-лист поставщика.
+
+    Если прайс-лист не изменился с прошлого импорта, импорт
+    пропускается. Если импорт прерван после записи части позиций,
+    задача получает этап partial с записанными изменениями, а ссылка
+    и хэш прайс-листа магазина не сохраняются, поэтому следующее
+    обновление импортирует его заново. Импорт, не уложившийся
+    в PRICE_LIST_IMPORT_TIMEOUT секунд, прерывается и завершается
+    ошибкой. Общее количество позиций считается по файлу до начала
+    импорта и сохраняется вместе с этапом importing. Прайс-лист
+    разбирается потоково, поэтому количество обработанных позиций
+    сохраняется в задаче импорта по ходу работы. Этап и счетчики
+    можно получить через partner/update/{id}.
+
+    :param job_id: Идентификатор задачи импорта.
+    :return: Результат импорта и сообщение.
+    """
+    job = ImportJob.objects.select_related('user').get(id=job_id)
     try:
-        order_confirmed.send(
-            sender=sender,
-            user_id=user_id,
-            order_id=order_id,
-            contact_id=contact_id
+        _update_import_job(job, phase='downloading')
+        file, cache_fields = download_price_list(
+            job.url,
+            Shop.objects.filter(user=job.user).first()
         )
-    except Order.DoesNotExist:
-        return False, f'Заказ №{order_id} уже подтвержден или отменён'
-    return True, f'Заказ №{order_id} успешно подтвержден'
+        if file is None:
+            Shop.objects.filter(user=job.user).update(**cache_fields)
+            _update_import_job(job, phase='not_modified')
+            return True, f'Прайс-лист импорта №{job_id} не изменился'
 
+        with file:
+            total = count_price_list_goods(file)
+            file.seek(0)
+            _update_import_job(job, phase='importing', total=total)
+            changes = PriceListImporter(
+                user=job.user,
+                on_progress=lambda processed: _update_import_job(
+                    job, processed=processed
+                )
+            ).run(read_price_list(file))
+        Shop.objects.filter(user=job.user).update(
+            url=job.url,
+            **cache_fields
+        )
+    except PartialImportError as err:
+        _update_import_job(
+            job,
+            phase='partial',
+            changes=err.changes,
+            errors=[str(err)]
+        )
+        return False, f'Импорт №{job_id} выполнен частично: {err}'
+    except Exception as err:
+        _update_import_job(job, phase='failed', errors=[str(err)])
+        return False, f'Ошибка импорта №{job_id}: {err}'
 
-@shared_task()
-def update_order_state_async(sender,
-                             order_id,
-                             user_id,
-                             expected_state,
-                             new_state):
-    try:
-        with transaction.atomic():
-            order = Order.objects.select_for_update().get(
-                id=order_id,
-                user_id=user_id
-            )
-            if order.state != expected_state:
-                return False, ('Невозможно выполнить операцию, '
-                               f'заказ находится в состоянии {order.state}')
-
-            order.state = new_state
-            order.save()
-            edit_order_state.send(
-                sender=sender,
-                user_id=user_id,
-                order_id=order_id,
-                state=new_state
-            )
-
-    except Order.DoesNotExist:
-        return False, 'Заказ не найден'
-    return True, (f'Заказ №{order.id} успешно переведен '
-                  f'в состояние {new_state}')
+    _update_import_job(job, phase='done', changes=changes)
+    return True, f'Импорт №{job_id} успешно завершен'
+
+
+@shared_task
+def refresh_price_lists_async():
+    """Запускает плановое обновление прайс-листов всех магазинов.
+
+    Для каждого магазина с сохраненной ссылкой создается задача
+    импорта, если предыдущая еще не завершена, магазин пропускается.
+    Незавершенные задачи, не обновлявшиеся дольше
+    PRICE_LIST_IMPORT_TIMEOUT секунд, сначала завершаются ошибкой:
+    их импорт прерван, и они не должны блокировать магазин.
+
+    :return: Результат и сообщение с количеством запущенных импортов.
+    """
+    now = timezone.now()
+    ImportJob.objects.filter(
+        phase__in=IMPORT_ACTIVE_PHASES,
+        updated_at__lt=now - timedelta(
+            seconds=settings.PRICE_LIST_IMPORT_TIMEOUT
+        )
+    ).update(
+        phase='failed',
+        errors=['Импорт прерван: задача не обновлялась дольше '
+                f'{settings.PRICE_LIST_IMPORT_TIMEOUT} секунд'],
+        updated_at=now
+    )
+    shops = list(
+        Shop.objects.filter(
+            url__isnull=False,
+            user__isnull=False
+        ).exclude(
+            url=''
+        ).exclude(
+            user__import_jobs__phase__in=IMPORT_ACTIVE_PHASES
+        ).order_by('id')
+    )
+    jobs = ImportJob.objects.bulk_create(
+        ImportJob(user_id=shop.user_id, url=shop.url) for shop in shops
+    )
+    for job, countdown in zip(
+            jobs,
+            get_refresh_countdowns([job.url for job in jobs])
+    ):
+        import_price_list_async.apply_async(
+            kwargs={'job_id': job.id},
+            countdown=countdown
+        )
+    return True, f'Запущено обновление прайс-листов: {len(jobs)}'
 
 
 @shared_task
@@ -0,0 +1,249 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from backend.constants import ORDER_TRANSITIONS
+from backend.models import (
+    Order,
+    OrderChange,
+    OrderChangeSequence,
+    OrderItem,
+    OrderStateEvent
+)
+from backend.signals import orders_state_changed
+from backend.stock import release_stock, ship_stock
+
+
+def get_source_states(new_state):
+    """Возвращает статусы, из которых разрешен переход в new_state."""
+    return tuple(
+        state for state, targets in ORDER_TRANSITIONS.items()
+        if new_state in targets
+    )
+
+
+def record_order_changes(order_ids, changed_at=None):
+    """Выдает изменившимся заказам новые номера в ленте магазинов.
+
+    Счетчики магазинов блокируются в порядке ИД до конца
+    транзакции, поэтому номера изменений одного магазина становятся
+    видны строго по возрастанию и курсор ленты ничего не пропускает.
+    Число запросов не зависит от числа заказов и магазинов.
+
+    :param order_ids: Идентификаторы изменившихся заказов.
+    :param changed_at: Дата изменения, по умолчанию текущая.
+    """
+    order_ids_by_shop = {}
+    for shop_id, order_id in OrderItem.objects.filter(
+            order_id__in=order_ids
+    ).values_list('product_info__shop_id', 'order_id').distinct():
+        order_ids_by_shop.setdefault(shop_id, []).append(order_id)
+    if not order_ids_by_shop:
+        return
+
+    OrderChangeSequence.objects.bulk_create(
+        [OrderChangeSequence(shop_id=shop_id)
+         for shop_id in order_ids_by_shop],
+        ignore_conflicts=True
+    )
+    sequences = list(OrderChangeSequence.objects.select_for_update().filter(
+        shop_id__in=order_ids_by_shop
+    ).order_by('shop_id'))
+
+    changed_at = changed_at or timezone.now()
+    changes = []
+    for sequence in sequences:
+        for order_id in sorted(order_ids_by_shop[sequence.shop_id]):
+            sequence.value += 1
+            changes.append(OrderChange(
+                shop_id=sequence.shop_id,
+                order_id=order_id,
+                sequence=sequence.value,
+                changed_at=changed_at
+            ))
+    OrderChangeSequence.objects.bulk_update(sequences, ('value',))
+    OrderChange.objects.bulk_create(
+        changes,
+        update_conflicts=True,
+        unique_fields=('shop', 'order'),
+        update_fields=('sequence', 'changed_at')
+    )
+
+
+def record_state_events(transitions, new_state, created_at=None):
+    """Записывает переходы заказов в журнал и ленту изменений.
+
+    :param transitions: Пары (ИД заказа, предыдущий статус).
+    :param new_state: Новый статус заказов.
+    :param created_at: Дата перехода, по умолчанию текущая.
+    """
+    created_at = created_at or timezone.now()
+    OrderStateEvent.objects.bulk_create(
+        OrderStateEvent(
+            order_id=order_id,
+            from_state=from_state,
+            to_state=new_state,
+            created_at=created_at
+        )
+        for order_id, from_state in transitions
+    )
+    record_order_changes(
+        [order_id for order_id, _ in transitions],
+        created_at
+    )
+
+
+def _update_state(orders, source_state, new_state, skip_locked, fields):
+    """Переводит заказы из source_state одним условным UPDATE.
+
+    UPDATE ... WHERE id IN (...) AND state = source_state RETURNING
+    возвращает только заказы, которые он действительно изменил,
+    поэтому строки не блокируются отдельным запросом.
+
+    :return: Пары (ИД заказа, ИД пользователя) переведенных заказов.
+    """
+    candidates = orders.filter(state=source_state).order_by().values('pk')
+    if skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    connection = connections[orders.db]
+    subquery, params = candidates.query.get_compiler(
+        connection=connection
+    ).as_sql()
+
+    quote_name = connection.ops.quote_name
+    assignments, values = [], []
+    for name, value in {'state': new_state, **fields}.items():
+        field = Order._meta.get_field(name)
+        assignments.append(f'{quote_name(field.column)} = %s')
+        values.append(field.get_db_prep_save(value, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {quote_name(Order._meta.db_table)} '
+            f'SET {", ".join(assignments)} '
+            f'WHERE {quote_name("id")} IN ({subquery}) '
+            f'AND {quote_name("state")} = %s '
+            f'RETURNING {quote_name("id")}, {quote_name("user_id")}',
+            (*values, *params, source_state)
+        )
+        return cursor.fetchall()
+
+
+def change_state(orders, new_state, skip_locked=False, **fields):
+    """Переводит заказы в статус new_state по ORDER_TRANSITIONS.
+
+    Заказы переводятся условным UPDATE ... RETURNING на каждый
+    статус, из которого разрешен переход, без предварительной
+    блокировки строк. В журнал записываются только заказы,
+    которые UPDATE действительно изменил, в той же транзакции.
+    При отмене с товаров снимается резерв, при отправке резерв
+    списывается с остатка. Число запросов не зависит от числа
+    заказов.
+
+    :param orders: QuerySet переводимых заказов.
+    :param new_state: Новый статус заказов.
+    :param skip_locked: Пропускать заказы, заблокированные
+        другими транзакциями.
+    :param fields: Дополнительные поля, изменяемые тем же UPDATE.
+    :return: ИД пользователей по ИД переведенных заказов.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        transitions = [
+            (order_id, user_id, source_state)
+            for source_state in get_source_states(new_state)
+            for order_id, user_id in _update_state(
+                orders,
+                source_state,
+                new_state,
+                skip_locked,
+                {'updated_at': now, **fields}
+            )
+        ]
+        if not transitions:
+            return {}
+
+        record_state_events(
+            [(order_id, state) for order_id, _, state in transitions],
+            new_state,
+            now
+        )
+        order_ids = [order_id for order_id, _, _ in transitions]
+        if new_state == 'canceled':
+            release_stock(order_ids)
+        elif new_state == 'sent':
+            ship_stock(order_ids)
+    return {order_id: user_id for order_id, user_id, _ in transitions}
+
+
+def transition_orders(order_ids, new_state, shop_user_id):
+    """Переводит пачку заказов поставщика в новый статус.
+
+    Переводятся заказы с товарами магазина поставщика, из статуса
+    которых разрешен переход. Письма покупателям ставятся в очередь
+    одной пачкой в той же транзакции.
+
+    :param order_ids: Идентификаторы заказов.
+    :param new_state: Новый статус заказов.
+    :param shop_user_id: Идентификатор пользователя магазина.
+    :return: Ошибки по ИД заказов, None для переведенных заказов.
+    """
+    orders = Order.objects.filter(
+        Exists(OrderItem.objects.filter(
+            order_id=OuterRef('pk'),
+            product_info__shop__user_id=shop_user_id
+        )),
+        id__in=order_ids
+    )
+    with transaction.atomic():
+        changed = change_state(orders, new_state)
+        if changed:
+            orders_state_changed.send(
+                sender='transition_orders',
+                orders=list(changed.items()),
+                state=new_state
+            )
+        states = dict(
+            orders.exclude(id__in=changed).values_list('id', 'state')
+        )
+
+    results = {}
+    for order_id in order_ids:
+        if order_id in changed:
+            results[order_id] = None
+        elif order_id in states:
+            results[order_id] = ('Невозможно выполнить операцию, заказ '
+                                 f'находится в состоянии {states[order_id]}')
+        else:
+            results[order_id] = 'Заказ не найден'
+    return results
+
+
+def release_expired_orders():
+    """Отменяет просроченные неподтвержденные заказы.
+
+    Заказы, не подтвержденные за ORDER_RESERVATION_TIMEOUT секунд,
+    отменяются, с их товаров снимается резерв, а письма
+    пользователям ставятся в очередь в той же транзакции.
+
+    :return: Пары (ИД заказа, ИД пользователя) отмененных заказов.
+    """
+    expired = Order.objects.filter(
+        state='new',
+        updated_at__lt=timezone.now() - timedelta(
+            seconds=settings.ORDER_RESERVATION_TIMEOUT
+        )
+    )
+    with transaction.atomic():
+        orders = list(
+            change_state(expired, 'canceled', skip_locked=True).items()
+        )
+        if orders:
+            orders_state_changed.send(
+                sender='release_expired_orders',
+                orders=orders,
+                state='canceled'
+            )
+    return orders
\ No newline at end of file
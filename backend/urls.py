@@ -131,6 +131,26 @@ urlpatterns = [
          OrderViewSet.as_view({'post': 'cancel_order'}),
          name='cancel-order'
          ),
+    path(
+        'partner/orders/changes',
+        PartnerOrdersViewSet.as_view({'get': 'changes'}),
+        name='partner-orders-changes'
+    ),
+    path(
+        'partner/orders/assemble/',
+        PartnerOrdersViewSet.as_view({'post': 'assemble_orders'}),
+        name='partner-orders-assemble'
+    ),
+    path(
+        'partner/orders/send/',
+        PartnerOrdersViewSet.as_view({'post': 'send_orders'}),
+        name='partner-orders-send'
+    ),
+    path(
+        'partner/orders/deliver/',
+        PartnerOrdersViewSet.as_view({'post': 'deliver_orders'}),
+        name='partner-orders-deliver'
+    ),
     path(
         'products',
         ProductInfoViewSet.as_view({'get': 'list'}),
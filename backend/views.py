@@ -3,9 +3,12 @@ import json
 from cacheops import cached, cached_as
 from django.contrib.auth.tokens import default_token_generator
 from django.db import IntegrityError, transaction
-from django.db.models import F, Q, Sum
-from django.http import JsonResponse
+from django.db.models import Exists, OuterRef, Q
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from distutils.util import strtobool
 from djoser.views import UserViewSet as BaseUserViewSet
 from rest_framework import status
@@ -15,6 +18,7 @@ from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import (
@@ -23,41 +27,63 @@ from rest_framework.viewsets import (
     ViewSet
 )
 
-from backend.constants import CACHE_TIMEOUT
+from backend.baskets import get_basket_storage
+from backend.constants import (
+    CACHE_TIMEOUT,
+    HTTP_CACHE_MAX_AGE,
+    HTTP_CACHE_S_MAXAGE,
+    ORDER_CHANGES_PAGE_SIZE
+)
+from backend.filters import filter_product_infos, get_parameter_facets
 from backend.forms import ImageUploadForm
 from backend.models import (
+    CatalogItem,
     Category,
     ConfirmEmailToken,
     Contact,
+    ImportJob,
     Order,
+    OrderChange,
     OrderItem,
     Product,
-    ProductInfo,
     Shop,
     User,
 )
+from backend.pagination import ProductInfoCursorPagination
 from backend.permissions import (
     IsAuthorOrReadOnly,
     IsShopOnly
 )
+from backend.renderers import UJSONRenderer
+from backend.response_cache import (
+    get_catalog_cache_key,
+    get_catalog_etag,
+    get_catalog_response,
+    get_resource_etag,
+    set_catalog_response
+)
+from backend.search import search_product_infos
 from backend.serializers import (
+    CatalogRowSerializer,
     CategorySerializer,
     ContactSerializer,
+    ImportJobSerializer,
     LoginAccountSerializer,
+    OrderBatchSerializer,
     OrderSerializer,
-    OrderItemSerializer,
     PartnerUpdateSerializer,
     ProductSerializer,
-    ProductInfoSerializer,
     ShopSerializer,
     UserSerializer,
 )
-from backend.tasks import (
-    confirm_order_async,
-    create_order_async,
-    process_image_async,
-    update_order_state_async
+from backend.signals import (
+    edit_order_state,
+    new_order,
+    order_confirmed
 )
+from backend.stock import reserve_stock
+from backend.tasks import process_image_async
+from backend.transitions import change_state, transition_orders
 from backend.utils import validate_all_fields
 
 
@@ -182,12 +208,39 @@ class ContactViewSet(ViewSet):
             )
 
 
+public_cache = cache_control(
+    public=True,
+    max_age=HTTP_CACHE_MAX_AGE,
+    s_maxage=HTTP_CACHE_S_MAXAGE
+)
+
+
+@method_decorator(public_cache, name='list')
+@method_decorator(public_cache, name='retrieve')
+@method_decorator(
+    condition(etag_func=get_resource_etag('categories')),
+    name='list'
+)
+@method_decorator(
+    condition(etag_func=get_resource_etag('categories')),
+    name='retrieve'
+)
 class CategoryViewSet(ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
 
+@method_decorator(public_cache, name='list')
+@method_decorator(public_cache, name='retrieve')
+@method_decorator(
+    condition(etag_func=get_resource_etag('shops')),
+    name='list'
+)
+@method_decorator(
+    condition(etag_func=get_resource_etag('shops')),
+    name='retrieve'
+)
 class ShopViewSet(ReadOnlyModelViewSet):
     queryset = Shop.objects.all()
     serializer_class = ShopSerializer
@@ -244,7 +297,12 @@ class LoginAccountViewSet(ViewSet):
 
 
 class PartnerUpdateViewSet(ViewSet):
-    """Класс для обновления цены от поставщика."""
+    """Класс для обновления цены от поставщика.
+
+    Импорт выполняется в фоне, ход импорта
+    доступен по идентификатору задачи."""
+
+    permission_classes = (IsAuthenticated & IsShopOnly,)
 
     def create(self, request):
         serializer = PartnerUpdateSerializer(
@@ -252,64 +310,89 @@ class PartnerUpdateViewSet(ViewSet):
             context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save()
+            job = serializer.save()
             return Response(
                 data={
                     'Status': True,
-                    'Message': 'Данные успешно импортированы!'
+                    'Message': 'Импорт поставлен в очередь',
+                    'JobId': job.id
                 },
-                status=status.HTTP_201_CREATED
+                status=status.HTTP_202_ACCEPTED
             )
         return Response(
             data=serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(ImportJob, pk=pk, user=request.user)
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
 
 class ProductInfoViewSet(ViewSet):
     """Класс для поиска и вывода списка товаров."""
 
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
+
+    @method_decorator(public_cache)
+    @method_decorator(condition(etag_func=get_catalog_etag))
     def list(self, request):
-        query = Q(shop__state=True)
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return self._get_response(request)
+
+        # Готовый JSON хранится в кеше и отдается без обращения к БД.
+        cache_key = get_catalog_cache_key(request)
+        content = get_catalog_response(cache_key)
+        if content is None:
+            content = renderer.render(self._get_response(request).data)
+            set_catalog_response(cache_key, content)
+        return HttpResponse(content, content_type=renderer.media_type)
+
+    def _get_response(self, request):
+        query = Q(shop_state=True)
         shop_id = request.query_params.get('shop_id')
         category_id = request.query_params.get('category_id')
 
         if shop_id:
             query &= Q(shop_id=shop_id)
         if category_id:
-            query &= Q(product__category_id=category_id)
-
-        queryset = ProductInfo.objects.filter(
-            query
-        ).select_related(
-            'shop', 'product__category'
-        ).prefetch_related(
-            'product_parameters__parameter'
-        ).distinct()
+            query &= Q(category_id=category_id)
+
+        queryset = CatalogItem.objects.filter(query)
+        queryset = filter_product_infos(queryset, request.query_params)
+        search = request.query_params.get('q')
+        if search:
+            queryset = search_product_infos(
+                queryset,
+                search,
+                vector_field='product_info__search_vector',
+                name_field='product_name'
+            )
 
-        serializer = ProductInfoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = ProductInfoCursorPagination()
+        fields = CatalogRowSerializer.fields
+        if search:
+            fields += ('rank',)
+        page = paginator.paginate_queryset(
+            queryset.values(*fields), request, view=self
+        )
+        serializer = CatalogRowSerializer(page)
+        response = paginator.get_paginated_response(serializer.data)
+        # Фасеты не зависят от страницы, поэтому считаются только для первой.
+        if paginator.cursor_query_param not in request.query_params:
+            response.data['facets'] = get_parameter_facets(queryset)
+        return response
 
 
 class BasketViewSet(ViewSet):
     """Класс для работы с корзиной пользователя."""
 
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
     http_method_names = ['get', 'post', 'patch', 'put', 'delete']
 
-    def _get_basket(self, user_id):
-        return Order.objects.filter(
-            user_id=user_id, state='basket'
-        ).prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter'
-        ).annotate(
-            total_sum=Sum(
-                F('ordered_items__quantity')
-                * F('ordered_items__product_info__price')
-            )
-        ).distinct()
-
     def _parse_items(self, items):
         try:
             return json.loads(items)
@@ -319,61 +402,26 @@ class BasketViewSet(ViewSet):
                 'Errors': f'Неверный формат запроса {err}'
             }
 
-    def _create_order_items(self, basket, items):
-        created_count = 0
-        for order_data in items:
-            order_data['order'] = basket.id
-            serializer = OrderItemSerializer(data=order_data)
-            if serializer.is_valid():
-                serializer.save()
-                created_count += 1
-            else:
-                return {
-                    'Status': False,
-                    'Errors': serializer.errors
-                }
-        return created_count
-
-    def _update_order_items(self, basket, items):
-        updated_count = 0
-        for order_data in items:
-            order_id = order_data.get('id')
-            quantity = order_data.get('quantity')
-            try:
-                order_item = OrderItem.objects.get(
-                    order=basket,
-                    id=order_id
-                )
-                order_item.quantity = quantity
-                order_item.save()
-                updated_count += 1
-            except OrderItem.DoesNotExist:
-                return {
-                    'Status': False,
-                    'Errors': f'Позиция корзины с id {order_id} не найдена'
-                }
-
-        return updated_count
-
     def _handle_items(self, request, action):
         items = request.data.get('items')
 
         if items:
             items = self._parse_items(items)
-            basket, _ = Order.objects.get_or_create(
-                user_id=request.user.id,
-                state='basket',
-                contact_id=get_object_or_404(
-                    Contact, id=request.data.get('contact_id')
-                ).id
-            )
+            if isinstance(items, dict):
+                return Response(
+                    data=items,
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
+            storage = get_basket_storage()
             if action == 'create':
-                result = self._create_order_items(basket, items)
-            elif action == 'update':
-                result = self._update_order_items(basket, items)
+                result = storage.add_items(
+                    request.user.id, request.data.get('contact_id'), items
+                )
             else:
-                result = 0
+                result = storage.update_items(
+                    request.user.id, request.data.get('contact_id'), items
+                )
 
             if isinstance(result, dict):
                 return Response(
@@ -406,9 +454,7 @@ class BasketViewSet(ViewSet):
         )
 
     def list(self, request):
-        basket = self._get_basket(request.user.id)
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        return Response(get_basket_storage().list(request.user.id))
 
     def create(self, request):
         return self._handle_items(request, 'create')
@@ -427,34 +473,15 @@ class BasketViewSet(ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        items = items.split(',')
-        basket = self.get_or_create_basket(request)
-        if not basket:
-            return Response(
-                data={
-                    'Status': False,
-                    'Errors': 'Не удалось создать корзину'
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        query, removed = self.build_query(items, basket)
-        if not removed:
-            return Response(
-                data={
-                    'Status': True,
-                    'Message': 'Ничего не было удалено'
-                },
-                status=status.HTTP_200_OK
+        item_ids = [
+            int(item_id) for item_id in items.split(',') if item_id.isdigit()
+        ]
+        removed_count = 0
+        if item_ids:
+            removed_count = get_basket_storage().remove_items(
+                request.user.id, item_ids
             )
-
-        removed_count = self.remove_items(query)
         if removed_count > 0:
-            basket.save()
-
-            # Если в корзине не остались позиции, она удаляется.
-            if not basket.ordered_items.exists():
-                basket.delete()
             return Response(
                 data={
                     'Status': True,
@@ -471,39 +498,6 @@ class BasketViewSet(ViewSet):
             status=status.HTTP_200_OK
         )
 
-    def get_or_create_basket(self, request):
-        try:
-            return Order.objects.get(
-                user_id=request.user.id,
-                state='basket'
-            )
-        except Order.DoesNotExist:
-            contact_id = request.data.get('contact_id')
-            get_object_or_404(Contact, id=contact_id)
-
-            return Order.objects.create(
-                user_id=request.user.id,
-                state='basket',
-                contact_id=contact_id
-            )
-
-    def build_query(self, items, basket):
-        query = Q()
-        removed = False
-        for order_id in items:
-            if order_id.isdigit():
-                query = query | Q(
-                    order_id=basket.id,
-                    id=order_id
-                )
-                removed = True
-        return query, removed
-
-    def remove_items(self, query):
-        with transaction.atomic():
-            removed_count, _ = OrderItem.objects.filter(query).delete()
-            return removed_count
-
 
 class OrderViewSet(ViewSet):
     """Класс для получения и размещения заказов пользователями."""
@@ -518,12 +512,7 @@ class OrderViewSet(ViewSet):
         ).prefetch_related(
             'ordered_items__product_info__product__category',
             'ordered_items__product_info__product_parameters__parameter'
-        ).select_related('contact').annotate(
-            total_sum=Sum(
-                F('ordered_items__quantity')
-                * F('ordered_items__product_info__price')
-            )
-        ).distinct()
+        ).select_related('contact')
 
         serializer = OrderSerializer(order, many=True)
         return Response(serializer.data)
@@ -537,18 +526,29 @@ class OrderViewSet(ViewSet):
                     code=status.HTTP_400_BAD_REQUEST
                 )
 
-    @transaction.atomic
     def create(self, request):
         validate_all_fields(('id', 'contact'), request.data)
         self.__all_fields_isdigit(('id', 'contact'))
 
+        # Корзина, забранная хранилищем, возвращается, если размещение
+        # заказа откатилось, в том числе при ошибке фиксации.
+        storage = get_basket_storage()
         try:
-            is_updated = Order.objects.filter(
-                user_id=request.user.id,
-                id=request.data.get('id')
-            ).update(
-                contact_id=request.data.get('contact'),
-                state='new'
+            response = self.__place_order(storage, request)
+        except Exception:
+            storage.restore_basket(request.user.id, request.data.get('id'))
+            raise
+        if response.status_code != status.HTTP_201_CREATED:
+            storage.restore_basket(request.user.id, request.data.get('id'))
+        return response
+
+    @transaction.atomic
+    def __place_order(self, storage, request):
+        try:
+            order_id = storage.place_order(
+                request.user.id,
+                request.data.get('id'),
+                request.data.get('contact')
             )
         except IntegrityError as err:
             return JsonResponse(
@@ -559,16 +559,23 @@ class OrderViewSet(ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if is_updated:
-            result, message = create_order_async.delay(
+        if order_id:
+            shortage = reserve_stock(order_id)
+            if shortage:
+                transaction.set_rollback(True)
+                return self.__result_handler(
+                    False,
+                    ('Недостаточно товара на складе: '
+                     + ', '.join(map(str, shortage)))
+                )
+            new_order.send(
                 sender=self.__class__.__name__,
-                user_id=request.user.id,
-            ).get()
-
+                user_id=request.user.id
+            )
             return self.__result_handler(
-                result,
-                message,
-                status=status.HTTP_201_CREATED
+                True,
+                'Заказ успешно создан!',
+                code=status.HTTP_201_CREATED
             )
 
         return JsonResponse(
@@ -579,6 +586,7 @@ class OrderViewSet(ViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @transaction.atomic
     def confirm_order(self, request):
         validate_all_fields(
             ('email', 'token', 'order_id', 'contact_id'),
@@ -635,22 +643,32 @@ class OrderViewSet(ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.state = 'confirmed'
-        order.save()
-        result, message = confirm_order_async.delay(
+        # Заказ мог быть отменен по истечении резерва после чтения.
+        if not change_state(Order.objects.filter(id=order.id), 'confirmed'):
+            return JsonResponse(
+                data={
+                    'Status': False,
+                    'Errors': 'Заказ уже подтвержден или отменён'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        order_confirmed.send(
             sender=self.__class__.__name__,
             user_id=user.id,
             order_id=order.id,
             contact_id=contact.id
-        ).get()
+        )
 
-        return self.__result_handler(result, message)
+        return self.__result_handler(
+            True,
+            f'Заказ №{order.id} успешно подтвержден'
+        )
 
-    def __result_handler(self, result, msg, status=status.HTTP_200_OK):
+    def __result_handler(self, result, msg, code=status.HTTP_200_OK):
         if result:
             return JsonResponse(
                 data={'Status': True, 'Message': msg},
-                status=status
+                status=code
             )
 
         return JsonResponse(
@@ -658,53 +676,49 @@ class OrderViewSet(ViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    def assemble_order(self, request):
+    @transaction.atomic
+    def __update_order_state(self, request, new_state):
+        """Переводит заказ пользователя в новое состояние.
+
+        Переход проверяется по ORDER_TRANSITIONS и выполняется условным
+        UPDATE в транзакции запроса, в той же транзакции письмо
+        пользователю ставится в очередь."""
         validate_all_fields(('order_id',), request.data)
-        result, message = update_order_state_async.delay(
-            self.__class__.__name__,
-            request.data.get('order_id'),
-            request.user.id,
-            'confirmed',
-            'assembled'
-        ).get()
+        self.__all_fields_isdigit(('order_id',))
+        order_id = int(request.data.get('order_id'))
+        orders = Order.objects.filter(id=order_id, user_id=request.user.id)
+        if not change_state(orders, new_state):
+            order = orders.only('state').first()
+            if order is None:
+                return self.__result_handler(False, 'Заказ не найден')
+            return self.__result_handler(
+                False,
+                ('Невозможно выполнить операцию, '
+                 f'заказ находится в состоянии {order.state}')
+            )
 
-        return self.__result_handler(result, message)
+        edit_order_state.send(
+            sender=self.__class__.__name__,
+            user_id=request.user.id,
+            order_id=order_id,
+            state=new_state
+        )
+        return self.__result_handler(
+            True,
+            f'Заказ №{order_id} успешно переведен в состояние {new_state}'
+        )
 
-    def send_order(self, request):
-        validate_all_fields(('order_id',), request.data)
-        result, message = update_order_state_async.delay(
-            self.__class__.__name__,
-            request.data.get('order_id'),
-            request.user.id,
-            'assembled',
-            'sent'
-        ).get()
+    def assemble_order(self, request):
+        return self.__update_order_state(request, 'assembled')
 
-        return self.__result_handler(result, message)
+    def send_order(self, request):
+        return self.__update_order_state(request, 'sent')
 
     def deliver_order(self, request):
-        validate_all_fields(('order_id',), request.data)
-        result, message = update_order_state_async.delay(
-            self.__class__.__name__,
-            request.data.get('order_id'),
-            request.user.id,
-            'sent',
-            'delivered'
-        ).get()
-
-        return self.__result_handler(result, message)
+        return self.__update_order_state(request, 'delivered')
 
     def cancel_order(self, request):
-        validate_all_fields(('order_id',), request.data)
-        result, message = update_order_state_async.delay(
-            self.__class__.__name__,
-            request.data.get('order_id'),
-            request.user.id,
-            'new',
-            'canceled'
-        ).get()
-
-        return self.__result_handler(result, message)
+        return self.__update_order_state(request, 'canceled')
 
 
 class PartnerOrdersViewSet(ViewSet):
@@ -714,22 +728,103 @@ class PartnerOrdersViewSet(ViewSet):
 
     def list(self, request):
         order = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id
+            Exists(OrderItem.objects.filter(
+                order_id=OuterRef('pk'),
+                product_info__shop__user_id=request.user.id
+            ))
         ).exclude(
             state='basket'
         ).prefetch_related(
             'ordered_items__product_info__product__category',
             'ordered_items__product_info__product_parameters__parameter'
-        ).select_related('contact').annotate(
-            total_sum=Sum(
-                F('ordered_items__quantity')
-                * F('ordered_items__product_info__price')
-            )
-        ).distinct()
+        ).select_related('contact')
 
         serializer = OrderSerializer(order, many=True)
         return Response(serializer.data)
 
+    def changes(self, request):
+        """Возвращает заказы, созданные или измененные после курсора.
+
+        Курсор - номер последнего полученного изменения заказов
+        магазина. Изменения читаются по индексу (shop, sequence)
+        страницами по ORDER_CHANGES_PAGE_SIZE, в ответе передается
+        курсор для следующего запроса."""
+        since = request.query_params.get('since', '0')
+        if not since.isdigit():
+            return Response(
+                data={
+                    'Status': False,
+                    'Errors': 'Укажите корректное значение since'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changes = list(OrderChange.objects.filter(
+            shop_id=get_object_or_404(Shop, user_id=request.user.id).id,
+            sequence__gt=int(since)
+        ).order_by(
+            'sequence'
+        ).values_list(
+            'order_id', 'sequence'
+        )[:ORDER_CHANGES_PAGE_SIZE])
+        orders = Order.objects.filter(
+            id__in=[order_id for order_id, _ in changes]
+        ).prefetch_related(
+            'ordered_items__product_info__product__category',
+            'ordered_items__product_info__product_parameters__parameter'
+        ).select_related('contact').in_bulk()
+
+        return Response({
+            'cursor': changes[-1][1] if changes else int(since),
+            'results': OrderSerializer(
+                [orders[order_id] for order_id, _ in changes
+                 if order_id in orders],
+                many=True
+            ).data,
+        })
+
+    def __transition_orders(self, request, new_state):
+        """Переводит пачку заказов поставщика в новое состояние.
+
+        Возвращает результат по каждому заказу из запроса."""
+        serializer = OrderBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = transition_orders(
+            serializer.validated_data['orders'],
+            new_state,
+            request.user.id
+        )
+
+        orders = []
+        for order_id, error in results.items():
+            if error is None:
+                orders.append({'id': order_id, 'Status': True})
+            else:
+                orders.append({
+                    'id': order_id,
+                    'Status': False,
+                    'Errors': error
+                })
+        changed_count = sum(order['Status'] for order in orders)
+        return Response(
+            data={
+                'Status': True,
+                'Message': (f'Переведено заказов: {changed_count} '
+                            f'из {len(orders)}'),
+                'Orders': orders,
+            },
+            status=status.HTTP_200_OK
+        )
+
+    def assemble_orders(self, request):
+        return self.__transition_orders(request, 'assembled')
+
+    def send_orders(self, request):
+        return self.__transition_orders(request, 'sent')
+
+    def deliver_orders(self, request):
+        return self.__transition_orders(request, 'delivered')
+
 
 class PartnerStateViewSet(ViewSet):
     """Класс для работы со статусом поставщика."""
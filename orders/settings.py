@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # import app
     'rest_framework',
@@ -229,6 +230,83 @@ SITE_ID = 1
 
 CELERY_BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
+CELERY_TASK_ROUTES = {
+    'backend.tasks.import_price_list_async': {'queue': 'imports'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'refresh-price-lists': {
+        'task': 'backend.tasks.refresh_price_lists_async',
+        'schedule': int(
+            os.getenv('PRICE_LIST_REFRESH_INTERVAL', default=6 * 60 * 60)
+        ),
+    },
+    'release-expired-orders': {
+        'task': 'backend.tasks.release_expired_orders_async',
+        'schedule': int(
+            os.getenv('ORDER_EXPIRY_CHECK_INTERVAL', default=10 * 60)
+        ),
+    },
+    'dispatch-outbox': {
+        'task': 'backend.tasks.dispatch_outbox_async',
+        'schedule': int(os.getenv('OUTBOX_DISPATCH_INTERVAL', default=60)),
+    },
+}
+
+# Плановое обновление прайс-листов: одновременно запускается не более
+# PRICE_LIST_REFRESH_CONCURRENCY импортов, волны распределяются по окну
+# PRICE_LIST_REFRESH_WINDOW секунд, запросы к одному хосту разносятся
+# минимум на PRICE_LIST_HOST_INTERVAL секунд.
+PRICE_LIST_REFRESH_CONCURRENCY = int(
+    os.getenv('PRICE_LIST_REFRESH_CONCURRENCY', default=4)
+)
+PRICE_LIST_REFRESH_WINDOW = int(
+    os.getenv('PRICE_LIST_REFRESH_WINDOW', default=60 * 60)
+)
+PRICE_LIST_HOST_INTERVAL = int(
+    os.getenv('PRICE_LIST_HOST_INTERVAL', default=30)
+)
+PRICE_LIST_REFRESH_JITTER = int(
+    os.getenv('PRICE_LIST_REFRESH_JITTER', default=60)
+)
+
+# Импорт прерывается, если длится дольше PRICE_LIST_IMPORT_TIMEOUT секунд.
+# Задача импорта, не обновлявшаяся дольше этого времени (например, после
+# падения воркера), считается прерванной, и плановое обновление запускает
+# импорт магазина заново. Значение должно быть больше окна обновления
+# с учетом случайной задержки, иначе ожидающие запуска задачи будут
+# признаны прерванными.
+PRICE_LIST_IMPORT_TIMEOUT = int(
+    os.getenv('PRICE_LIST_IMPORT_TIMEOUT', default=2 * 60 * 60)
+)
+
+# Товары размещенного заказа резервируются, остаток поставщика
+# уменьшается только при отправке заказа. Если заказ не подтвержден
+# за ORDER_RESERVATION_TIMEOUT секунд, он отменяется и резерв снимается.
+ORDER_RESERVATION_TIMEOUT = int(
+    os.getenv('ORDER_RESERVATION_TIMEOUT', default=24 * 60 * 60)
+)
+
+# Очередь исходящих писем разбирается пачками по OUTBOX_BATCH_SIZE писем
+# через одно SMTP-соединение. Неотправленное письмо повторяется через
+# OUTBOX_RETRY_DELAY секунд с удвоением паузы, после OUTBOX_MAX_ATTEMPTS
+# попыток оно помечается как недоставленное. Разбор очереди начинается
+# через OUTBOX_COALESCE_WINDOW секунд после записи письма, письма одному
+# получателю за это время объединяются в одно сообщение.
+OUTBOX_COALESCE_WINDOW = int(os.getenv('OUTBOX_COALESCE_WINDOW', default=2))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', default=100))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', default=5))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', default=60))
+
+# Хранилище корзин. RedisBasketStorage держит активные корзины в Redis
+# BASKET_REDIS в течение BASKET_REDIS_TIMEOUT секунд с последнего
+# изменения и записывает их в таблицы заказов только при оформлении.
+BASKET_STORAGE = os.getenv(
+    'BASKET_STORAGE', default='backend.baskets.DatabaseBasketStorage'
+)
+BASKET_REDIS = os.getenv('BASKET_REDIS', default='redis://localhost:6379/3')
+BASKET_REDIS_TIMEOUT = int(
+    os.getenv('BASKET_REDIS_TIMEOUT', default=30 * 24 * 60 * 60)
+)
 
 THUMBNAIL_ALIASES = {
     '': {
@@ -244,4 +322,18 @@ CACHEOPS = {
     'auth.*': {'ops': {'fetch', 'get'}, 'timeout': 60 * 60},
     'auth.permission': {'ops': 'all', 'timeout': 60 * 60},
     '*.*': {'ops': (), 'timeout': 60 * 60},
+}
+
+# Кеш готовых ответов каталога товаров, сбрасывается по тегам магазинов
+# и категорий при изменении каталога.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv(
+            'CATALOG_CACHE_REDIS', default='redis://localhost:6379/2'
+        ),
+    },
 }
\ No newline at end of file
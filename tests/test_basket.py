@@ -0,0 +1,558 @@
+import json
+from unittest import mock, skipUnless
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate
+)
+
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OrderStateEvent,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    User
+)
+from backend.baskets import RedisBasketStorage
+from backend.catalog import refresh_catalog_items
+from backend.serializers import OrderSerializer
+from backend.views import BasketViewSet, OrderViewSet
+
+
+def is_redis_available():
+    try:
+        return redis.Redis.from_url(settings.BASKET_REDIS).ping()
+    except redis.RedisError:
+        return False
+
+
+class BasketViewSetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='test_user',
+            email='test@example.com',
+            password='test_password'
+        )
+        self.contact = Contact.objects.create(
+            user=self.user,
+            city='Москва',
+            street='Тверская',
+            house='1',
+            phone='+79134567890'
+        )
+        shop = Shop.objects.create(name='Shop 1')
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        color = Parameter.objects.create(name='Цвет')
+        self.product_infos = []
+        for external_id in range(1, 4):
+            product_info = ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=external_id,
+                model=f'model/{external_id}',
+                quantity=10,
+                price=100 * external_id,
+                price_rrc=120 * external_id
+            )
+            ProductParameter.objects.create(
+                product_info=product_info,
+                parameter=color,
+                value='черный'
+            )
+            self.product_infos.append(product_info)
+
+        response = self._request('post', 'create', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'product_info': product_info.id, 'quantity': quantity}
+                for quantity, product_info in enumerate(
+                    self.product_infos, start=1
+                )
+            ]),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.basket = Order.objects.get(user=self.user, state='basket')
+
+    def tearDown(self):
+        cache.clear()
+
+    def _request(self, method, action, data=None):
+        request = getattr(self.factory, method)('/api/v1/basket/', data)
+        force_authenticate(request, user=self.user)
+        return BasketViewSet.as_view({method: action})(request)
+
+    def test_list_basket(self):
+        request = self.factory.get('/api/v1/basket/')
+        force_authenticate(request, user=self.user)
+        view = BasketViewSet.as_view({'get': 'list'})
+        with self.assertNumQueries(2):
+            response = view(request)
+            response.render()
+
+        self.assertEqual(response.status_code, 200)
+        expected = OrderSerializer(
+            Order.objects.filter(id=self.basket.id),
+            many=True
+        ).data
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(JSONRenderer().render(expected))
+        )
+        self.assertEqual(response.data[0]['total_sum'], 1400)
+        self.assertEqual(response.data[0]['items_count'], 3)
+
+    def test_deactivated_item_is_listed(self):
+        ProductInfo.objects.filter(id=self.product_infos[1].id).update(
+            is_active=False,
+            quantity=0
+        )
+        refresh_catalog_items([self.product_infos[1].id])
+
+        response = self._request('get', 'list')
+        response.render()
+        expected = OrderSerializer(
+            Order.objects.filter(id=self.basket.id),
+            many=True
+        ).data
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(JSONRenderer().render(expected))
+        )
+        self.assertEqual(
+            [
+                item['product_info']['is_active']
+                for item in response.data[0]['ordered_items']
+            ],
+            [True, False, True]
+        )
+
+    def test_update_and_remove_items(self):
+        items = list(self.basket.ordered_items.order_by('id'))
+        response = self._request('put', 'update', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([{'id': items[0].id, 'quantity': 5}]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 1800)
+
+        response = self._request('delete', 'destroy', {
+            'items': f'{items[1].id},{items[2].id}',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 500)
+        self.assertEqual(self.basket.items_count, 1)
+
+    def test_price_is_captured(self):
+        ProductInfo.objects.filter(
+            id=self.product_infos[0].id
+        ).update(price=999)
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 1400)
+        self.assertEqual(
+            self.basket.ordered_items.get(
+                product_info=self.product_infos[0]
+            ).price,
+            100
+        )
+
+    def _add_items(self, product_infos, quantity=1):
+        return self._request('post', 'create', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'product_info': product_info.id, 'quantity': quantity}
+                for product_info in product_infos
+            ]),
+        })
+
+    def test_query_count_does_not_depend_on_items(self):
+        product = self.product_infos[0].product
+        shop = self.product_infos[0].shop
+        product_infos = ProductInfo.objects.bulk_create([
+            ProductInfo(
+                product=product,
+                shop=shop,
+                external_id=external_id,
+                quantity=10,
+                price=10,
+                price_rrc=10
+            )
+            for external_id in range(10, 62)
+        ])
+
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(
+                self._add_items(product_infos[:2]).status_code,
+                201
+            )
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(
+                self._add_items(product_infos[2:]).status_code,
+                201
+            )
+        self.assertEqual(len(few), len(many))
+
+        order_items = OrderItem.objects.filter(
+            order=self.basket,
+            product_info__in=product_infos
+        ).order_by('id')
+        counts = []
+        for items in (order_items[:2], order_items[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self._request('put', 'update', {
+                    'contact_id': self.contact.id,
+                    'items': json.dumps([
+                        {'id': order_item.id, 'quantity': 3}
+                        for order_item in items
+                    ]),
+                })
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 1400 + 52 * 30)
+        self.assertEqual(self.basket.items_count, 55)
+
+    def test_invalid_items_are_not_added(self):
+        product_info = ProductInfo.objects.create(
+            product=self.product_infos[0].product,
+            shop=self.product_infos[0].shop,
+            external_id=10,
+            quantity=10,
+            price=10,
+            price_rrc=10
+        )
+        for items in (
+                [product_info, self.product_infos[0]],
+                [product_info, product_info],
+        ):
+            response = self._add_items(items)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.data['Errors'],
+                'Позиция уже существует в корзине'
+            )
+
+        response = self._add_items([product_info], quantity=0)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data['Errors'][0])
+
+        self.assertFalse(
+            OrderItem.objects.filter(product_info=product_info).exists()
+        )
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 1400)
+        self.assertEqual(self.basket.items_count, 3)
+
+    def test_update_of_unknown_item_changes_nothing(self):
+        order_item = self.basket.ordered_items.order_by('id').first()
+        response = self._request('put', 'update', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'id': order_item.id, 'quantity': 5},
+                {'id': order_item.id + 100, 'quantity': 5},
+            ]),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['Errors'],
+            f'Позиция корзины с id {order_item.id + 100} не найдена'
+        )
+        order_item.refresh_from_db()
+        self.assertEqual(order_item.quantity, 1)
+        self.basket.refresh_from_db()
+        self.assertEqual(self.basket.total_sum, 1400)
+
+
+@skipUnless(is_redis_available(), 'Redis недоступен')
+@override_settings(BASKET_STORAGE='backend.baskets.RedisBasketStorage')
+class RedisBasketTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='test_user',
+            email='test@example.com',
+            password='test_password'
+        )
+        self.contact = Contact.objects.create(
+            user=self.user,
+            city='Москва',
+            street='Тверская',
+            house='1',
+            phone='+79134567890'
+        )
+        shop = Shop.objects.create(name='Shop 1')
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        self.product_infos = [
+            ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=external_id,
+                model=f'model/{external_id}',
+                quantity=10,
+                price=100 * external_id,
+                price_rrc=120 * external_id
+            )
+            for external_id in range(1, 4)
+        ]
+        self.storage = RedisBasketStorage()
+        self.addCleanup(
+            self.storage.client.delete,
+            *self.storage._get_keys(self.user.id)
+        )
+
+        response = self._request('post', 'create', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'product_info': product_info.id, 'quantity': quantity}
+                for quantity, product_info in enumerate(
+                    self.product_infos, start=1
+                )
+            ]),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.basket_id = self._get_basket()[0]['id']
+        self.addCleanup(
+            self.storage.client.delete,
+            *self.storage._get_checkout_keys(self.user.id, self.basket_id)
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def _request(self, method, action, data=None):
+        request = getattr(self.factory, method)('/api/v1/basket/', data)
+        force_authenticate(request, user=self.user)
+        return BasketViewSet.as_view({method: action})(request)
+
+    def _place_order(self):
+        request = self.factory.post('/api/v1/order/', {
+            'id': self.basket_id,
+            'contact': self.contact.id,
+        })
+        force_authenticate(request, user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return OrderViewSet.as_view({'post': 'create'})(request)
+
+    def _get_basket(self):
+        response = self._request('get', 'list')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_basket_is_not_stored_in_database(self):
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+        basket = self._get_basket()
+        self.assertEqual(len(basket), 1)
+        self.assertEqual(basket[0]['state'], 'basket')
+        self.assertEqual(basket[0]['total_sum'], 1400)
+        self.assertEqual(basket[0]['items_count'], 3)
+        self.assertEqual(basket[0]['contact']['id'], self.contact.id)
+        self.assertEqual(
+            [
+                (item['id'], item['product_info']['model'], item['quantity'])
+                for item in basket[0]['ordered_items']
+            ],
+            [
+                (product_info.id, product_info.model, quantity)
+                for quantity, product_info in enumerate(
+                    self.product_infos, start=1
+                )
+            ]
+        )
+
+    def test_update_and_remove_items(self):
+        response = self._request('put', 'update', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'id': self.product_infos[0].id, 'quantity': 5}
+            ]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_basket()[0]['total_sum'], 1800)
+
+        response = self._request('delete', 'destroy', {
+            'items': f'{self.product_infos[1].id},{self.product_infos[2].id}',
+        })
+        self.assertEqual(response.status_code, 204)
+        basket = self._get_basket()
+        self.assertEqual(basket[0]['total_sum'], 500)
+        self.assertEqual(basket[0]['items_count'], 1)
+
+        response = self._request('delete', 'destroy', {
+            'items': str(self.product_infos[0].id),
+        })
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self._get_basket(), [])
+
+    def test_invalid_items_are_not_added(self):
+        response = self._request('post', 'create', {
+            'contact_id': self.contact.id,
+            'items': json.dumps([
+                {'product_info': self.product_infos[0].id, 'quantity': 1}
+            ]),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['Errors'],
+            'Позиция уже существует в корзине'
+        )
+        self.assertEqual(self._get_basket()[0]['total_sum'], 1400)
+
+    def test_basket_is_flushed_on_order_placement(self):
+        response = self._place_order()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.state, 'new')
+        self.assertEqual(order.total_sum, 1400)
+        self.assertEqual(
+            list(order.ordered_items.order_by(
+                'product_info_id'
+            ).values_list('product_info_id', 'quantity', 'price')),
+            [
+                (product_info.id, quantity, product_info.price)
+                for quantity, product_info in enumerate(
+                    self.product_infos, start=1
+                )
+            ]
+        )
+        self.assertEqual(
+            list(ProductInfo.objects.order_by('id').values_list(
+                'reserved', flat=True
+            )),
+            [1, 2, 3]
+        )
+        self.assertEqual(
+            list(OrderStateEvent.objects.values_list(
+                'order_id', 'from_state', 'to_state'
+            )),
+            [(order.id, 'basket', 'new')]
+        )
+        self.assertEqual(self._get_basket(), [])
+        self.assertFalse(self.storage.client.exists(
+            *self.storage._get_checkout_keys(self.user.id, self.basket_id)
+        ))
+
+    def test_basket_is_placed_once(self):
+        self.assertEqual(self._place_order().status_code, 201)
+        self.assertEqual(self._place_order().status_code, 400)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_claimed_basket_is_not_placed_again(self):
+        self.assertTrue(self.storage._claim(self.user.id, self.basket_id))
+
+        storage = RedisBasketStorage()
+        self.assertIsNone(
+            storage.place_order(self.user.id, self.basket_id, self.contact.id)
+        )
+        storage.restore_basket(self.user.id, self.basket_id)
+        self.assertEqual(self._get_basket(), [])
+
+        self.storage.restore_basket(self.user.id, self.basket_id)
+        self.assertEqual(self._get_basket()[0]['id'], self.basket_id)
+
+    def test_deactivated_item_is_listed(self):
+        ProductInfo.objects.filter(id=self.product_infos[1].id).update(
+            is_active=False,
+            quantity=0
+        )
+        refresh_catalog_items([self.product_infos[1].id])
+
+        items = self._get_basket()[0]['ordered_items']
+        self.assertEqual(
+            [(item['id'], item['product_info']['is_active']) for item in items],
+            [
+                (product_info.id, product_info.id != self.product_infos[1].id)
+                for product_info in self.product_infos
+            ]
+        )
+        self.assertEqual(items[1]['product_info']['model'], 'model/2')
+
+    def test_deactivated_item_rejects_order(self):
+        ProductInfo.objects.filter(id=self.product_infos[1].id).update(
+            is_active=False
+        )
+        response = self._place_order()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content)['Errors'],
+            f'Недостаточно товара на складе: {self.product_infos[1].id}'
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self._get_basket()[0]['id'], self.basket_id)
+
+    def test_concurrent_add_is_rejected(self):
+        product_info = ProductInfo.objects.create(
+            product=self.product_infos[0].product,
+            shop=self.product_infos[0].shop,
+            external_id=4,
+            model='model/4',
+            quantity=10,
+            price=400,
+            price_rrc=480
+        )
+        items = [{'product_info': product_info.id, 'quantity': 1}]
+        hmget = redis.client.Pipeline.hmget
+        checks = []
+
+        def add_concurrently(pipeline, *args):
+            # Параллельный запрос добавляет ту же позицию после проверки.
+            values = hmget(pipeline, *args)
+            checks.append(values)
+            if len(checks) == 1:
+                self.assertEqual(
+                    RedisBasketStorage().add_items(
+                        self.user.id, self.contact.id, items
+                    ),
+                    1
+                )
+            return values
+
+        with mock.patch.object(
+                redis.client.Pipeline, 'hmget', add_concurrently
+        ):
+            result = self.storage.add_items(
+                self.user.id, self.contact.id, items
+            )
+
+        self.assertEqual(result['Errors'], 'Позиция уже существует в корзине')
+        self.assertEqual(self._get_basket()[0]['items_count'], 4)
+
+    def test_basket_is_restored_on_rollback(self):
+        ProductInfo.objects.filter(id=self.product_infos[2].id).update(
+            quantity=1
+        )
+        self.assertEqual(self._place_order().status_code, 400)
+
+        self.assertFalse(Order.objects.exists())
+        basket = self._get_basket()
+        self.assertEqual(basket[0]['id'], self.basket_id)
+        self.assertEqual(basket[0]['total_sum'], 1400)
+        self.assertEqual(basket[0]['items_count'], 3)
\ No newline at end of file
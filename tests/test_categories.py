@@ -1,3 +1,4 @@
+from django.core.cache import cache, caches
 from django.test import TestCase
 from rest_framework.test import APIRequestFactory
 
@@ -35,4 +36,30 @@ class CategoryViewSetTestCase(TestCase):
         response = view(request, pk=self.category1.id)
         self.assertEqual(response.status_code, 200)
         serializer = CategorySerializer(self.category1)
-        self.assertEqual(response.data, serializer.data)
\ No newline at end of file
+        self.assertEqual(response.data, serializer.data)
+
+    def test_conditional_get(self):
+        cache.clear()
+        caches['catalog'].clear()
+        view = CategoryViewSet.as_view({'get': 'list'})
+        response = view(self.factory.get('/api/categories/'))
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = view(self.factory.get(
+                '/api/categories/',
+                HTTP_IF_NONE_MATCH=etag
+            ))
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category1.name = 'Category 3'
+            self.category1.save()
+        response = view(self.factory.get(
+            '/api/categories/',
+            HTTP_IF_NONE_MATCH=etag
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        cache.clear()
\ No newline at end of file
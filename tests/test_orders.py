@@ -0,0 +1,522 @@
+import json
+from unittest import mock, skipUnless
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate
+)
+
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OrderStateEvent,
+    OutboxEmail,
+    Product,
+    ProductInfo,
+    Shop,
+    User
+)
+from backend.outbox import OutboxDispatcher
+from backend.tasks import dispatch_outbox_async
+from backend.transitions import change_state
+from backend.views import OrderViewSet, PartnerOrdersViewSet
+
+
+class OrderListTestCase(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='test_user',
+            email='test@example.com',
+            password='test_password'
+        )
+        self.partner = User.objects.create_user(
+            username='test_shop',
+            email='shop@example.com',
+            password='test_password',
+            type='shop'
+        )
+        self.contact = Contact.objects.create(
+            user=self.user,
+            city='Москва',
+            street='Тверская',
+            house='1',
+            phone='+79134567890'
+        )
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        self.product_infos = [
+            ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=1,
+                quantity=10,
+                price=price,
+                price_rrc=price
+            )
+            for shop, price in (
+                (Shop.objects.create(name='Shop 1', user=self.partner), 100),
+                (Shop.objects.create(name='Shop 2'), 1000),
+            )
+        ]
+
+    def _create_order(self):
+        order = Order.objects.create(
+            user=self.user,
+            state='new',
+            contact=self.contact
+        )
+        for product_info, quantity in zip(self.product_infos, (2, 3)):
+            OrderItem.objects.create(
+                order=order,
+                product_info=product_info,
+                quantity=quantity,
+                price=product_info.price
+            )
+            order.change_totals(product_info.price * quantity, 1)
+        return order
+
+    def _list(self, viewset, user):
+        request = self.factory.get('/api/v1/order/')
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = viewset.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_order_totals(self):
+        self._create_order()
+        Order.objects.create(
+            user=self.user,
+            state='basket',
+            contact=self.contact
+        )
+        for viewset, user in ((OrderViewSet, self.user),
+                              (PartnerOrdersViewSet, self.partner)):
+            response, _ = self._list(viewset, user)
+            self.assertEqual(
+                [order['total_sum'] for order in response.data],
+                [3200]
+            )
+            self.assertEqual(response.data[0]['items_count'], 2)
+
+    def test_orders_are_fetched_by_one_query(self):
+        self._create_order()
+        for viewset, user in ((OrderViewSet, self.user),
+                              (PartnerOrdersViewSet, self.partner)):
+            _, few = self._list(viewset, user)
+            for _ in range(5):
+                self._create_order()
+            response, many = self._list(viewset, user)
+            self.assertEqual(len(few), len(many))
+
+            order_queries = [
+                query['sql'] for query in many
+                if 'FROM "backend_order"' in query['sql']
+            ]
+            self.assertEqual(len(order_queries), 1)
+            self.assertNotIn('DISTINCT', order_queries[0])
+            self.assertNotIn('GROUP BY "backend_order"', order_queries[0])
+
+    @skipUnless(
+        connection.vendor == 'postgresql',
+        'План запроса проверяется только в PostgreSQL'
+    )
+    def test_order_list_plan(self):
+        self._create_order()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Order.objects.filter(
+            user_id=self.user.id
+        ).exclude(state='basket').explain()
+        self.assertIn('order_user_created_idx', plan)
+        self.assertNotIn('Unique', plan)
+
+
+class OrderStateTestCase(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='test_user',
+            email='test@example.com',
+            password='test_password'
+        )
+        self.contact = Contact.objects.create(
+            user=self.user,
+            city='Москва',
+            street='Тверская',
+            house='1',
+            phone='+79134567890'
+        )
+        self.order = Order.objects.create(
+            user=self.user,
+            state='confirmed',
+            contact=self.contact
+        )
+
+    def _post(self, action, data):
+        request = self.factory.post(f'/api/v1/order/{action}/', data)
+        force_authenticate(request, user=self.user)
+        return OrderViewSet.as_view({'post': action})(request)
+
+    def test_state_is_changed_in_request(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._post(
+                'assemble_order',
+                {'order_id': self.order.id}
+            )
+            self.assertEqual(len(mail.outbox), 0)
+            email = OutboxEmail.objects.get()
+            self.assertEqual(email.to, [self.user.email])
+            self.assertEqual(email.state, 'pending')
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.state, 'assembled')
+        self.assertEqual(
+            list(OrderStateEvent.objects.values_list(
+                'order_id', 'from_state', 'to_state'
+            )),
+            [(self.order.id, 'confirmed', 'assembled')]
+        )
+        with mock.patch.object(
+                dispatch_outbox_async, 'apply_async'
+        ) as apply_async:
+            for callback in callbacks:
+                callback()
+        apply_async.assert_called_once_with(countdown=2)
+        OutboxDispatcher().run()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Собран', mail.outbox[0].body)
+
+    def test_wrong_state_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post(
+                'send_order',
+                {'order_id': self.order.id}
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'confirmed', response.content)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.state, 'confirmed')
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertFalse(OrderStateEvent.objects.exists())
+
+    def test_transition_is_a_single_guarded_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            change_state(Order.objects.filter(id=self.order.id), 'assembled')
+
+        order_queries = [
+            query['sql'] for query in queries.captured_queries
+            if '"backend_order"' in query['sql']
+        ]
+        self.assertEqual(len(order_queries), 1)
+        self.assertTrue(order_queries[0].startswith('UPDATE'))
+        self.assertIn('RETURNING', order_queries[0])
+
+    def test_transitions_follow_state_machine(self):
+        started = timezone.now()
+        orders = Order.objects.filter(id=self.order.id)
+        for new_state, changed in (
+                ('canceled', False),
+                ('assembled', True),
+                ('assembled', False),
+                ('sent', True),
+                ('delivered', True),
+                ('canceled', False),
+        ):
+            self.assertEqual(
+                change_state(orders, new_state),
+                {self.order.id: self.user.id} if changed else {}
+            )
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.state, 'delivered')
+        self.assertEqual(
+            list(OrderStateEvent.objects.filter(
+                created_at__gte=started
+            ).values_list('from_state', 'to_state')),
+            [('confirmed', 'assembled'), ('assembled', 'sent'),
+             ('sent', 'delivered')]
+        )
+
+    def test_unknown_order(self):
+        response = self._post(
+            'assemble_order',
+            {'order_id': self.order.id + 1}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content)['Errors'],
+            'Заказ не найден'
+        )
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_new_order_emails_are_coalesced(self):
+        Order.objects.filter(id=self.order.id).update(state='basket')
+        with mock.patch.object(
+                dispatch_outbox_async, 'apply_async'
+        ) as apply_async, self.captureOnCommitCallbacks(execute=True):
+            response = self._post(
+                'create',
+                {'id': self.order.id, 'contact': self.contact.id}
+            )
+
+        self.assertEqual(response.status_code, 201)
+        apply_async.assert_called_once_with(countdown=2)
+        OutboxDispatcher().run()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            mail.outbox[0].subject,
+            'Подтверждение заказа, Оформление заказа'
+        )
+        self.assertFalse(
+            OutboxEmail.objects.exclude(state='sent').exists()
+        )
+
+
+class PartnerOrdersMixin:
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.partner = User.objects.create_user(
+            username='test_shop',
+            email='shop@example.com',
+            password='test_password',
+            type='shop'
+        )
+        self.buyers = [
+            User.objects.create_user(
+                username=f'buyer_{number}',
+                email=f'buyer_{number}@example.com',
+                password='test_password'
+            )
+            for number in range(2)
+        ]
+        self.contacts = {
+            buyer.id: Contact.objects.create(
+                user=buyer,
+                city='Москва',
+                street='Тверская',
+                house='1',
+                phone=f'+7913456789{number}'
+            )
+            for number, buyer in enumerate(self.buyers)
+        }
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        self.product_infos = [
+            ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=1,
+                quantity=10,
+                price=100,
+                price_rrc=100
+            )
+            for shop in (
+                Shop.objects.create(name='Shop 1', user=self.partner),
+                Shop.objects.create(name='Shop 2'),
+            )
+        ]
+
+    def tearDown(self):
+        cache.clear()
+
+    def _create_orders(self, count, buyer, state='confirmed',
+                       product_info=None):
+        orders = Order.objects.bulk_create([
+            Order(
+                user=buyer,
+                state=state,
+                contact=self.contacts[buyer.id]
+            )
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_info=product_info or self.product_infos[0],
+                quantity=1,
+                price=100
+            )
+            for order in orders
+        ])
+        return [order.id for order in orders]
+
+    def _post(self, action, order_ids):
+        request = self.factory.post(
+            f'/api/v1/partner/orders/{action}/',
+            {'orders': order_ids},
+            format='json'
+        )
+        force_authenticate(request, user=self.partner)
+        return PartnerOrdersViewSet.as_view({'post': action})(request)
+
+
+class PartnerOrderBatchTestCase(PartnerOrdersMixin, TestCase):
+    def test_orders_are_assembled_in_batch(self):
+        first = self._create_orders(2, self.buyers[0])
+        second = self._create_orders(1, self.buyers[1])
+        new = self._create_orders(1, self.buyers[0], state='new')
+        other_shop = self._create_orders(
+            1, self.buyers[0], product_info=self.product_infos[1]
+        )
+        order_ids = first + second + new + other_shop
+
+        with mock.patch.object(
+                dispatch_outbox_async, 'apply_async'
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self._post('assemble_orders', order_ids)
+        OutboxDispatcher().run()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['Message'], 'Переведено заказов: 3 из 5')
+        self.assertEqual(
+            response.data['Orders'],
+            [{'id': order_id, 'Status': True}
+             for order_id in first + second]
+            + [
+                {
+                    'id': new[0],
+                    'Status': False,
+                    'Errors': ('Невозможно выполнить операцию, '
+                               'заказ находится в состоянии new')
+                },
+                {
+                    'id': other_shop[0],
+                    'Status': False,
+                    'Errors': 'Заказ не найден'
+                },
+            ]
+        )
+        self.assertEqual(
+            dict(Order.objects.filter(
+                id__in=order_ids
+            ).values_list('id', 'state')),
+            {
+                **dict.fromkeys(first + second, 'assembled'),
+                new[0]: 'new',
+                other_shop[0]: 'confirmed',
+            }
+        )
+        self.assertEqual(
+            sorted(OrderStateEvent.objects.values_list(
+                'order_id', 'to_state'
+            )),
+            [(order_id, 'assembled') for order_id in first + second]
+        )
+        self.assertEqual(
+            sorted((message.to, message.body) for message in mail.outbox),
+            [
+                (
+                    [self.buyers[0].email],
+                    f'Статус заказов №{first[0]}, №{first[1]} '
+                    'обновлен на "Собран"!'
+                ),
+                (
+                    [self.buyers[1].email],
+                    f'Статус заказов №{second[0]} обновлен на "Собран"!'
+                ),
+            ]
+        )
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        counts = []
+        for count in (2, 50):
+            order_ids = self._create_orders(count, self.buyers[0])
+            with CaptureQueriesContext(connection) as queries:
+                response = self._post('assemble_orders', order_ids)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batch_is_rejected(self):
+        for order_ids in ([], ['abc']):
+            response = self._post('send_orders', order_ids)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+class PartnerOrderChangesTestCase(PartnerOrdersMixin, TestCase):
+    def _place_orders(self, count, buyer, product_info=None):
+        order_ids = self._create_orders(
+            count, buyer, state='basket', product_info=product_info
+        )
+        change_state(Order.objects.filter(id__in=order_ids), 'new')
+        return order_ids
+
+    def _get_changes(self, since=None):
+        request = self.factory.get(
+            '/api/v1/partner/orders/changes',
+            {} if since is None else {'since': since}
+        )
+        force_authenticate(request, user=self.partner)
+        return PartnerOrdersViewSet.as_view({'get': 'changes'})(request)
+
+    def test_only_changed_orders_are_returned(self):
+        order_ids = self._place_orders(3, self.buyers[0])
+        self._place_orders(2, self.buyers[1], self.product_infos[1])
+
+        response = self._get_changes()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cursor'], 3)
+        self.assertEqual(
+            [order['id'] for order in response.data['results']],
+            order_ids
+        )
+
+        response = self._get_changes(since=3)
+        self.assertEqual(response.data, {'cursor': 3, 'results': []})
+
+        Order.objects.filter(id__in=order_ids).update(state='confirmed')
+        self._post('assemble_orders', [order_ids[1]])
+        response = self._get_changes(since=3)
+        self.assertEqual(response.data['cursor'], 4)
+        self.assertEqual(
+            [(order['id'], order['state'])
+             for order in response.data['results']],
+            [(order_ids[1], 'assembled')]
+        )
+
+    def test_changes_are_paginated_by_cursor(self):
+        order_ids = self._place_orders(5, self.buyers[0])
+        received = []
+        cursor = 0
+        with mock.patch('backend.views.ORDER_CHANGES_PAGE_SIZE', 2):
+            for _ in range(3):
+                response = self._get_changes(since=cursor)
+                cursor = response.data['cursor']
+                received.extend(
+                    order['id'] for order in response.data['results']
+                )
+        self.assertEqual(received, order_ids)
+        self.assertEqual(cursor, 5)
+
+    def test_query_count_does_not_depend_on_history(self):
+        self._place_orders(2, self.buyers[0])
+        with CaptureQueriesContext(connection) as few:
+            self._get_changes(since=0)
+        self._place_orders(50, self.buyers[0])
+        with CaptureQueriesContext(connection) as many:
+            response = self._get_changes(since=50)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(few), len(many))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self._get_changes(since='abc')
+        self.assertEqual(response.status_code, 400)
\ No newline at end of file
@@ -0,0 +1,232 @@
+import email
+import socketserver
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from backend.models import OutboxEmail
+from backend.outbox import enqueue_email, OutboxDispatcher
+from backend.tasks import dispatch_outbox_async
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает и сохраняет сообщения."""
+
+    def handle(self):
+        self.server.connections += 1
+        self._reply('220 localhost')
+        data = None
+        for line in self.rfile:
+            line = line.rstrip(b'\r\n')
+            if data is not None:
+                if line == b'.':
+                    self.server.messages.append(
+                        email.message_from_bytes(b'\r\n'.join(data))
+                    )
+                    data = None
+                    self._reply('250 OK')
+                else:
+                    data.append(line[1:] if line.startswith(b'.') else line)
+                continue
+            command = line[:4].upper()
+            if command == b'DATA':
+                data = []
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self._reply('221 Bye')
+                break
+            else:
+                self._reply('250 OK')
+
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+
+class FailingConnection:
+    def __init__(self, fail_on_open=False):
+        self.fail_on_open = fail_on_open
+
+    def open(self):
+        if self.fail_on_open:
+            raise ConnectionError('SMTP недоступен')
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('Письмо отклонено')
+
+
+def enqueue(count, to=None):
+    for number in range(count):
+        enqueue_email(
+            subject=f'Письмо {number}',
+            body=f'Текст {number}',
+            to=[to or f'user{number}@example.com']
+        )
+
+
+@override_settings(
+    OUTBOX_BATCH_SIZE=10,
+    OUTBOX_MAX_ATTEMPTS=3,
+    OUTBOX_RETRY_DELAY=60
+)
+class OutboxTestCase(TestCase):
+    def test_email_is_dispatched_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue(3)
+        self.assertEqual(len(mail.outbox), 0)
+
+        with mock.patch.object(
+                dispatch_outbox_async, 'apply_async'
+        ) as apply_async:
+            for callback in callbacks:
+                callback()
+        apply_async.assert_called_once_with(countdown=2)
+
+    def test_rolled_back_email_is_not_stored(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    enqueue(1)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_queue_is_drained_in_batches(self):
+        enqueue(15)
+        result, _ = dispatch_outbox_async()
+
+        self.assertTrue(result)
+        self.assertEqual(len(mail.outbox), 15)
+        self.assertEqual(
+            OutboxEmail.objects.filter(state='sent').count(),
+            15
+        )
+
+    def test_emails_to_one_recipient_are_coalesced(self):
+        enqueue(2, to='user@example.com')
+        enqueue(1)
+        metrics = OutboxDispatcher().run()
+
+        self.assertEqual(metrics['sent'], 3)
+        self.assertEqual(metrics['messages'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Письмо 0, Письмо 1')
+        self.assertEqual(mail.outbox[0].body, 'Текст 0\n\nТекст 1')
+
+    def test_failed_email_is_retried_with_backoff(self):
+        enqueue(1)
+        dispatcher = OutboxDispatcher(connection=FailingConnection())
+        started = timezone.now()
+        self.assertEqual(
+            dispatcher.dispatch(),
+            {'sent': 0, 'retried': 1, 'dead': 0}
+        )
+        self.assertEqual(
+            dispatcher.dispatch(),
+            {'sent': 0, 'retried': 0, 'dead': 0}
+        )
+
+        outbox_email = OutboxEmail.objects.get()
+        self.assertEqual(outbox_email.state, 'pending')
+        self.assertEqual(outbox_email.attempts, 1)
+        self.assertEqual(outbox_email.last_error, 'Письмо отклонено')
+        self.assertGreaterEqual(
+            outbox_email.next_attempt_at,
+            started + timedelta(seconds=60)
+        )
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        dispatcher.dispatch()
+        outbox_email.refresh_from_db()
+        self.assertGreaterEqual(
+            outbox_email.next_attempt_at,
+            timezone.now() + timedelta(seconds=110)
+        )
+
+    def test_email_is_dead_lettered(self):
+        enqueue(2)
+        OutboxEmail.objects.update(attempts=2)
+        dispatcher = OutboxDispatcher(
+            connection=FailingConnection(fail_on_open=True)
+        )
+        self.assertEqual(
+            dispatcher.dispatch(),
+            {'sent': 0, 'retried': 0, 'dead': 2}
+        )
+
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list('state', 'last_error')),
+            {('dead', 'SMTP недоступен')}
+        )
+        self.assertEqual(
+            dispatcher.dispatch(),
+            {'sent': 0, 'retried': 0, 'dead': 0}
+        )
+
+
+class OutboxSMTPTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.enterClassContext(override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=cls.server.server_address[1],
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_SSL=False,
+            EMAIL_USE_TLS=False,
+            OUTBOX_BATCH_SIZE=2
+        ))
+
+    def setUp(self):
+        self.server.connections = 0
+        self.server.messages = []
+
+    def test_connection_is_reused_across_batches(self):
+        enqueue(5)
+        metrics = OutboxDispatcher().run()
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(
+            sorted(message['To'] for message in self.server.messages),
+            [f'user{number}@example.com' for number in range(5)]
+        )
+        self.assertEqual(metrics['messages'], 5)
+        self.assertEqual(metrics['connections'], 1)
+        self.assertEqual(metrics['connection_reuse_ratio'], 0.8)
+        self.assertGreater(metrics['messages_per_second'], 0)
+
+    def test_coalesced_message_is_delivered(self):
+        enqueue(2, to='user@example.com')
+        metrics = OutboxDispatcher().run()
+
+        self.assertEqual(metrics['sent'], 2)
+        self.assertEqual(len(self.server.messages), 1)
+        body = self.server.messages[0].get_payload(decode=True).decode()
+        self.assertIn('Текст 0', body)
+        self.assertIn('Текст 1', body)
\ No newline at end of file
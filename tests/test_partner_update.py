@@ -0,0 +1,532 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+import yaml
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate
+)
+
+from backend.importers import (
+    count_price_list_goods,
+    get_refresh_countdowns,
+    PartialImportError,
+    PriceListImporter,
+    read_price_list
+)
+from backend.models import (
+    CatalogItem,
+    Category,
+    Contact,
+    ImportJob,
+    Order,
+    OrderItem,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    User
+)
+from backend.tasks import (
+    import_price_list_async,
+    refresh_price_lists_async
+)
+from backend.views import PartnerUpdateViewSet
+
+
+def make_price_list(goods_count):
+    return {
+        'shop': 'Test Shop',
+        'categories': [
+            {'id': 1, 'name': 'Смартфоны'},
+            {'id': 2, 'name': 'Аксессуары'},
+        ],
+        'goods': [
+            {
+                'id': external_id,
+                'category': external_id % 2 + 1,
+                'model': f'model/{external_id}',
+                'name': f'Product {external_id}',
+                'price': 100 + external_id,
+                'price_rrc': 150 + external_id,
+                'quantity': 5,
+                'parameters': {
+                    'Цвет': 'черный',
+                    'Диагональ (дюйм)': 6.1,
+                },
+            }
+            for external_id in range(1, goods_count + 1)
+        ],
+    }
+
+
+def make_response(price_list, status_code=200, headers=None):
+    content = yaml.dump(price_list, allow_unicode=True).encode()
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = [content]
+    return response
+
+
+class ReadPriceListTestCase(TestCase):
+    def test_read_price_list_in_batches(self):
+        with open('data/shop1.yaml', mode='rb') as file:
+            expected = yaml.safe_load(file)
+            file.seek(0)
+            sections = list(read_price_list(file, batch_size=4))
+
+        goods = [
+            item for key, value in sections if key == 'goods'
+            for item in value
+        ]
+        self.assertEqual(goods, expected['goods'])
+        self.assertTrue(
+            all(len(value) <= 4 for key, value in sections
+                if key == 'goods')
+        )
+        self.assertIn(('shop', expected['shop']), sections)
+        self.assertIn(('categories', expected['categories']), sections)
+
+    def test_count_price_list_goods(self):
+        with open('data/shop1.yaml', mode='rb') as file:
+            expected = yaml.safe_load(file)
+            file.seek(0)
+            self.assertEqual(
+                count_price_list_goods(file),
+                len(expected['goods'])
+            )
+
+        stream = io.BytesIO(
+            'goods:\n'
+            '  - {id: 1, goods: [1, 2, 3], parameters: &params {a: b}}\n'
+            '  - &item {id: 2, parameters: *params}\n'
+            '  - *item\n'
+            'shop: Shop\n'
+            'categories: [{id: 1}, {id: 2}]\n'
+            'goods: [{id: 3}]\n'.encode()
+        )
+        self.assertEqual(count_price_list_goods(stream), 4)
+
+    def test_read_price_list_with_aliases(self):
+        stream = io.BytesIO(
+            'shop: Shop\n'
+            'goods:\n'
+            '  - {id: 1, parameters: &params {Цвет: черный}}\n'
+            '  - {id: 2, parameters: *params}\n'.encode()
+        )
+        self.assertEqual(
+            list(read_price_list(stream)),
+            [
+                ('shop', 'Shop'),
+                ('goods', [
+                    {'id': 1, 'parameters': {'Цвет': 'черный'}},
+                    {'id': 2, 'parameters': {'Цвет': 'черный'}},
+                ]),
+            ]
+        )
+
+
+class PriceListImporterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test_shop',
+            email='shop@example.com',
+            password='test_password',
+            type='shop'
+        )
+
+    def test_import_price_list(self):
+        result = PriceListImporter(user=self.user).run(
+            make_price_list(3).items()
+        )
+        self.assertEqual(
+            result,
+            {'inserted': 3, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+        )
+        self.assertEqual(
+            ProductInfo.objects.filter(shop__user=self.user).count(),
+            3
+        )
+        self.assertEqual(
+            Category.objects.filter(shops__user=self.user).count(),
+            2
+        )
+        product_info = ProductInfo.objects.get(external_id=1)
+        self.assertEqual(
+            dict(product_info.product_parameters.values_list(
+                'parameter__name', 'value'
+            )),
+            {'Цвет': 'черный', 'Диагональ (дюйм)': '6.1'}
+        )
+        self.assertEqual(
+            dict(product_info.product_parameters.values_list(
+                'parameter__name', 'numeric_value'
+            )),
+            {'Цвет': None, 'Диагональ (дюйм)': 6.1}
+        )
+
+    def test_reimport_replaces_product_infos(self):
+        PriceListImporter(user=self.user).run(make_price_list(3).items())
+        PriceListImporter(user=self.user).run(make_price_list(2).items())
+        self.assertEqual(
+            ProductInfo.objects.filter(is_active=True).count(),
+            2
+        )
+        self.assertEqual(ProductParameter.objects.count(), 6)
+        self.assertEqual(CatalogItem.objects.count(), 2)
+
+    def test_removed_product_info_keeps_order_history(self):
+        PriceListImporter(user=self.user).run(make_price_list(3).items())
+        product_info = ProductInfo.objects.get(external_id=3)
+        order = Order.objects.create(
+            user=self.user,
+            state='sent',
+            contact=Contact.objects.create(
+                user=self.user,
+                city='Москва',
+                street='Тверская',
+                house='1',
+                phone='+79134567890'
+            )
+        )
+        OrderItem.objects.create(
+            order=order,
+            product_info=product_info,
+            quantity=1,
+            price=product_info.price
+        )
+
+        PriceListImporter(user=self.user).run(make_price_list(2).items())
+        product_info.refresh_from_db()
+        self.assertFalse(product_info.is_active)
+        self.assertEqual(product_info.quantity, 0)
+        self.assertTrue(order.ordered_items.exists())
+        self.assertFalse(
+            CatalogItem.objects.filter(pk=product_info.id).exists()
+        )
+
+        result = PriceListImporter(user=self.user).run(
+            make_price_list(3).items()
+        )
+        self.assertEqual(result['updated'], 1)
+        product_info.refresh_from_db()
+        self.assertTrue(product_info.is_active)
+        self.assertTrue(
+            CatalogItem.objects.filter(pk=product_info.id).exists()
+        )
+
+    def test_sync_touches_only_changed_rows(self):
+        PriceListImporter(user=self.user).run(make_price_list(3).items())
+        untouched = ProductInfo.objects.get(external_id=1)
+        price_list = make_price_list(4)
+        del price_list['goods'][2]
+        price_list['goods'][1]['price'] = 999
+        price_list['goods'][0]['parameters']['Цвет'] = 'белый'
+
+        result = PriceListImporter(user=self.user).run(price_list.items())
+
+        self.assertEqual(
+            result,
+            {'inserted': 1, 'updated': 2, 'unchanged': 0, 'deactivated': 1}
+        )
+        self.assertEqual(
+            ProductInfo.objects.get(external_id=1).id,
+            untouched.id
+        )
+        self.assertEqual(ProductInfo.objects.get(external_id=2).price, 999)
+        self.assertFalse(ProductInfo.objects.get(external_id=3).is_active)
+        self.assertEqual(
+            ProductParameter.objects.get(
+                product_info__external_id=1,
+                parameter__name='Цвет'
+            ).value,
+            'белый'
+        )
+        self.assertIn(
+            {'parameter': 'Цвет', 'value': 'белый'},
+            CatalogItem.objects.get(
+                product_info__external_id=1
+            ).parameters
+        )
+
+    def test_unchanged_price_list(self):
+        PriceListImporter(user=self.user).run(make_price_list(3).items())
+        result = PriceListImporter(user=self.user).run(
+            make_price_list(3).items()
+        )
+        self.assertEqual(
+            result,
+            {'inserted': 0, 'updated': 0, 'unchanged': 3, 'deactivated': 0}
+        )
+
+    def test_import_in_batches(self):
+        progress = []
+        result = PriceListImporter(
+            user=self.user,
+            batch_size=2,
+            on_progress=progress.append
+        ).run(make_price_list(5).items())
+        self.assertEqual(result['inserted'], 5)
+        self.assertEqual(progress, [2, 4, 5])
+
+    def test_interrupted_import_skips_removal_step(self):
+        PriceListImporter(user=self.user).run(make_price_list(5).items())
+        price_list = make_price_list(4)
+        price_list['goods'][2]['price'] = None
+
+        with self.assertRaises(PartialImportError) as context:
+            PriceListImporter(user=self.user, batch_size=2).run(
+                price_list.items()
+            )
+
+        self.assertEqual(
+            context.exception.changes,
+            {'inserted': 0, 'updated': 0, 'unchanged': 2, 'deactivated': 0}
+        )
+        self.assertEqual(
+            ProductInfo.objects.filter(is_active=True).count(),
+            5
+        )
+
+    def test_query_count_does_not_depend_on_goods(self):
+        PriceListImporter(user=self.user).run(make_price_list(1).items())
+        with CaptureQueriesContext(connection) as small:
+            PriceListImporter(user=self.user).run(make_price_list(2).items())
+        with CaptureQueriesContext(connection) as large:
+            PriceListImporter(user=self.user).run(
+                make_price_list(50).items()
+            )
+        self.assertEqual(len(small), len(large))
+
+
+class PartnerUpdateViewSetTestCase(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='test_shop',
+            email='shop@example.com',
+            password='test_password',
+            type='shop'
+        )
+
+    def test_create_enqueues_import_job(self):
+        request = self.factory.post(
+            '/api/v1/partner/update/',
+            {'url': 'https://example.com/shop.yaml'}
+        )
+        force_authenticate(request, user=self.user)
+        view = PartnerUpdateViewSet.as_view({'post': 'create'})
+        with mock.patch.object(import_price_list_async, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = view(request)
+
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get(id=response.data['JobId'])
+        self.assertEqual(job.phase, 'queued')
+        delay.assert_called_once_with(job_id=job.id)
+
+    def test_import_job_progress(self):
+        job = ImportJob.objects.create(
+            user=self.user,
+            url='https://example.com/shop.yaml'
+        )
+        totals = []
+        import_goods = PriceListImporter._import_goods
+
+        def record_total(importer, *args):
+            totals.append(ImportJob.objects.get(id=job.id).total)
+            return import_goods(importer, *args)
+
+        with mock.patch('backend.importers.requests.get',
+                        return_value=make_response(make_price_list(3))), \
+                mock.patch.object(
+                    PriceListImporter,
+                    '_import_goods',
+                    autospec=True,
+                    side_effect=record_total
+                ):
+            result, _ = import_price_list_async(job_id=job.id)
+
+        # Общее количество известно до записи первой пачки.
+        self.assertEqual(totals, [3])
+        self.assertTrue(result)
+        request = self.factory.get(f'/api/v1/partner/update/{job.id}/')
+        force_authenticate(request, user=self.user)
+        view = PartnerUpdateViewSet.as_view({'get': 'retrieve'})
+        response = view(request, pk=job.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phase'], 'done')
+        self.assertEqual(response.data['processed'], 3)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['changes']['inserted'], 3)
+
+    def test_import_job_failure(self):
+        job = ImportJob.objects.create(
+            user=self.user,
+            url='https://example.com/shop.yaml'
+        )
+        with mock.patch('backend.importers.requests.get',
+                        side_effect=ConnectionError('Нет соединения')):
+            result, _ = import_price_list_async(job_id=job.id)
+
+        job.refresh_from_db()
+        self.assertFalse(result)
+        self.assertEqual(job.phase, 'failed')
+        self.assertEqual(job.errors, ['Нет соединения'])
+
+    def test_partial_import_job(self):
+        job = ImportJob.objects.create(
+            user=self.user,
+            url='https://example.com/shop.yaml'
+        )
+        changes = {'inserted': 2, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+        with mock.patch('backend.importers.requests.get',
+                        return_value=make_response(make_price_list(3))), \
+                mock.patch.object(
+                    PriceListImporter,
+                    'run',
+                    side_effect=PartialImportError(
+                        ValueError('Ошибка в позиции'), changes
+                    )
+                ):
+            result, _ = import_price_list_async(job_id=job.id)
+
+        job.refresh_from_db()
+        self.assertFalse(result)
+        self.assertEqual(job.phase, 'partial')
+        self.assertEqual(job.changes, changes)
+        self.assertEqual(job.errors, ['Ошибка в позиции'])
+        self.assertFalse(
+            Shop.objects.filter(url='https://example.com/shop.yaml').exists()
+        )
+
+    def test_unchanged_price_list_is_skipped(self):
+        url = 'https://example.com/shop.yaml'
+        first_job = ImportJob.objects.create(user=self.user, url=url)
+        second_job = ImportJob.objects.create(user=self.user, url=url)
+        headers = {'ETag': '"v1"'}
+        with mock.patch('backend.importers.requests.get',
+                        return_value=make_response(make_price_list(3),
+                                                   headers=headers)):
+            import_price_list_async(job_id=first_job.id)
+        with mock.patch('backend.importers.requests.get',
+                        return_value=make_response(make_price_list(3),
+                                                   headers=headers)) as get:
+            result, _ = import_price_list_async(job_id=second_job.id)
+
+        second_job.refresh_from_db()
+        self.assertTrue(result)
+        self.assertEqual(second_job.phase, 'not_modified')
+        self.assertEqual(
+            get.call_args.kwargs['headers'],
+            {'If-None-Match': '"v1"'}
+        )
+        shop = Shop.objects.get(user=self.user)
+        self.assertEqual(shop.url, url)
+        self.assertEqual(shop.etag, '"v1"')
+
+    def test_not_modified_response_is_skipped(self):
+        url = 'https://example.com/shop.yaml'
+        Shop.objects.create(
+            name='Test Shop',
+            user=self.user,
+            url=url,
+            etag='"v1"',
+            last_modified='Wed, 01 May 2024 10:00:00 GMT'
+        )
+        job = ImportJob.objects.create(user=self.user, url=url)
+        with mock.patch('backend.importers.requests.get',
+                        return_value=make_response({}, status_code=304)):
+            import_price_list_async(job_id=job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.phase, 'not_modified')
+        self.assertFalse(ProductInfo.objects.exists())
+
+
+@override_settings(
+    PRICE_LIST_REFRESH_CONCURRENCY=2,
+    PRICE_LIST_REFRESH_WINDOW=300,
+    PRICE_LIST_HOST_INTERVAL=200,
+    PRICE_LIST_REFRESH_JITTER=0
+)
+class RefreshPriceListsTestCase(TestCase):
+    def test_refresh_countdowns(self):
+        countdowns = get_refresh_countdowns([
+            'https://a.example.com/1.yaml',
+            'https://b.example.com/2.yaml',
+            'https://c.example.com/3.yaml',
+            'https://a.example.com/4.yaml',
+        ])
+        self.assertEqual(countdowns, [0, 0, 150, 200])
+
+    def test_refresh_price_lists(self):
+        for number in range(3):
+            user = User.objects.create_user(
+                username=f'shop_{number}',
+                email=f'shop_{number}@example.com',
+                password='test_password',
+                type='shop'
+            )
+            Shop.objects.create(
+                name=f'Shop {number}',
+                user=user,
+                url=f'https://example.com/{number}.yaml'
+            )
+        ImportJob.objects.create(
+            user=user,
+            url='https://example.com/2.yaml'
+        )
+        Shop.objects.create(name='Без ссылки')
+
+        with mock.patch.object(
+                import_price_list_async, 'apply_async'
+        ) as apply_async:
+            result, _ = refresh_price_lists_async()
+
+        self.assertTrue(result)
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(ImportJob.objects.count(), 3)
+
+    @override_settings(PRICE_LIST_IMPORT_TIMEOUT=3600)
+    def test_stale_import_job_does_not_block_refresh(self):
+        user = User.objects.create_user(
+            username='shop',
+            email='shop@example.com',
+            password='test_password',
+            type='shop'
+        )
+        Shop.objects.create(
+            name='Shop',
+            user=user,
+            url='https://example.com/shop.yaml'
+        )
+        stale_job = ImportJob.objects.create(
+            user=user,
+            url='https://example.com/shop.yaml',
+            phase='importing'
+        )
+        ImportJob.objects.filter(id=stale_job.id).update(
+            updated_at=timezone.now() - timedelta(hours=2)
+        )
+
+        with mock.patch.object(
+                import_price_list_async, 'apply_async'
+        ) as apply_async:
+            refresh_price_lists_async()
+            self.assertEqual(apply_async.call_count, 1)
+            refresh_price_lists_async()
+            self.assertEqual(apply_async.call_count, 1)
+
+        stale_job.refresh_from_db()
+        self.assertEqual(stale_job.phase, 'failed')
+        self.assertEqual(
+            ImportJob.objects.filter(user=user, phase='queued').count(),
+            1
+        )
\ No newline at end of file
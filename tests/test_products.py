@@ -0,0 +1,464 @@
+import json
+from base64 import b64decode
+from unittest import skipUnless
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.admin.sites import site
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from backend.admin import (
+    ParameterAdmin,
+    ProductParameterAdmin,
+    ShopAdmin
+)
+from backend.models import (
+    CatalogItem,
+    Category,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop
+)
+from backend.serializers import (
+    CatalogRowSerializer,
+    ProductInfoSerializer
+)
+from backend.views import ProductInfoViewSet
+
+
+class ProductInfoViewSetTestCase(TestCase):
+    def setUp(self):
+        # Сбрасываем счетчики троттлинга анонимных запросов.
+        cache.clear()
+        caches['catalog'].clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductInfoViewSet.as_view({'get': 'list'})
+        self.shop = Shop.objects.create(name='Shop 1')
+        self.closed_shop = Shop.objects.create(name='Shop 2', state=False)
+        self.category = Category.objects.create(name='Смартфоны')
+        self.product = Product.objects.create(
+            name='Смартфон',
+            category=self.category
+        )
+        self.product_infos = [
+            ProductInfo.objects.create(
+                product=self.product,
+                shop=self.shop,
+                external_id=external_id,
+                model=f'model/{external_id}',
+                quantity=1,
+                price=price,
+                price_rrc=price
+            )
+            for external_id, price in enumerate((300, 100, 200, 100, 500))
+        ]
+        ProductInfo.objects.create(
+            product=self.product,
+            shop=self.closed_shop,
+            external_id=1,
+            quantity=1,
+            price=1,
+            price_rrc=1
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def _get_all_pages(self, url):
+        ids = []
+        while url:
+            response = self.view(self.factory.get(url))
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content)
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        return ids
+
+    def test_list_products_by_id(self):
+        ids = self._get_all_pages('/api/v1/products?page_size=2')
+        self.assertEqual(
+            ids,
+            [product_info.id for product_info in self.product_infos]
+        )
+
+    def test_list_products_by_price(self):
+        ids = self._get_all_pages(
+            '/api/v1/products?page_size=2&ordering=price'
+        )
+        self.assertEqual(
+            ids,
+            [
+                product_info.id
+                for product_info in sorted(
+                    self.product_infos,
+                    key=lambda product_info: (product_info.price,
+                                              product_info.id)
+                )
+            ]
+        )
+
+    def test_price_cursor_walks_both_ways(self):
+        expected = [
+            product_info.id
+            for product_info in sorted(
+                self.product_infos,
+                key=lambda product_info: (-product_info.price,
+                                          -product_info.id)
+            )
+        ]
+        url, ids, pages = (
+            '/api/v1/products?page_size=1&ordering=-price', [], []
+        )
+        while url:
+            data = json.loads(self.view(self.factory.get(url)).content)
+            ids.extend(item['id'] for item in data['results'])
+            pages.append(data)
+            url = data['next']
+        self.assertEqual(ids, expected)
+
+        # Курсор хранит цену и ИД последней строки страницы.
+        cursor = parse_qs(urlsplit(pages[0]['next']).query)['cursor'][0]
+        position = parse_qs(b64decode(cursor).decode())['p'][0]
+        self.assertEqual(json.loads(position), [500, expected[0]])
+
+        url, ids = pages[-1]['previous'], []
+        while url:
+            data = json.loads(self.view(self.factory.get(url)).content)
+            ids.extend(item['id'] for item in data['results'])
+            url = data['previous']
+        self.assertEqual(ids[::-1], expected[:-1])
+
+    def test_page_size_is_capped(self):
+        response = self.view(
+            self.factory.get('/api/v1/products?page_size=100000')
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+
+    @skipUnless(
+        connection.vendor == 'postgresql',
+        'Полнотекстовый поиск доступен только в PostgreSQL'
+    )
+    def test_search_products(self):
+        other_product = Product.objects.create(
+            name='Флешка Kingston',
+            category=self.category
+        )
+        product_info = ProductInfo.objects.create(
+            product=other_product,
+            shop=self.shop,
+            external_id=100,
+            model='kingston/datatraveler',
+            quantity=1,
+            price=500,
+            price_rrc=600
+        )
+        ProductParameter.objects.create(
+            product_info=product_info,
+            parameter=Parameter.objects.create(name='Цвет'),
+            value='золотистый'
+        )
+
+        for query in ('флешки', 'Kingstn', 'золотистый'):
+            response = self.view(
+                self.factory.get('/api/v1/products', {'q': query})
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [
+                    item['id']
+                    for item in json.loads(response.content)['results']
+                ],
+                [product_info.id]
+            )
+
+class ProductFacetsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['catalog'].clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductInfoViewSet.as_view({'get': 'list'})
+        shop = Shop.objects.create(name='Shop 1')
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        color = Parameter.objects.create(name='Цвет')
+        diagonal = Parameter.objects.create(name='Диагональ (дюйм)')
+        self.product_infos = []
+        for external_id, (price, value, size) in enumerate((
+                (100, 'черный', '5.8'),
+                (200, 'черный', '6.1'),
+                (300, 'белый', '6.5'),
+        )):
+            product_info = ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=external_id,
+                quantity=1,
+                price=price,
+                price_rrc=price
+            )
+            ProductParameter.objects.create(
+                product_info=product_info,
+                parameter=color,
+                value=value
+            )
+            ProductParameter.objects.create(
+                product_info=product_info,
+                parameter=diagonal,
+                value=size
+            )
+            self.product_infos.append(product_info)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _get_ids(self, params):
+        response = self.view(self.factory.get('/api/v1/products', params))
+        self.assertEqual(response.status_code, 200)
+        return [
+            item['id'] for item in json.loads(response.content)['results']
+        ]
+
+    def test_filter_by_parameter_value(self):
+        self.assertEqual(
+            self._get_ids({'param[Цвет]': 'черный'}),
+            [product_info.id for product_info in self.product_infos[:2]]
+        )
+        self.assertEqual(
+            self._get_ids({'param[Цвет]': ['черный', 'белый']}),
+            [product_info.id for product_info in self.product_infos]
+        )
+
+    def test_filter_by_numeric_range(self):
+        self.assertEqual(
+            self._get_ids({
+                'param_min[Диагональ (дюйм)]': '6',
+                'param_max[Диагональ (дюйм)]': '6.2',
+            }),
+            [self.product_infos[1].id]
+        )
+
+    def test_filter_by_price(self):
+        self.assertEqual(
+            self._get_ids({'price_min': 150, 'price_max': 300}),
+            [product_info.id for product_info in self.product_infos[1:]]
+        )
+
+    def test_invalid_range(self):
+        response = self.view(
+            self.factory.get('/api/v1/products', {'price_min': 'abc'})
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets(self):
+        with self.assertNumQueries(2):
+            response = self.view(
+                self.factory.get('/api/v1/products', {'price_max': 200})
+            )
+        self.assertEqual(
+            json.loads(response.content)['facets'],
+            {
+                'Диагональ (дюйм)': [
+                    {'value': '5.8', 'count': 1},
+                    {'value': '6.1', 'count': 1},
+                ],
+                'Цвет': [{'value': 'черный', 'count': 2}],
+            }
+        )
+
+    def test_facets_only_on_first_page(self):
+        response = self.view(
+            self.factory.get('/api/v1/products', {'page_size': 1})
+        )
+        data = json.loads(response.content)
+        self.assertIn('facets', data)
+        response = self.view(self.factory.get(data['next']))
+        self.assertNotIn('facets', json.loads(response.content))
+
+
+class CatalogItemTestCase(TestCase):
+    def setUp(self):
+        self.shop = Shop.objects.create(name='Shop 1')
+        self.category = Category.objects.create(name='Смартфоны')
+        self.product = Product.objects.create(
+            name='Смартфон',
+            category=self.category
+        )
+        self.product_info = ProductInfo.objects.create(
+            product=self.product,
+            shop=self.shop,
+            external_id=1,
+            model='model/1',
+            quantity=1,
+            price=100,
+            price_rrc=120
+        )
+        self.parameter = ProductParameter.objects.create(
+            product_info=self.product_info,
+            parameter=Parameter.objects.create(name='Цвет'),
+            value='черный'
+        )
+
+    def test_catalog_matches_product_info_serializer(self):
+        self.assertEqual(
+            CatalogRowSerializer(
+                CatalogItem.objects.values(*CatalogRowSerializer.fields)
+            ).data,
+            [ProductInfoSerializer(self.product_info).data]
+        )
+
+    def test_catalog_follows_model_changes(self):
+        self.shop.state = False
+        self.shop.save()
+        self.category.name = 'Телефоны'
+        self.category.save()
+        self.product.name = 'Телефон'
+        self.product.save()
+        self.parameter.value = 'белый'
+        self.parameter.save()
+
+        item = CatalogItem.objects.get(pk=self.product_info.id)
+        self.assertFalse(item.shop_state)
+        self.assertEqual(item.category_name, 'Телефоны')
+        self.assertEqual(item.product_name, 'Телефон')
+        self.assertEqual(
+            item.parameters,
+            [{'parameter': 'Цвет', 'value': 'белый'}]
+        )
+
+        self.product_info.delete()
+        self.assertFalse(CatalogItem.objects.exists())
+
+    def test_parameter_deletion_refreshes_catalog(self):
+        ProductParameterAdmin(ProductParameter, site).delete_queryset(
+            None,
+            ProductParameter.objects.all()
+        )
+        self.assertEqual(
+            CatalogItem.objects.get(pk=self.product_info.id).parameters,
+            []
+        )
+
+    def test_parameter_name_deletion_refreshes_catalog(self):
+        ParameterAdmin(Parameter, site).delete_queryset(
+            None,
+            Parameter.objects.all()
+        )
+        self.assertEqual(
+            CatalogItem.objects.get(pk=self.product_info.id).parameters,
+            []
+        )
+
+
+
+class CatalogResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['catalog'].clear()
+        self.factory = APIRequestFactory()
+        self.view = ProductInfoViewSet.as_view({'get': 'list'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop = Shop.objects.create(name='Shop 1')
+            self.other_shop = Shop.objects.create(name='Shop 2')
+            self.product = Product.objects.create(
+                name='Смартфон',
+                category=Category.objects.create(name='Смартфоны')
+            )
+            for shop in (self.shop, self.other_shop):
+                ProductInfo.objects.create(
+                    product=self.product,
+                    shop=shop,
+                    external_id=1,
+                    quantity=1,
+                    price=100,
+                    price_rrc=100
+                )
+
+    def tearDown(self):
+        cache.clear()
+
+    def _get(self, params=None):
+        response = self.view(self.factory.get('/api/v1/products', params))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_cached_response(self):
+        data = self._get({'shop_id': self.shop.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get({'shop_id': self.shop.id}), data)
+
+    def test_cached_links_follow_request_scheme(self):
+        params = {'page_size': 1}
+        for secure, scheme in ((False, 'http'), (True, 'https')):
+            response = self.view(
+                self.factory.get('/api/v1/products', params, secure=secure)
+            )
+            self.assertTrue(
+                json.loads(response.content)['next'].startswith(
+                    f'{scheme}://testserver/'
+                )
+            )
+
+    def test_shop_state_invalidates_cache(self):
+        self.assertEqual(len(self._get()['results']), 2)
+        self._get({'shop_id': self.other_shop.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.state = False
+            self.shop.save()
+
+        self.assertEqual(len(self._get()['results']), 1)
+        with self.assertNumQueries(0):
+            self._get({'shop_id': self.other_shop.id})
+
+    def test_product_edit_invalidates_cache(self):
+        self._get({'category_id': self.product.category_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Телефон'
+            self.product.save()
+
+        data = self._get({'category_id': self.product.category_id})
+        self.assertEqual(data['results'][0]['product']['name'], 'Телефон')
+
+    def test_admin_delete_invalidates_cache(self):
+        params = {'category_id': self.product.category_id}
+        self.assertEqual(len(self._get(params)['results']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShopAdmin(Shop, site).delete_queryset(
+                None,
+                Shop.objects.filter(id=self.shop.id)
+            )
+
+        self.assertEqual(len(self._get(params)['results']), 1)
+
+    def test_conditional_get(self):
+        params = {'shop_id': self.shop.id}
+        response = self.view(self.factory.get('/api/v1/products', params))
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.view(self.factory.get(
+                '/api/v1/products',
+                params,
+                HTTP_IF_NONE_MATCH=etag
+            ))
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.state = False
+            self.shop.save()
+        response = self.view(self.factory.get(
+            '/api/v1/products',
+            params,
+            HTTP_IF_NONE_MATCH=etag
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['results'], [])
\ No newline at end of file
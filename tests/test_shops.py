@@ -1,3 +1,4 @@
+from django.core.cache import cache, caches
 from django.test import TestCase
 from rest_framework.test import APIRequestFactory
 
@@ -35,4 +36,28 @@ class ShopViewSetTestCase(TestCase):
         response = view(request, pk=self.shop1.id)
         self.assertEqual(response.status_code, 200)
         serializer = ShopSerializer(self.shop1)
-        self.assertEqual(response.data, serializer.data)
\ No newline at end of file
+        self.assertEqual(response.data, serializer.data)
+
+    def test_conditional_get(self):
+        cache.clear()
+        caches['catalog'].clear()
+        view = ShopViewSet.as_view({'get': 'retrieve'})
+        url = f'/api/shops/{self.shop1.id}/'
+        etag = view(self.factory.get(url), pk=self.shop1.id)['ETag']
+
+        with self.assertNumQueries(0):
+            response = view(
+                self.factory.get(url, HTTP_IF_NONE_MATCH=etag),
+                pk=self.shop1.id
+            )
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop2.state = False
+            self.shop2.save()
+        response = view(
+            self.factory.get(url, HTTP_IF_NONE_MATCH=etag),
+            pk=self.shop1.id
+        )
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
\ No newline at end of file
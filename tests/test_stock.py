@@ -0,0 +1,293 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate
+)
+
+from backend.models import (
+    CatalogItem,
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OrderStateEvent,
+    OutboxEmail,
+    Product,
+    ProductInfo,
+    Shop,
+    User
+)
+from backend.catalog import refresh_catalog_items
+from backend.tasks import release_expired_orders_async
+from backend.transitions import change_state
+from backend.views import OrderViewSet
+
+
+class StockMixin:
+    def _create_stock(self, *quantities):
+        shop = Shop.objects.create(name='Shop 1')
+        product = Product.objects.create(
+            name='Смартфон',
+            category=Category.objects.create(name='Смартфоны')
+        )
+        return [
+            ProductInfo.objects.create(
+                product=product,
+                shop=shop,
+                external_id=external_id,
+                quantity=quantity,
+                price=100,
+                price_rrc=100
+            )
+            for external_id, quantity in enumerate(quantities, start=1)
+        ]
+
+    def _create_basket(self, number, items):
+        user = User.objects.create_user(
+            username=f'buyer_{number}',
+            email=f'buyer_{number}@example.com',
+            password='test_password'
+        )
+        contact = Contact.objects.create(
+            user=user,
+            city='Москва',
+            street='Тверская',
+            house='1',
+            phone=f'+7913456{number:04d}'
+        )
+        basket = Order.objects.create(
+            user=user,
+            state='basket',
+            contact=contact
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=basket,
+                product_info=product_info,
+                quantity=quantity,
+                price=product_info.price
+            )
+            for product_info, quantity in items
+        ])
+        return basket
+
+    def _post(self, action, order, data):
+        request = APIRequestFactory().post(f'/api/v1/order/{action}/', data)
+        force_authenticate(request, user=order.user)
+        return OrderViewSet.as_view({'post': action})(request)
+
+    def _place_order(self, order):
+        return self._post(
+            'create',
+            order,
+            {'id': order.id, 'contact': order.contact_id}
+        )
+
+    def _get_stock(self, product_infos):
+        stock = []
+        for product_info in product_infos:
+            product_info.refresh_from_db(fields=('quantity', 'reserved'))
+            stock.append((
+                product_info.quantity,
+                product_info.reserved,
+                CatalogItem.objects.get(pk=product_info.id).quantity
+            ))
+        return stock
+
+
+class StockReservationTestCase(StockMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product_infos = self._create_stock(5, 2)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_order_placement_reserves_stock(self):
+        order = self._create_basket(1, zip(self.product_infos, (3, 2)))
+        response = self._place_order(order)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self._get_stock(self.product_infos),
+            [(5, 3, 2), (2, 2, 0)]
+        )
+        self.assertEqual(
+            list(OrderStateEvent.objects.values_list(
+                'order_id', 'from_state', 'to_state'
+            )),
+            [(order.id, 'basket', 'new')]
+        )
+
+    def test_shortage_rejects_order(self):
+        order = self._create_basket(1, zip(self.product_infos, (3, 3)))
+        response = self._place_order(order)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content)['Errors'],
+            f'Недостаточно товара на складе: {self.product_infos[1].id}'
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.state, 'basket')
+        self.assertEqual(
+            self._get_stock(self.product_infos),
+            [(5, 0, 5), (2, 0, 2)]
+        )
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertFalse(OrderStateEvent.objects.exists())
+
+    def test_placed_order_is_not_placed_again(self):
+        order = self._create_basket(1, [(self.product_infos[0], 2)])
+        self.assertEqual(self._place_order(order).status_code, 201)
+        self.assertEqual(self._place_order(order).status_code, 400)
+        self.assertEqual(
+            self._get_stock(self.product_infos[:1]),
+            [(5, 2, 3)]
+        )
+
+    def test_checkouts_do_not_oversell(self):
+        orders = [
+            self._create_basket(number, [(self.product_infos[1], 1)])
+            for number in range(4)
+        ]
+        statuses = [
+            self._place_order(order).status_code for order in orders
+        ]
+
+        self.assertEqual(statuses, [201, 201, 400, 400])
+        self.assertEqual(
+            self._get_stock(self.product_infos[1:]),
+            [(2, 2, 0)]
+        )
+
+    def test_cancel_releases_stock(self):
+        order = self._create_basket(1, zip(self.product_infos, (3, 2)))
+        self._place_order(order)
+        response = self._post(
+            'cancel_order',
+            order,
+            {'order_id': order.id}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self._get_stock(self.product_infos),
+            [(5, 0, 5), (2, 0, 2)]
+        )
+
+    def test_price_list_refresh_keeps_reservations(self):
+        order = self._create_basket(1, [(self.product_infos[0], 3)])
+        self._place_order(order)
+
+        # Импорт прайс-листа перезаписывает остаток поставщика.
+        ProductInfo.objects.filter(id=self.product_infos[0].id).update(
+            quantity=4
+        )
+        refresh_catalog_items([self.product_infos[0].id])
+        self.assertEqual(
+            self._get_stock(self.product_infos[:1]),
+            [(4, 3, 1)]
+        )
+
+        second = self._create_basket(2, [(self.product_infos[0], 2)])
+        self.assertEqual(self._place_order(second).status_code, 400)
+
+        self._post('cancel_order', order, {'order_id': order.id})
+        self.assertEqual(
+            self._get_stock(self.product_infos[:1]),
+            [(4, 0, 4)]
+        )
+
+    def test_sent_order_is_written_off(self):
+        order = self._create_basket(1, [(self.product_infos[0], 3)])
+        self._place_order(order)
+        Order.objects.filter(id=order.id).update(state='assembled')
+
+        self.assertEqual(change_state(
+            Order.objects.filter(id=order.id), 'sent'
+        ), {order.id: order.user_id})
+        self.assertEqual(
+            self._get_stock(self.product_infos[:1]),
+            [(2, 0, 2)]
+        )
+
+    def test_expired_orders_are_released(self):
+        expired = self._create_basket(1, [(self.product_infos[0], 3)])
+        active = self._create_basket(2, [(self.product_infos[0], 1)])
+        for order in (expired, active):
+            self._place_order(order)
+        Order.objects.filter(id=expired.id).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+
+        result, _ = release_expired_orders_async()
+
+        self.assertTrue(result)
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual(expired.state, 'canceled')
+        self.assertEqual(active.state, 'new')
+        self.assertEqual(
+            self._get_stock(self.product_infos[:1]),
+            [(5, 1, 4)]
+        )
+        self.assertTrue(OutboxEmail.objects.filter(
+            to=[expired.user.email],
+            subject='Обновление статуса заказа'
+        ).exists())
+
+        response = self._post('confirm_order', expired, {
+            'email': expired.user.email,
+            'token': 'token',
+            'order_id': expired.id,
+            'contact_id': expired.contact_id,
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Параллельные транзакции проверяются только в PostgreSQL'
+)
+class StockConcurrencyTestCase(StockMixin, TransactionTestCase):
+    checkouts = 200
+    workers = 20
+
+    def setUp(self):
+        cache.clear()
+
+    def _checkout(self, order):
+        try:
+            return self._place_order(order).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        product_infos = self._create_stock(50, 30)
+        orders = [
+            self._create_basket(number, zip(product_infos, (1, 1)))
+            for number in range(self.checkouts)
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            statuses = list(executor.map(self._checkout, orders))
+
+        self.assertEqual(statuses.count(201), 30)
+        self.assertEqual(statuses.count(400), self.checkouts - 30)
+        self.assertEqual(
+            self._get_stock(product_infos),
+            [(50, 30, 20), (30, 30, 0)]
+        )
+        self.assertEqual(
+            Order.objects.filter(state='new').count(),
+            30
+        )
\ No newline at end of file
@@ -0,0 +1,67 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from backend.importers import PriceListImporter
+from backend.models import (
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop
+)
+
+
+class UploadCommandTestCase(TestCase):
+    def test_upload_file(self):
+        out = StringIO()
+        call_command('upload', 'data/shop1.yaml', stdout=out)
+
+        shop = Shop.objects.get(name='Связной')
+        self.assertEqual(shop.product_infos.count(), 14)
+        self.assertTrue(
+            ProductParameter.objects.filter(
+                product_info__shop=shop,
+                parameter__name='Цвет',
+                value='золотистый'
+            ).exists()
+        )
+        self.assertIn('строк/с', out.getvalue())
+
+    def test_upload_directory_is_idempotent(self):
+        call_command('upload', '--path', 'data', stdout=StringIO())
+        call_command('upload', '--path', 'data', stdout=StringIO())
+        self.assertEqual(Shop.objects.count(), 1)
+        self.assertEqual(ProductInfo.objects.count(), 14)
+
+    def test_upload_reuses_concurrently_created_products(self):
+        call_command('upload', 'data/shop1.yaml', stdout=StringIO())
+        ProductInfo.objects.all().delete()
+        products = Product.objects.count()
+        parameters = Parameter.objects.count()
+
+        select_products = PriceListImporter._select_products
+        selects = []
+
+        def select_stale(importer, keys):
+            # Первая выборка не видит продукты, созданные другим импортом.
+            selects.append(keys)
+            if len(selects) == 1:
+                return {}
+            return select_products(importer, keys)
+
+        with mock.patch.object(
+                PriceListImporter, '_select_products', select_stale
+        ):
+            call_command('upload', 'data/shop1.yaml', stdout=StringIO())
+
+        self.assertEqual(Product.objects.count(), products)
+        self.assertEqual(Parameter.objects.count(), parameters)
+        self.assertEqual(ProductInfo.objects.count(), 14)
+
+    def test_upload_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command('upload', 'data/missing.yaml', stdout=StringIO())
\ No newline at end of file